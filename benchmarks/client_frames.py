@@ -0,0 +1,136 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Cost of drawing frames of the game view, in full and as dirty regions.
+
+Starts a game of computer players on a dummy display and times frames
+drawn the old way, everything then pygame.display.flip, against
+ClientBoard.render, which draws and updates only what changed: idle
+frames, a frame after one hex changes owner, after a computer turn and
+after scrolling. Then reports how often text_at found its text rendered
+in the cache.
+
+    python benchmarks/client_frames.py --frames 100
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(str(ROOT))
+
+import pygame  # noqa: E402
+
+pygame.init()
+screen = pygame.display.set_mode((800, 600))
+
+from territory.client.resources import ImageHandler  # noqa: E402
+from territory.client.ui import Client  # noqa: E402
+from territory.server import Server  # noqa: E402
+
+
+def full(board):
+    board.draw_map()
+    pygame.display.flip()
+
+
+def timed(frame, board, change, frames):
+    """Return the mean milliseconds of change() then frame(board)."""
+    elapsed = 0
+    for _ in range(frames):
+        change()
+        start = time.perf_counter()
+        frame(board)
+        elapsed += time.perf_counter() - start
+    return 1000 * elapsed / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=100,
+                        help="frames timed in each case")
+    parser.add_argument("--cpus", type=int, default=6)
+    parser.add_argument("--width", type=int, default=40)
+    parser.add_argument("--height", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    client = Client(screen, ImageHandler(), ROOT, Server(ROOT))
+    client.load_interface_images()
+    client.load_graphics()
+    board = client.board
+    repainted = []
+
+    def idle():
+        pass
+
+    def repaint():
+        # Give a hex another colour, putting back the one given before
+        if repainted:
+            (x, y), owner = repainted.pop()
+            board.data[x, y] = owner
+        x, y = random.choice([(x, y) for x in range(15) for y in range(14)
+                              if board.data[x, y] > 0])
+        repainted.append(((x, y), board.data[x, y]))
+        board.data[x, y] = board.data[x, y] % args.cpus + 1
+
+    def computer_turn():
+        player = board.get_player_by_side(board.turn)
+        if player and player.ai_controller and not player.lost:
+            player.ai_controller.act()
+        board.end_turn()
+        board.update_scores()
+
+    def scroll():
+        board.view.scroll(random.choice((-1, 1)), random.choice((-1, 1)))
+
+    cases = [("idle", idle), ("one hex", repaint),
+             ("computer turn", computer_turn), ("scroll", scroll)]
+    print("{:<15}{:>12}{:>12}".format("frame", "full (ms)", "render (ms)"))
+    for name, change in cases:
+        times = []
+        for frame in (full, type(board).render):
+            # The same game for both
+            random.seed(args.seed)
+            board.new_game(cpus=args.cpus, humans=0, width=args.width,
+                           height=args.height, seed=args.seed)
+            del repainted[:]
+            board.invalidate()
+            board.render()
+            times.append(timed(frame, board, change, args.frames))
+        print("{:<15}{:>12.2f}{:>12.2f}".format(name, *times))
+    texts = client.text_cache
+    print("text cache: {} hits, {} misses, {:.0f} KiB".format(
+        texts.hits, texts.misses, texts.size / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Cost of converting between pixels and hexes.
+
+Times the lookup of the hex under many pixels through the nested GRID
+tables, one pixel at a time as the client used to, against a HexGeometry
+one at a time and in a batch. Then times the top left pixels of a view's
+hexes, computed one by one, in a batch and read from view_positions.
+
+    python benchmarks/hex_lookup.py --points 100000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from territory import hex_system  # noqa: E402
+from territory.hex_system import (  # noqa: E402
+    HexGeometry, VIEW_COLUMNS, VIEW_ROWS)
+
+
+def grid_lookup(x, y):
+    """The hex under pixel (x, y), as pixel_to_hex_map found it."""
+    grid_x = x // hex_system.GRID_WIDTH
+    grid_y = y // hex_system.GRID_HEIGHT
+    grid_pixel_x = x % hex_system.GRID_WIDTH
+    grid_pixel_y = y % hex_system.GRID_HEIGHT
+    if grid_y & 1:
+        rows = hex_system.GRID_ODD_ROWS
+    else:
+        rows = hex_system.GRID_EVEN_ROWS
+    dx, dy = rows[grid_pixel_y][grid_pixel_x]
+    return grid_x + dx, grid_y + dy
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    xs = [random.randrange(4000) for _ in range(args.points)]
+    ys = [random.randrange(3000) for _ in range(args.points)]
+    geometry = HexGeometry()
+
+    grid, expected = timed(
+        lambda: [grid_lookup(x, y) for x, y in zip(xs, ys)], args.repeat)
+    single, found = timed(
+        lambda: [geometry.to_hex(x, y) for x, y in zip(xs, ys)], args.repeat)
+    batch, (hexes_x, hexes_y) = timed(
+        lambda: geometry.to_hexes(xs, ys), args.repeat)
+    assert found == expected == list(zip(hexes_x, hexes_y))
+    print("hexes of {} pixels: GRID tables {:.1f} ms, to_hex {:.1f} ms, "
+          "to_hexes {:.1f} ms".format(args.points, 1000 * grid,
+                                      1000 * single, 1000 * batch))
+
+    view = [(dx, dy) for dx in range(VIEW_COLUMNS) for dy in range(VIEW_ROWS)]
+    frames = max(1, args.points // len(view))
+    positions = geometry.view_positions()
+    single, _ = timed(lambda: [[geometry.to_pixel(dx, dy) for dx, dy in view]
+                               for _ in range(frames)], args.repeat)
+    batch, _ = timed(lambda: [geometry.to_pixels([dx for dx, _ in view],
+                                                 [dy for _, dy in view])
+                              for _ in range(frames)], args.repeat)
+    cached, _ = timed(lambda: [[positions[hex_] for hex_ in view]
+                               for _ in range(frames)], args.repeat)
+    print("pixels of a view's hexes, {} times: to_pixel {:.1f} ms, "
+          "to_pixels {:.1f} ms, view_positions {:.1f} ms".format(
+              frames, 1000 * single, 1000 * batch, 1000 * cached))
+
+
+if __name__ == "__main__":
+    main()
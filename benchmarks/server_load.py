@@ -0,0 +1,139 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Load test of the game server.
+
+Runs a server and many concurrent remote games in one process and reports
+games and turns per second, and per second of CPU time (that is, per core:
+everything runs on one). By default the human players only end their
+turns, so the computer players' turns are measured; --bot plays them too.
+With --ai-workers the computer players think in worker processes, whose
+CPU time is not counted.
+
+    python benchmarks/server_load.py --games 1000 --turns 10
+"""
+
+import argparse
+import asyncio
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from territory.server import Server  # noqa: E402
+from territory.server.aipool import AIPool  # noqa: E402
+from territory.server.host import GameHost  # noqa: E402
+from territory.server.network import GameServer  # noqa: E402
+from territory.server.remote import RemoteGame, play_turn  # noqa: E402
+from territory.server.serverboard import ServerBoard  # noqa: E402
+
+
+async def play(port, args, index, latencies):
+    game = await RemoteGame.connect("127.0.0.1", port)
+    try:
+        created = await game.new_game(humans=1, cpus=args.cpus,
+                                      width=args.width, height=args.height)
+        await game.join(created["game"], 1)
+        if args.bot:
+            server = Server(ROOT)
+            board = ServerBoard(server, server.ruleset)
+            rng = random.Random(index)
+        for _ in range(args.turns):
+            start = time.perf_counter()
+            if args.bot:
+                result = await play_turn(game, board, rng)
+            else:
+                result = await game.end_turn()
+            latencies.append(time.perf_counter() - start)
+            if "winner" in result:
+                break
+    finally:
+        await game.close()
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as directory:
+        pool = None
+        if args.ai_workers:
+            pool = AIPool(ROOT, args.ai_workers, args.ai_budget)
+        host = GameHost(Server(ROOT), Path(directory),
+                        live_boards=args.live_boards, pool=pool)
+        server = GameServer(host)
+        await server.start()
+        latencies = []
+        wall, cpu = time.perf_counter(), time.process_time()
+        await asyncio.gather(*(play(server.port, args, index, latencies)
+                               for index in range(args.games)))
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        await server.close()
+        if pool is not None:
+            pool.close()
+
+    latencies.sort()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("{} games, {} turns in {:.2f} s ({:.2f} s CPU)".format(
+        args.games, host.turns, wall, cpu))
+    print("games/s: {:.1f}, per core: {:.1f}".format(
+        args.games / wall, args.games / cpu))
+    print("turns/s: {:.1f}, per core: {:.1f}".format(
+        host.turns / wall, host.turns / cpu))
+    print("turn latency: median {:.1f} ms, 99th percentile {:.1f} ms".format(
+        1000 * latencies[len(latencies) // 2],
+        1000 * latencies[int(len(latencies) * 0.99)]))
+    print("peak memory: {:.0f} MiB".format(rss / 1024))
+    if pool is not None:
+        metrics = pool.metrics()
+        print("AI jobs: {}, wait median {:.1f} ms, think median {:.1f} ms, "
+              "latency 99th percentile {:.1f} ms".format(
+                  metrics["jobs"], metrics["wait_ms"]["median"],
+                  metrics["think_ms"]["median"],
+                  metrics["latency_ms"]["p99"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=10,
+                        help="turns of the human player per game")
+    parser.add_argument("--cpus", type=int, default=1,
+                        help="computer players per game")
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--height", type=int, default=14)
+    parser.add_argument("--live-boards", type=int, default=256)
+    parser.add_argument("--bot", action="store_true",
+                        help="play the human players' turns with the bot")
+    parser.add_argument("--ai-workers", type=int, default=0,
+                        help="worker processes for the computer players")
+    parser.add_argument("--ai-budget", type=float, default=1.0,
+                        help="seconds a computer player may think per turn")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
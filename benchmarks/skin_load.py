@@ -0,0 +1,106 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Cost of loading the sprites of a skin.
+
+Times loading every sprite from its own PNG file as the client used to,
+against compiling the atlas with an empty cache and loading it from the
+cache.
+
+    python benchmarks/skin_load.py --repeat 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(str(ROOT))
+
+import pygame  # noqa: E402
+
+from territory.client.atlas import AtlasCache, skin_sprites  # noqa: E402
+from territory.configuration import ConfigurationManager  # noqa: E402
+
+
+def load_files(sprites):
+    """Every sprite from its own file, as the client loaded them."""
+    images = {}
+    for name, path, keyed in sprites:
+        if keyed:
+            image = pygame.image.load(str(path)).convert()
+        else:
+            image = pygame.image.load(str(path)).convert_alpha()
+        image.set_colorkey(image.get_at((0, 0)))
+        images[name] = image
+    return images
+
+
+def timed(function, repeat):
+    total = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        total += time.perf_counter() - start
+    return total / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    pygame.display.init()
+    pygame.display.set_mode((800, 600))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache_dir = Path(directory)
+        configuration = ConfigurationManager()
+        sprites = skin_sprites(configuration)
+
+        files = timed(lambda: load_files(sprites), args.repeat)
+
+        def cold():
+            for path in cache_dir.iterdir():
+                path.unlink()
+            AtlasCache(cache_dir).load(configuration)
+
+        compiled = timed(cold, args.repeat)
+        cache = AtlasCache(cache_dir)
+        cached = timed(lambda: cache.load(configuration), args.repeat)
+        assert cache.hit
+        print("{} sprites: files {:.2f} ms, atlas compiled {:.2f} ms, "
+              "atlas cached {:.2f} ms".format(len(sprites), 1000 * files,
+                                               1000 * compiled,
+                                               1000 * cached))
+
+
+if __name__ == "__main__":
+    main()
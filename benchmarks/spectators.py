@@ -0,0 +1,193 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Cost of serving spectators of a tournament.
+
+Plays the same tournament once for every spectator count, with the
+spectators connected from another process, and reports the server's CPU
+time per turn: the AI, encoding the sync message (done once, whatever the
+number of spectators) and fanning the shared frame out to the sockets.
+
+    python benchmarks/spectators.py --spectators 1 10 100 1000 10000
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from territory.server import Server  # noqa: E402
+from territory.server.host import GameHost  # noqa: E402
+from territory.server.network import GameServer  # noqa: E402
+from territory.server.protocol import WATCH, encode_json  # noqa: E402
+
+
+async def watch(port, game, count):
+    async def spectator():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(encode_json(WATCH, {"game": game}))
+        while await reader.read(65536):
+            pass
+
+    tasks = []
+    # Connect in batches, so as not to overflow the listen backlog
+    for start in range(0, count, 100):
+        batch = [asyncio.ensure_future(spectator())
+                 for _ in range(min(100, count - start))]
+        tasks.extend(batch)
+        await asyncio.sleep(0.05)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def spectate(port, game, count):
+    """Run count spectators of a game; meant for a separate process."""
+    asyncio.run(watch(port, game, count))
+
+
+async def measure(server, args, count):
+    host = server.host
+    # The same game for every count
+    random.seed(args.seed)
+    game = await host.new_game(humans=0, cpus=args.cpus, width=args.width,
+                               height=args.height, seed=args.seed,
+                               style=args.style)
+    # Not forked: the child must not inherit the running event loop
+    process = multiprocessing.get_context("spawn").Process(
+        target=spectate, args=(server.port, game.id, count), daemon=True)
+    process.start()
+    while len(game.watchers) < count:
+        if not process.is_alive():
+            raise RuntimeError("the spectators' process died")
+        await asyncio.sleep(0.05)
+
+    async def flushed():
+        while any(watcher.frames or watcher.behind or watcher.busy
+                  for watcher in game.watchers):
+            await asyncio.sleep(0.001)
+
+    await flushed()
+    # Time spent in cut, and in its broadcast to the spectators
+    cutting = broadcasting = 0.0
+    cut, broadcast = host.cut, host.broadcast
+
+    def timed_cut(game):
+        nonlocal cutting
+        start = time.process_time()
+        cut(game)
+        cutting += time.process_time() - start
+
+    def timed_broadcast(game, frame):
+        nonlocal broadcasting
+        start = time.process_time()
+        broadcast(game, frame)
+        broadcasting += time.process_time() - start
+
+    host.cut, host.broadcast = timed_cut, timed_broadcast
+    frames = len(game.messages)
+    total = ai = 0.0
+    turns = 0
+    for _ in range(args.turns):
+        start = time.process_time()
+        if not await host.advance(game):
+            break
+        played = time.process_time()
+        await flushed()
+        total += time.process_time() - start
+        ai += played - start
+        turns += 1
+    del host.cut, host.broadcast
+    sent = sum(len(frame) for _, _, frame in game.messages[frames:])
+    drops = sum(watcher.drops for watcher in game.watchers)
+
+    # SIGKILL: pygame turns SIGTERM into a QUIT event
+    process.kill()
+    process.join()
+    while game.watchers:
+        await asyncio.sleep(0.05)
+    host.drop(game)
+
+    turns = max(turns, 1)
+    ai -= cutting
+    encoding = cutting - broadcasting
+    fan_out = total - ai - encoding
+    return {
+        "spectators": count,
+        "turns": turns,
+        "cpu_ms_per_turn": 1000 * total / turns,
+        "ai_ms_per_turn": 1000 * ai / turns,
+        "encode_ms_per_turn": 1000 * encoding / turns,
+        "fan_out_ms_per_turn": 1000 * fan_out / turns,
+        "fan_out_us_per_spectator": 1e6 * fan_out / turns / count,
+        "frame_bytes_per_turn": sent / turns,
+        "drops": drops,
+    }
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as directory:
+        host = GameHost(Server(ROOT), Path(directory))
+        # Turns are played by measure, not by the server
+        server = GameServer(host, turn_interval=1e9)
+        await server.start()
+        results = []
+        for count in args.spectators:
+            result = await measure(server, args, count)
+            results.append(result)
+            if not args.json:
+                print("{spectators:6} spectators: {cpu_ms_per_turn:7.2f} ms "
+                      "CPU per turn (AI {ai_ms_per_turn:.2f}, encoding "
+                      "{encode_ms_per_turn:.3f}, fan-out "
+                      "{fan_out_ms_per_turn:.2f} = "
+                      "{fan_out_us_per_spectator:.1f} us per spectator), "
+                      "{drops} drops".format(**result))
+        await server.close()
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spectators", type=int, nargs="+",
+                        default=[1, 10, 100, 1000])
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--cpus", type=int, default=4,
+                        help="computer players of the tournament")
+    parser.add_argument("--width", type=int, default=60)
+    parser.add_argument("--height", type=int, default=40)
+    parser.add_argument("--style", default="noise")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as JSON")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Time from starting the game to its first menu frame.
+
+Starts game.py with --startup-report (headless, unless SDL drivers are
+set) a number of times and prints the median time of every step of the
+report. Then checks that importing the game logic and the client
+initializes no fonts, sound or display.
+
+    python benchmarks/startup.py --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The last step of the report
+LAST_STEP = "sound"
+
+MEDIA_CHECK = """
+import pygame
+import territory.gameboard, territory.server, territory.client
+assert not pygame.display.get_init(), "display initialized"
+assert not pygame.font.get_init(), "fonts initialized"
+assert pygame.mixer.get_init() is None, "mixer initialized"
+"""
+
+
+def start_once(environment):
+    """Return [(step, ms since the previous, ms since the start)]."""
+    game = subprocess.Popen(
+        [sys.executable, "game.py", "--startup-report"], cwd=str(ROOT),
+        env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    steps = []
+    try:
+        for line in game.stderr:
+            fields = line.split()
+            # Steps are "name... 1.0 ms 2.0 ms"; skip any warnings
+            if len(fields) < 5 or fields[-1] != "ms" or fields[-3] != "ms":
+                continue
+            steps.append((" ".join(fields[:-4]), float(fields[-4]),
+                          float(fields[-2])))
+            if steps[-1][0] == LAST_STEP:
+                break
+    finally:
+        # The game waits in its menu; it is done with
+        game.kill()
+        game.wait()
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    environment = dict(os.environ)
+    environment.setdefault("SDL_VIDEODRIVER", "dummy")
+    environment.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    runs = [start_once(environment) for _ in range(args.runs)]
+    names = [name for name, _, _ in runs[0]]
+    print("{:<20} {:>10} {:>10}".format("step (median)", "ms", "total ms"))
+    for index, name in enumerate(names):
+        print("{:<20} {:10.1f} {:10.1f}".format(
+            name, statistics.median(run[index][1] for run in runs),
+            statistics.median(run[index][2] for run in runs)))
+
+    subprocess.run([sys.executable, "-c", MEDIA_CHECK], cwd=str(ROOT),
+                   env=environment, stdout=subprocess.DEVNULL, check=True)
+    print("importing the game initializes no media")
+
+
+if __name__ == "__main__":
+    main()
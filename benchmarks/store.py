@@ -0,0 +1,139 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Cost of keeping hosted games in a GameStore, and of recovering them.
+
+Plays tournaments with and without a store and reports turns per second
+(the games differ from run to run, so play enough of them), then times the
+recovery of a store of many games and the first use of some of them. To
+fill it quickly, the rows of a hundred played games are copied under new
+ids.
+
+    python benchmarks/store.py --games 100 --turns 50 --recovery-games 10000
+"""
+
+import argparse
+import asyncio
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from territory.server import Server  # noqa: E402
+from territory.server.host import GameHost  # noqa: E402
+from territory.server.store import GameStore  # noqa: E402
+
+
+async def play(host, args, games, turns):
+    """Play turns of games tournaments; return the seconds it took."""
+    random.seed(args.seed)
+    start = time.perf_counter()
+    for index in range(games):
+        game = await host.new_game(humans=0, cpus=args.cpus,
+                                   width=args.width, height=args.height,
+                                   seed=args.seed + index)
+        for _ in range(turns):
+            await host.advance(game)
+    return time.perf_counter() - start
+
+
+async def run(args):
+    server = Server(ROOT)
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        host = GameHost(server, directory)
+        elapsed = await play(host, args, args.games, args.turns)
+        print("without store: {} turns in {:.2f} s, {:.0f} turns/s".format(
+            host.turns, elapsed, host.turns / elapsed))
+
+        store = GameStore(directory / "games.sqlite")
+        host = GameHost(server, directory, store=store)
+        elapsed = await play(host, args, args.games, args.turns)
+        start = time.perf_counter()
+        store.flush()
+        flushed = time.perf_counter() - start
+        print("with store: {} turns in {:.2f} s, {:.0f} turns/s, "
+              "{:.2f} s more to flush; {} rows in {} batches".format(
+                  host.turns, elapsed, host.turns / elapsed, flushed,
+                  store.rows, store.batches))
+        store.close()
+
+        path = directory / "recovery.sqlite"
+        store = GameStore(path)
+        host = GameHost(server, directory, store=store)
+        distinct = min(100, args.recovery_games)
+        await play(host, args, distinct, args.recovery_turns)
+        store.flush()
+        store.close()
+        with sqlite3.connect(str(path)) as connection:
+            for offset in range(distinct, args.recovery_games, distinct):
+                count = min(distinct, args.recovery_games - offset)
+                connection.execute(
+                    "INSERT INTO games SELECT id + ?, info, snapshot, rng, "
+                    "position FROM games WHERE id <= ?", (offset, count))
+                connection.execute(
+                    "INSERT INTO log SELECT game + ?, position, records "
+                    "FROM log WHERE game <= ?", (offset, count))
+        size = path.stat().st_size
+
+        host = GameHost(server, directory, store=GameStore(path))
+        start = time.perf_counter()
+        recovered = host.recover()
+        elapsed = time.perf_counter() - start
+        print("recovered {} games ({:.1f} MiB) in {:.2f} s, {:.0f} "
+              "games/s".format(recovered, size / 2 ** 20, elapsed,
+                               recovered / elapsed))
+        games = list(host.games.values())[:args.first_use]
+        start = time.perf_counter()
+        for game in games:
+            host.board(game)
+        elapsed = time.perf_counter() - start
+        print("first use of {} games, replaying their logs: {:.1f} ms "
+              "each".format(len(games), 1000 * elapsed / len(games)))
+        host.store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=50,
+                        help="turns played in each game")
+    parser.add_argument("--recovery-games", type=int, default=10000)
+    parser.add_argument("--recovery-turns", type=int, default=25,
+                        help="turns played in each game to recover")
+    parser.add_argument("--first-use", type=int, default=1000,
+                        help="recovered games then used, to time replays")
+    parser.add_argument("--cpus", type=int, default=3)
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--height", type=int, default=14)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Size of sync messages compared with full snapshots.
+
+Plays computer players on a large map, cuts a sync message (see
+territory.sync) after every turn, checks that a copy kept in step with
+them matches the game, and reports their sizes next to those of the
+snapshots a client would otherwise download.
+
+    python benchmarks/sync_size.py --width 200 --height 150 --cpus 16
+"""
+
+import argparse
+import random
+import sys
+import time
+import zlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from territory.server import Server  # noqa: E402
+from territory.server.serverboard import ServerBoard  # noqa: E402
+from territory.sync import (  # noqa: E402
+    KEYFRAME_MAGIC, SyncEncoder, SyncMirror)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=120)
+    parser.add_argument("--height", type=int, default=80)
+    parser.add_argument("--cpus", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--style", default="noise")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keyframe-interval", type=int, default=50)
+    args = parser.parse_args()
+
+    server = Server(ROOT)
+    board = ServerBoard(server, server.ruleset)
+    board.new_game(cpus=args.cpus, humans=0, width=args.width,
+                   height=args.height, seed=args.seed, style=args.style)
+    copy = ServerBoard(server, server.ruleset)
+    random.seed(args.seed)
+
+    encoder = SyncEncoder(board, args.keyframe_interval)
+    mirror = SyncMirror(copy)
+    mirror.apply(encoder.keyframe())
+    deltas, keyframes, snapshots, compressed = [], [], [], []
+    encoding = 0.0
+    for _ in range(args.turns):
+        player = board.get_player_by_side(board.turn)
+        if player is not None and not player.lost:
+            player.ai_controller.act()
+            board.land_was_conquered()
+        board.end_turn()
+        if any(player.won for player in board.playerlist):
+            break
+
+        start = time.perf_counter()
+        message = encoder.delta()
+        encoding += time.perf_counter() - start
+        if message is None:
+            continue
+        mirror.apply(message)
+        snapshot = board.snapshot()
+        if copy.snapshot() != snapshot:
+            raise AssertionError("the copy differs after turn {}".format(
+                board.turn))
+        if message.startswith(KEYFRAME_MAGIC):
+            keyframes.append(len(message))
+        else:
+            deltas.append(len(message))
+        snapshots.append(len(snapshot))
+        compressed.append(len(zlib.compress(snapshot)))
+
+    def mean(sizes):
+        return sum(sizes) / len(sizes) if sizes else 0
+
+    sent = sum(deltas) + sum(keyframes)
+    print("{}x{} map, {} players, {} messages".format(
+        args.width, args.height, len(board.playerlist), len(snapshots)))
+    print("deltas: {}, mean {:.0f} B, max {} B".format(
+        len(deltas), mean(deltas), max(deltas, default=0)))
+    print("keyframes: {}, mean {:.0f} B".format(
+        len(keyframes), mean(keyframes)))
+    print("snapshots: mean {:.0f} B, compressed {:.0f} B".format(
+        mean(snapshots), mean(compressed)))
+    print("sent {} B instead of {} B ({:.1%}), {} B compressed".format(
+        sent, sum(snapshots), sent / max(sum(snapshots), 1),
+        sum(compressed)))
+    print("encoding: {:.2f} ms per message".format(
+        1000 * encoding / max(len(snapshots), 1)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Frame times of the game view at every zoom level, on a large map.
+
+Starts a game of computer players on a dummy display, by default on a
+1000x1000 noise map, and times ClientBoard.render at every zoom level:
+the first frame after zooming there, idle frames, frames after one hex
+in view changes owner and frames scrolled a step.
+
+    python benchmarks/viewport.py --frames 100 --width 1000 --height 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(str(ROOT))
+
+import pygame  # noqa: E402
+
+pygame.display.init()
+screen = pygame.display.set_mode((800, 600))
+
+from territory.client.resources import ImageHandler  # noqa: E402
+from territory.client.ui import Client  # noqa: E402
+from territory.client.viewport import ZOOM_LEVELS  # noqa: E402
+from territory.server import Server  # noqa: E402
+
+
+def timed(board, change, frames):
+    """Return the mean milliseconds of change() then board.render()."""
+    elapsed = 0
+    for _ in range(frames):
+        change()
+        start = time.perf_counter()
+        board.render()
+        elapsed += time.perf_counter() - start
+    return 1000 * elapsed / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=100,
+                        help="frames timed in each case")
+    parser.add_argument("--cpus", type=int, default=6)
+    parser.add_argument("--width", type=int, default=1000)
+    parser.add_argument("--height", type=int, default=1000)
+    parser.add_argument("--style", default="noise")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    client = Client(screen, ImageHandler(), ROOT, Server(ROOT))
+    client.load_interface_images()
+    client.load_graphics()
+    board = client.board
+    view = board.view
+    random.seed(args.seed)
+    start = time.perf_counter()
+    board.new_game(cpus=args.cpus, humans=0, width=args.width,
+                   height=args.height, seed=args.seed, style=args.style)
+    print("{}x{} game made in {:.1f} s".format(
+        args.width, args.height, time.perf_counter() - start))
+    repainted = []
+
+    def idle():
+        pass
+
+    def repaint():
+        # Give a hex in view another colour, putting back the one given
+        # before
+        if repainted:
+            (x, y), owner = repainted.pop()
+            board.data[x, y] = owner
+        x = random.randrange(view.scroll_x, min(
+            view.scroll_x + view.level.columns, board.width))
+        y = random.randrange(view.scroll_y, min(
+            view.scroll_y + view.level.rows, board.height))
+        repainted.append(((x, y), board.data[x, y]))
+        board.data[x, y] = board.data[x, y] % args.cpus + 1
+
+    def scroll():
+        # Wander around the middle of the map
+        dx = random.choice((-1, 1))
+        dy = random.choice((-1, 1))
+        if view.scroll_x + dx * view.level.columns > board.width / 2:
+            dx = -1
+        if view.scroll_y + dy * view.level.rows > board.height / 2:
+            dy = -1
+        view.scroll(dx, dy)
+
+    print("{:<10}{:>7}{:>12}{:>12}{:>12}{:>12}".format(
+        "level", "hexes", "zoom (ms)", "idle (ms)", "hex (ms)", "scroll (ms)"))
+    for zoom_level, level in enumerate(ZOOM_LEVELS):
+        view.zoom(zoom_level - view.zoom_level)
+        view.scroll_to((board.width - level.columns) // 2,
+                       (board.height - level.rows) // 2)
+        zoomed = timed(board, idle, 1)
+        times = [timed(board, change, args.frames)
+                 for change in (idle, repaint, scroll)]
+        if repainted:
+            (x, y), owner = repainted.pop()
+            board.data[x, y] = owner
+        print("{:<10}{:>7}{:>12.2f}{:>12.2f}{:>12.2f}{:>12.2f}".format(
+            level.drawing, level.columns * level.rows, zoomed, *times))
+
+
+if __name__ == "__main__":
+    main()
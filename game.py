@@ -24,14 +24,18 @@
 #
 # ------------------------------------------------------------------------
 
+# Imported first, so that the imports are timed too
+from territory import startup
+
 import random
 import time
-from sys import path
+from sys import argv, path
 from pathlib import Path
 
 import pygame
 
 from territory import soundtrack
+from territory.catalogue import describe
 from territory.client import gamemenu
 import territory.client.resources
 from territory.client.ui import Client
@@ -39,153 +43,185 @@ from territory.server import Server
 
 _DEBUG = 0
 
-# Initialize pygame
-pygame.init()
+startup.step("imports")
+
+
+def main():
+    # Initialize the display; fonts are initialized when first used, and sound
+    # once the menu is shown
+    pygame.display.init()
+
+    # Path for game's graphics
+    graphics_root = Path('images')
 
-# Path for game's graphics
-graphics_root = Path('images')
+    # Set the icon for the game window
+    pygame.display.set_icon(
+        pygame.image.load(str(graphics_root / "soldier.png")))
 
-# Set the icon for the game window
-pygame.display.set_icon(pygame.image.load(str(graphics_root / "soldier.png")))
+    # Generate new random seed
+    random.seed(round(time.time()))
 
-# Generate new random seed
-random.seed(round(time.time()))
+    # Instance of ImageHandler to contain used images in one place
+    ih = territory.client.resources.ImageHandler()
 
-# Instance of ImageHandler to contain used images in one place
-ih = territory.client.resources.ImageHandler()
+    # Setting Release Version...
+    conquer_version = "0.2.2"
 
-# Setting Release Version...
-conquer_version = "0.2.2"
+    # Initialize the screen and set resolution
+    screeni = pygame.display.set_mode((800, 600))
 
-# Initialize the screen and set resolution
-screeni = pygame.display.set_mode((800, 600))
+    # Set windows caption
+    pygame.display.set_caption("Territory " + conquer_version)
 
-# Set windows caption
-pygame.display.set_caption("Territory " + conquer_version)
+    # Resources are greatly saved with this
+    pygame.event.set_blocked(pygame.MOUSEMOTION)
 
-# Resources are greatly saved with this
-pygame.event.set_blocked(pygame.MOUSEMOTION)
+    # Fill the screen with black color
+    screeni.fill((0, 0, 0))
 
-# Fill the screen with black color
-screeni.fill((0, 0, 0))
+    startup.step("display")
 
-# Create the server.
-server = Server(Path(path[0]))
+    # Create the server.
+    server = Server(Path(path[0]))
 
-# Create the Game Board
-# Parameters: pygame screen, image container and game path
-client = Client(screeni, ih, Path(path[0]), server)
-gb = client.board
+    # Create the Game Board
+    # Parameters: pygame screen, image container and game path
+    client = Client(screeni, ih, Path(path[0]), server)
+    gb = client.board
 
-# Load interface images
-client.load_interface_images()
+    startup.step("configuration")
 
-# Load the other images
-client.load_graphics()
+    # Load interface images
+    client.load_interface_images()
 
+    # Load the other images
+    client.load_graphics()
 
-# Generate main menu
-mainmenu = gamemenu.GameMenu(
-    client, ih.gi("menu_interface"), ih.gi("logo"),
-    [("Play Scenario", 0, [], "Play a premade map"),
-     ("Play Random Island", 1, [], "Generate and play a random map"),
-     ("Options", 2, [], "Modify your game experience"),
-     ("Map Editor", 3, [], "Edit your own scenario"),
-     ("Quit", 4, [], "Exits the program")],
-    (800 / 2 - 10, 200),
-    settings=client.configuration.skin("menu", {}),
-    spacing=60)
+    startup.step("images")
 
-# Generate Options menu
-optionsmenu = gamemenu.GameMenu(
-    client, ih.gi("menu_interface"), ih.gi("logo"),
-    [("Show CPU moves with lines", 0,
-      ["value_bool_editor", gb.show_cpu_moves_with_lines],
-      "(Use left and right arrow key) Show CPU soldiers moves with lines."),
-     ("Return", 2, [], None)],
-    (800 / 2 - 10, 200), settings=client.configuration.skin("menu", {}),
-    spacing=60)
 
-soundtrack.init()
+    # Generate main menu
+    mainmenu = gamemenu.GameMenu(
+        client, ih.gi("menu_interface"), ih.gi("logo"),
+        [("Play Scenario", 0, [], "Play a premade map"),
+         ("Play Random Island", 1, [], "Generate and play a random map"),
+         ("Options", 2, [], "Modify your game experience"),
+         ("Map Editor", 3, [], "Edit your own scenario"),
+         ("Quit", 4, [], "Exits the program")],
+        (800 / 2 - 10, 200),
+        settings=client.configuration.skin("menu", {}),
+        spacing=60)
 
-# The true main loop behind the whole application
-main_loop_running = True
-while main_loop_running:
-    # Get selection from main menu
-    tulos = mainmenu.get_selection()
-    if tulos == 0:
+    # Generate Options menu
+    optionsmenu = gamemenu.GameMenu(
+        client, ih.gi("menu_interface"), ih.gi("logo"),
+        [("Show CPU moves with lines", 0,
+          ["value_bool_editor", gb.show_cpu_moves_with_lines],
+          "(Use left and right arrow key) "
+          "Show CPU soldiers moves with lines."),
+         ("Return", 2, [], None)],
+        (800 / 2 - 10, 200), settings=client.configuration.skin("menu", {}),
+        spacing=60)
 
-        # Dynamically generate menu items from scenario - files
+    # Show the main menu as soon as possible
+    mainmenu.draw_items()
+    pygame.display.flip()
+    startup.step("first menu frame")
 
-        # Read scenarios
-        scenarios = gb.read_scenarios()
+    soundtrack.init()
+    startup.step("sound")
 
-        generated_menu_items = [("Back to Menu", 0, [], None)]
+    if "--startup-report" in argv[1:]:
+        startup.report()
 
-        # Add option to step back to main menu
+    # The true main loop behind the whole application
+    main_loop_running = True
+    while main_loop_running:
+        # Get selection from main menu
+        tulos = mainmenu.get_selection()
+        if tulos == 0:
 
-        # Add scenarios as menuitems
-        for i, scenario in enumerate(scenarios):
-            generated_menu_items.append((scenario.name, i + 1, [], None))
+            # Dynamically generate menu items from scenario - files
 
-        # Build the menu
-        newgamemenu = gamemenu.GameMenu(
-            client, ih.gi("menu_interface"), ih.gi("logo"),
-            generated_menu_items, (800 / 2 - 10, 200),
-            settings=client.configuration.skin("menu", {}),
-            spacing=30)
+            # Read scenarios and their metadata from the catalogue
+            scenarios = server.catalogue.scenarios()
 
-        # Get selection from the newly build menu
-        selection = newgamemenu.get_selection()
-        if selection > 0:
-            # User selected a scenario
+            generated_menu_items = [("Back to Menu", 0, [], None)]
+
+            # Add option to step back to main menu
+
+            # Add scenarios as menuitems, with a summary as caption
+            for i, scenario in enumerate(scenarios):
+                generated_menu_items.append(
+                    (scenario.name, i + 1, [], describe(scenario)))
+
+            # Build the menu
+            newgamemenu = gamemenu.GameMenu(
+                client, ih.gi("menu_interface"), ih.gi("logo"),
+                generated_menu_items, (800 / 2 - 10, 200),
+                settings=client.configuration.skin("menu", {}),
+                spacing=30)
+
+            # Get selection from the newly build menu
+            selection = newgamemenu.get_selection()
+            if selection > 0:
+                # User selected a scenario
+                gb.map_edit_mode = False
+                gb.new_game(file=newgamemenu.menuitems[selection][0])
+                gb.start_game()
+
+        # User selected to generate a random map
+        elif tulos == 1:
+            # Ask player counts
+            m1, m2 = client.get_human_and_cpu_count()
             gb.map_edit_mode = False
-            gb.new_game(file=newgamemenu.menuitems[selection][0])
+
+            # Initialize a new game
+            gb.new_game(cpus=m2, humans=m1)
+
+            # Start the game
             gb.start_game()
 
-    # User selected to generate a random map
-    elif tulos == 1:
-        # Ask player counts
-        m1, m2 = client.get_human_and_cpu_count()
-        gb.map_edit_mode = False
-
-        # Initialize a new game
-        gb.new_game(cpus=m2, humans=m1)
-
-        # Start the game
-        gb.start_game()
-
-    # User selected to see options
-    elif tulos == 2:
-        while True:
-            # Get selections from the options menu and break the loop
-            # if user wants to get back to the main menu
-            tulos2 = optionsmenu.get_selection()
-            if tulos2 == 2:
-                break
-
-    # User selected to edit a scenario
-    elif tulos == 3:
-        # FIXME: little better looking
-        # Ask player counts
-        m1, m2 = client.get_human_and_cpu_count()
-
-        # Fill map with empty space
-        gb.fill_map(0)
-
-        # Turn the editing mode on
-        gb.playerlist = []
-        gb.map_edit_mode = True
-        gb.map_edit_info = [m1, m2, 1]
-        gb.actors.clear()
-
-        # Start Editing
-        gb.start_game()
-        # Editing Finished
-
-        gb.map_edit_mode = False
-        gb.map_edit_info = []
-
-    # User selected to quit the game
-    elif tulos == 4:
-        main_loop_running = False
+        # User selected to see options
+        elif tulos == 2:
+            while True:
+                # Get selections from the options menu and break the loop
+                # if user wants to get back to the main menu
+                tulos2 = optionsmenu.get_selection()
+                if tulos2 == 2:
+                    break
+
+        # User selected to edit a scenario
+        elif tulos == 3:
+            # FIXME: little better looking
+            # Ask player counts
+            m1, m2 = client.get_human_and_cpu_count()
+
+            # Fill map with empty space
+            gb.fill_map(0)
+
+            # Turn the editing mode on
+            gb.playerlist = []
+            gb.map_edit_mode = True
+            gb.map_edit_info = [m1, m2, 1]
+            gb.actors.clear()
+
+            # Start Editing
+            gb.start_game()
+            # Editing Finished
+
+            gb.map_edit_mode = False
+            gb.map_edit_info = []
+
+        # User selected to quit the game
+        elif tulos == 4:
+            main_loop_running = False
+
+    # Stop generating random maps in the background
+    if gb.map_pool is not None:
+        gb.map_pool.close()
+
+
+if __name__ == "__main__":
+    # Worker processes of the map pool import this module without running it
+    main()
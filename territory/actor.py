@@ -51,3 +51,50 @@ class Actor:
         self.level += 1
         if sound:
             soundtrack.play_sfx("upgrade")
+
+
+class ActorSet(set):
+    """A set of actors that also indexes them by position.
+
+    Actors in the set must be moved with move(), so the index stays valid.
+    """
+
+    def __init__(self, actors=()):
+        super().__init__()
+        # Actor at each position; the last one added if several share it
+        self.positions = {}
+        self.update(actors)
+
+    def add(self, actor: Actor):
+        super().add(actor)
+        self.positions[actor.x, actor.y] = actor
+
+    def discard(self, actor: Actor):
+        super().discard(actor)
+        if self.positions.get((actor.x, actor.y)) is actor:
+            del self.positions[actor.x, actor.y]
+
+    def remove(self, actor: Actor):
+        if actor not in self:
+            raise KeyError(actor)
+        self.discard(actor)
+
+    def clear(self):
+        super().clear()
+        self.positions.clear()
+
+    def update(self, *iterables):
+        for actors in iterables:
+            for actor in actors:
+                self.add(actor)
+
+    def move(self, actor: Actor, x, y):
+        """Move an actor of the set to (x, y)."""
+        if self.positions.get((actor.x, actor.y)) is actor:
+            del self.positions[actor.x, actor.y]
+        actor.x, actor.y = x, y
+        self.positions[x, y] = actor
+
+    def at(self, x, y):
+        """Return the actor at (x, y), or None."""
+        return self.positions.get((x, y))
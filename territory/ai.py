@@ -22,6 +22,8 @@
 # ------------------------------------------------------------------------
 
 import random
+import time
+
 from territory.actor import Actor
 
 AI_RECURSION_DEPTH = 10
@@ -36,7 +38,12 @@ class AI:
         self.board = board
         self.server = board.server
 
-    def act(self):
+    def act(self, deadline=None):
+        """Play the current player's turn, without ending it.
+
+        :param deadline: time.monotonic() value after which no more soldiers
+            are moved.
+        """
         # Buy units first.
         self.buy_units_by_turn()
 
@@ -52,6 +59,8 @@ class AI:
         for depth in range(AI_RECURSION_DEPTH):
             # We'll iterate every actor through a copy
             for current_actor in own_soldier_actor_set.copy():
+                if deadline is not None and time.monotonic() >= deadline:
+                    return act_list
                 if current_actor.dead:
                     continue
                 # We'll move only own soldiers that have not moved yet
@@ -63,8 +72,6 @@ class AI:
                     # Memory for found move's points
                     m_p = 0
 
-                    # Make a copy of the original map
-                    map_copy = self.board.data.copy()
                     pisteet = []
                     koords = []
                     loppulaskija = 0
@@ -91,13 +98,30 @@ class AI:
                                 current_actor, x2, y2)
                             if not is_blocked[0]:
 
+                                # The map is restored after the simulation
+                                version = self.board.data.version
+
                                 # The move is possible, we'll simulate it
                                 self.board.attempt_move(current_actor, x2, y2,
                                                         True)
-
-                                # The points of the move
-                                move_score = self.board.rek.island_size(
-                                    current_actor.x, current_actor.y)
+                                conquered = \
+                                    self.board.data[x2, y2] == self.board.turn
+
+                                # Restore the original owner of the target
+                                # (the only land a simulated move changes),
+                                # so what was cached about the map still
+                                # holds
+                                self.board.data[x2, y2] = pala2
+                                self.board.data.version = version
+
+                                # The points of the move: the size of the
+                                # island after it
+                                if conquered:
+                                    move_score = self.board.rek.joined_size(
+                                        x2, y2, self.board.turn)
+                                else:
+                                    move_score = self.board.rek.island_size(
+                                        current_actor.x, current_actor.y)
 
                                 # Is there an actor at target land?
                                 defender = self.board.actor_at(x2, y2)
@@ -115,10 +139,6 @@ class AI:
                                 pisteet.append(move_score)
                                 koords.append((x2, y2))
 
-                                # Restore the original map and try different moves
-                                self.board.data = {}
-                                self.board.data.update(map_copy)
-
                                 # Found move better than the one in memory?
                                 if move_score > m_p:
                                     # Yes it is, update
@@ -151,7 +171,6 @@ class AI:
                                             current_actor.x, current_actor.y] = m_x, m_y
                                         self.board.attempt_move(current_actor,
                                                                 m_x, m_y, False)
-                                        map_copy = self.board.data.copy()
                                         found_solution = True
                                         own_soldier_actor_set.discard(
                                             current_actor)
@@ -170,7 +189,7 @@ class AI:
     def maintain_soldiers(self, city: Actor):
         """Draft and improve soldiers in the given city's island."""
         # Island's land coordinates
-        place = list(self.board.rek.crawl(city.x, city.y, [city.side]))
+        place = list(self.board.rek.island(city.x, city.y))
 
         # Draft soldiers
         self.draft_soldiers_in_city(city, place)
@@ -217,6 +236,8 @@ class AI:
         # When we'll stop?
         critical_cash = board.server.ruleset.draft_cost
 
+        places = set(places)
+
         # Iterate through actors
         for _ in range(board.server.ruleset.max_level):
             for unit in board.actors:
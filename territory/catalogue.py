@@ -0,0 +1,239 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Index of the scenario directory with cached metadata and start states."""
+
+import collections
+import hashlib
+import json
+import os
+import warnings
+from pathlib import Path
+
+# Bump when the index or the cached states change meaning.
+INDEX_VERSION = 2
+
+ScenarioInfo = collections.namedtuple(
+    'ScenarioInfo',
+    ['name', 'path', 'hash', 'width', 'height', 'players', 'land', 'islands',
+     'dumps']
+)
+
+# A dump of the prepared first turn; the side is the owner of its hex.
+FirstDump = collections.namedtuple(
+    'FirstDump', ['x', 'y', 'supplies', 'revenue', 'expenses'])
+
+
+def describe(info: ScenarioInfo):
+    """Return a one-line summary of a scenario for menus."""
+    humans = info.players.count("human")
+    cpus = info.players.count("ai")
+    return "{}×{}, {} human / {} CPU, {} islands".format(
+        info.width, info.height, humans, cpus, info.islands)
+
+
+def file_hash(path: Path):
+    with path.open('rb') as file:
+        return hashlib.blake2b(file.read(), digest_size=16).hexdigest()
+
+
+def is_scenario_file(path: Path):
+    return (path.is_file()  # no directories
+            and path.name[0] != "."  # no hidden files
+            and path.name[-1] != "~")  # no backup files
+
+
+class ScenarioCatalogue:
+    """Scenario metadata and prepared start states, cached on disk.
+
+    The directory is only listed again when its modification time changes,
+    and a scenario is only loaded again when its size and modification time
+    change and its contents hash differently.
+    """
+
+    def __init__(self, server, cache_dir: Path = None):
+        self.server = server
+        self.scenario_dir = server.game_path / "scenarios"
+        if cache_dir is None:
+            cache_dir = server.game_path / "cache" / "scenarios"
+        self.cache_dir = cache_dir
+        self.index_path = cache_dir / "index.json"
+
+        # Cached index entries by file name
+        self.index = self.read_index()
+
+        # True when the index has changes not yet written to disk
+        self.dirty = False
+
+        # Directory listing and the directory mtime it was made at
+        self.listing = []
+        self.listing_mtime = None
+
+    def read_index(self):
+        try:
+            with self.index_path.open('r') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != INDEX_VERSION:
+            return {}
+        return index.get("scenarios", {})
+
+    def write_index(self):
+        self.dirty = False
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            temporary = self.index_path.with_suffix(".tmp")
+            with temporary.open('w') as file:
+                json.dump({"version": INDEX_VERSION,
+                           "scenarios": self.index}, file)
+            os.replace(str(temporary), str(self.index_path))
+        except OSError as e:
+            # The cache is an optimization; a read-only install still works.
+            warnings.warn("Cannot write scenario index: {}".format(e))
+
+    def state_path(self, digest):
+        return self.cache_dir / "states" / (digest + ".state")
+
+    def scenarios(self):
+        """Return ScenarioInfo for every readable scenario, sorted by name."""
+        self.refresh()
+        return [self.entry_info(name) for name in self.listing]
+
+    def info(self, name):
+        """Return the up-to-date ScenarioInfo of one scenario, or None."""
+        self.refresh()
+        path = self.scenario_dir / name
+        # Files edited in place do not change the directory's mtime.
+        if name not in self.listing or not self.check(path):
+            return None
+        if self.dirty:
+            self.write_index()
+        return self.entry_info(name)
+
+    def entry_info(self, name):
+        entry = self.index[name]
+        return ScenarioInfo(
+            name, self.scenario_dir / name, entry["hash"], entry["width"],
+            entry["height"], entry["players"], entry["land"],
+            entry["islands"], [FirstDump(*dump) for dump in entry["dumps"]])
+
+    def initial_state(self, name):
+        """Return the snapshot of the scenario's first turn, or None."""
+        info = self.info(name)
+        if info is None:
+            return None
+        try:
+            return self.state_path(info.hash).read_bytes()
+        except OSError:
+            return None
+
+    def check(self, path: Path):
+        """Bring the index entry of path up to date.
+
+        Return False if the scenario cannot be read.
+        """
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        entry = self.index.get(path.name)
+        if entry is not None and entry["mtime"] == stat.st_mtime_ns \
+                and entry["size"] == stat.st_size:
+            return True
+
+        digest = file_hash(path)
+        if entry is None or entry["hash"] != digest:
+            try:
+                entry = self.index_scenario(path, digest)
+            except (OSError, ValueError, KeyError) as e:
+                warnings.warn("Skipping scenario {}: {}".format(path.name, e))
+                if self.index.pop(path.name, None) is not None:
+                    self.dirty = True
+                return False
+        entry["mtime"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        self.index[path.name] = entry
+        self.dirty = True
+        return True
+
+    def refresh(self):
+        """Update the index for changed, added and removed scenarios.
+
+        Does nothing unless the directory's mtime has changed.
+        """
+        try:
+            mtime = self.scenario_dir.stat().st_mtime_ns
+        except OSError:
+            self.listing = []
+            return
+        if mtime == self.listing_mtime:
+            return
+
+        self.listing = [path.name
+                        for path in sorted(self.scenario_dir.iterdir())
+                        if is_scenario_file(path) and self.check(path)]
+        for name in set(self.index) - set(self.listing):
+            del self.index[name]
+            self.dirty = True
+        if self.dirty:
+            self.write_index()
+        self.listing_mtime = mtime
+
+    def index_scenario(self, path: Path, digest):
+        """Load a scenario, prepare its first turn and cache the result."""
+        # Imported here because the game board itself uses the catalogue.
+        from territory.gameboard import GameBoard
+
+        board = GameBoard(self.server, self.server.ruleset)
+        board.load_map(path)
+        board.prepare_first_turn()
+
+        islands = 0
+        searched = set()
+        for xy, owner in board.data.items():
+            if owner > 0 and xy not in searched:
+                island = board.rek.crawl(xy[0], xy[1], [owner])
+                searched.update(island)
+                if len(island) > 1:
+                    islands += 1
+
+        state_path = self.state_path(digest)
+        try:
+            state_path.parent.mkdir(parents=True, exist_ok=True)
+            state_path.write_bytes(board.snapshot())
+        except OSError as e:
+            warnings.warn("Cannot cache scenario state: {}".format(e))
+
+        return {
+            "hash": digest,
+            "width": board.width,
+            "height": board.height,
+            "players": ["ai" if player.ai_controller else "human"
+                        for player in board.playerlist],
+            "land": board.count_world_area(),
+            "islands": islands,
+            "dumps": sorted([actor.x, actor.y, actor.supplies, actor.revenue,
+                             actor.expenses]
+                            for actor in board.actors if actor.dump)
+        }
@@ -0,0 +1,182 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Sprites of a skin compiled into a texture atlas, cached on disk.
+
+The hex tiles, soldiers, dump and skull of a skin are packed into one
+image with per-pixel alpha; the pixels of the colour key of sprites drawn
+with one are made transparent. Images are subsurfaces of the atlas, so
+blitting one blits a rectangle of it.
+
+The atlas is kept in cache/skins as raw pixels with an index, under the
+hash of the skin file. It is used again as long as the images it was made
+from keep their size and modification time, so no PNG is decoded.
+"""
+
+import json
+import os
+import warnings
+from pathlib import Path
+
+import pygame
+
+from territory.catalogue import file_hash
+
+# Bump when the atlas or its index change meaning.
+ATLAS_VERSION = 1
+
+# Width the sprites are packed in
+ATLAS_WIDTH = 256
+
+# Hex tiles of a skin, for players 1...HEX_TILES
+HEX_TILES = 6
+
+
+def skin_sprites(configuration):
+    """Return (name, path, keyed) of the sprites of the skin.
+
+    keyed sprites are drawn with the colour of their top left pixel as
+    colour key, the others with their alpha channel.
+    """
+    sprites = []
+
+    # Hextiles 1...6
+    hextile_path = Path(configuration.skin("hextile.folder", ["images"])[0])
+    for i in range(1, HEX_TILES + 1):
+        sprites.append((str(i), hextile_path / "hextile{}_.png".format(i),
+                        True))
+
+    # Soldiers of levels 1...6
+    uisettings = configuration.skin("unitimage", {})
+    unit_path = Path(uisettings.get("folder", ["images"])[0])
+    default_unit_path = uisettings.get("default", ["soldier.png"])[0]
+    for i in range(1, 7):
+        uimg = uisettings.get("soldier{}".format(i), [default_unit_path])[0]
+        sprites.append(("soldier{}".format(i), unit_path / uimg, True))
+
+    graphics_path = Path(configuration.skin("gfx.directory", ["images"])[0])
+    sprites.append(("skull", graphics_path / "skull7.png", False))
+    sprites.append(("dump", graphics_path / "armytent.png", False))
+    return sprites
+
+
+def load_sprite(path, keyed):
+    """Return a sprite as the client used to load it, with per-pixel alpha."""
+    if keyed:
+        image = pygame.image.load(str(path)).convert()
+        image.set_colorkey(image.get_at((0, 0)))
+        # The colour key becomes transparency
+        return image.convert_alpha()
+    return pygame.image.load(str(path)).convert_alpha()
+
+
+def pack(sizes, width=ATLAS_WIDTH):
+    """Return the rectangles of sizes packed in shelves, and the height."""
+    rects = [None] * len(sizes)
+    x = y = shelf = 0
+    for index in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        w, h = sizes[index]
+        if x + w > width and x > 0:
+            x, y = 0, y + shelf
+            shelf = 0
+        rects[index] = pygame.Rect(x, y, w, h)
+        x += w
+        shelf = max(shelf, h)
+    return rects, y + shelf
+
+
+def compile_atlas(sprites):
+    """Return the atlas of sprites and its index of rectangles by name."""
+    images = [load_sprite(path, keyed) for _, path, keyed in sprites]
+    width = max([ATLAS_WIDTH] + [image.get_width() for image in images])
+    rects, height = pack([image.get_size() for image in images], width)
+    atlas = pygame.Surface((width, max(height, 1)), pygame.SRCALPHA)
+    for image, rect in zip(images, rects):
+        # The atlas is transparent black, so this copies the pixels as
+        # they are
+        atlas.blit(image, rect, special_flags=pygame.BLEND_RGBA_MAX)
+    return atlas, {name: tuple(rect)
+                   for (name, _, _), rect in zip(sprites, rects)}
+
+
+def stamps(sprites):
+    """Return the size and modification time of the sprites' files."""
+    result = {}
+    for _, path, _ in sprites:
+        stat = path.stat()
+        result[str(path)] = [stat.st_size, stat.st_mtime_ns]
+    return result
+
+
+class AtlasCache:
+    """Atlases of skins kept on disk, by the hash of the skin file."""
+
+    def __init__(self, cache_dir: Path = Path("cache") / "skins"):
+        self.cache_dir = cache_dir
+        # True if the last atlas loaded was found on disk, for timings
+        self.hit = False
+
+    def paths(self, digest):
+        return (self.cache_dir / (digest + ".atlas.json"),
+                self.cache_dir / (digest + ".atlas"))
+
+    def load(self, configuration):
+        """Return the atlas of the skin and its index of rectangles."""
+        sprites = skin_sprites(configuration)
+        digest = file_hash(Path(configuration.skin_path))
+        index_path, pixels_path = self.paths(digest)
+        expected = stamps(sprites)
+        try:
+            with index_path.open('r') as file:
+                index = json.load(file)
+            if index.get("version") == ATLAS_VERSION \
+                    and index.get("sources") == expected:
+                pixels = pixels_path.read_bytes()
+                atlas = pygame.image.frombytes(
+                    pixels, tuple(index["size"]), "RGBA").convert_alpha()
+                self.hit = True
+                return atlas, {name: tuple(rect)
+                               for name, rect in index["rects"].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.hit = False
+        atlas, rects = compile_atlas(sprites)
+        self.write(index_path, pixels_path, atlas, rects, expected)
+        return atlas.convert_alpha(), rects
+
+    def write(self, index_path, pixels_path, atlas, rects, sources):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            temporary = pixels_path.with_name(pixels_path.name + ".tmp")
+            temporary.write_bytes(pygame.image.tobytes(atlas, "RGBA"))
+            os.replace(str(temporary), str(pixels_path))
+            temporary = index_path.with_name(index_path.name + ".tmp")
+            with temporary.open('w') as file:
+                json.dump({"version": ATLAS_VERSION,
+                           "size": atlas.get_size(),
+                           "sources": sources, "rects": rects}, file)
+            os.replace(str(temporary), str(index_path))
+        except OSError as e:
+            # The cache is an optimization; a read-only install still works.
+            warnings.warn("Cannot write skin atlas: {}".format(e))
@@ -26,10 +26,16 @@ import time
 
 import pygame
 
-from territory import soundtrack, hex_system
+from territory import soundtrack
+from territory.hex_system import GEOMETRY
+from .computer import ComputerTurn
 from .cursor import Cursor
 from .resources import font4, font2, mono_font, font3, font1
-from territory.gameboard import GameBoard
+from .scene import Renderer, Scene
+from .terrain import FlatTiles, OwnerMap, Terrain
+from .viewport import MAP_AREA, POLYGONS, SPRITES, Viewport, ZOOM_LEVELS
+from territory.gameboard import DEFAULT_PLAYERS, GameBoard, MAX_PLAYERS
+from territory.replay import OP_MOVE, ScriptedRuleset
 from territory.ruleset import BlockedResponse
 from territory.server import Server
 
@@ -42,6 +48,24 @@ BLOCK_DESCRIPTIONS = {
     "nullmove": "Cannot move to own square!"
 }
 
+# Number of players shown on the scoreboard, leaders first
+SCOREBOARD_ROWS = 6
+
+# Players and lands listed in the map editor, inside the info panel
+EDIT_ROWS = 8
+
+# Milliseconds the game waits for events before drawing what changed anyway
+IDLE_TIMEOUT = 1000
+
+# Seconds a computer player's turn goes on before events are answered
+COMPUTER_FRAME = 1 / 30
+
+# Seconds the moves of a computer player are shown after its turn
+MOVES_SHOWN = 0.35
+
+# Seconds between frames drawn while computer turns are fast forwarded
+FAST_FORWARD_FRAME = 1.0
+
 
 def block_desc(r):
     """Get reason for being blocked."""
@@ -70,6 +94,39 @@ class ClientBoard(GameBoard):
         # If the game (actual map view) is running, running is True
         self.running = False
 
+        # Draws the interface, drawing again only what changed (see render)
+        self.renderer = Renderer(screen)
+        # The part of the map in view, scrolled and zoomed
+        self.view = Viewport(self)
+        # The land of the map as every zoom level shows it, kept drawn off
+        # the screen
+        self.terrains = []
+        for level in ZOOM_LEVELS:
+            if level.drawing == SPRITES:
+                terrain = Terrain(client.hextile, level.geometry,
+                                  level.columns, level.rows)
+            elif level.drawing == POLYGONS:
+                terrain = Terrain(
+                    FlatTiles(client.land_colour, level.geometry),
+                    level.geometry, level.columns, level.rows, MAP_AREA)
+            else:
+                terrain = OwnerMap(client.land_colour, level.geometry,
+                                   level.columns, level.rows, MAP_AREA)
+            self.terrains.append(terrain)
+        # Shown over the map: a status line, the lines of a computer
+        # player's moves, and circled hexes as (x, y, colour, radius, width,
+        # text)
+        self.status = None
+        self.cpu_moves = {}
+        self.marks = []
+
+        # The turn of the computer player in progress, if any, and when the
+        # display of its moves ends (see play_computer)
+        self.computer_turn = None
+        self.moves_shown_until = None
+        # Computer turns are played without being shown move by move
+        self.fast_forward = False
+
     @property
     def sc(self):
         """The skin configuration."""
@@ -81,94 +138,89 @@ class ClientBoard(GameBoard):
     def end_game(self):
         # Set gamerunning to false and reset to regular music
         self.running = False
+        # A computer player's thread is left to finish on its own
+        self.computer_turn = None
+        self.status = None
+        self.cpu_moves = {}
+        self.stop_recording()
         soundtrack.play_soundtrack("soundtrack")
 
+    def new_round(self):
+        # Show last player's moves
+        if not self.fast_forward:
+            time.sleep(0.2)
+        super().new_round()
+
     def new_game(self, *args, **kwargs):
         super().new_game(*args, **kwargs)
 
-        self.cursor.scroll_x = 0
+        self.view.reset()
 
+        # Calculate and sort scores, and draw everything
+        self.update_scores()
         self.draw_map()
-        # Calculate and sort scores and draw scores
-        self.draw_scoreboard(True)
 
         pygame.display.flip()
 
-        # If the first player is computer, make it act
-        if self.playerlist[0].ai_controller:
-            # The AI routines for CPU Player are called from it's AI-Controller
-            self.playerlist[0].ai_controller.act()
-            # Well anyway, make sure that dumps are on their places
-            self.land_was_conquered()
-            # Next player's turn
-            self.end_turn()
-
     def start_game(self):
         self.running = True
         # Begin the march music
         soundtrack.play_soundtrack("march")
 
-        # Instance of pygame's Clock
-        clock = pygame.time.Clock()
+        # The screen was drawn over by the menus
+        self.invalidate()
+        drawn_at = 0
 
         # The Main Loop to run a game
         while self.running:
 
-            # Limit fps to 30, smaller resource usage
-            clock.tick(30)
+            # Unless a computer player moves, wait for the human
+            waiting = True
 
             player = self.get_player_by_side(self.turn)
             if player:
                 if player.lost:
+                    waiting = False
                     self.end_turn()
                 elif player.ai_controller:
-                    kolorissi = tuple(self.sc["making_moves_text_color"])
-                    self.text_at("Player %s is making moves..." % player.name,
-                                 tuple(self.sc[
-                                           "making_moves_text_topleft_corner"]),
-                                 flip_immediately=True, font=font3,
-                                 wipe_background=False,
-                                 color=kolorissi)
-
-                    # Here the AI makes moves
-                    act_dict = player.ai_controller.act()
-
-                    self.draw_map()
-
-                    # Draw CPU player's moves
-                    if self.show_cpu_moves_with_lines:
-                        for key, value in act_dict.items():
-                            if self.isvisible(key[0],
-                                              key[1]) and self.isvisible(
-                                    value[0],
-                                    value[1]):
-                                px1, py1 = hex_map_to_pixel(
-                                    key[0] - self.cursor.scroll_x, key[1])
-                                px2, py2 = hex_map_to_pixel(
-                                    value[0] - self.cursor.scroll_x, value[1])
-                                pygame.draw.line(self.screen, (255, 0, 0),
-                                                 (px1 + 20, py1 + 20),
-                                                 (px2 + 20, py2 + 20), 2)
-
-                    self.draw_scoreboard(True)
-                    pygame.display.flip()
-                    time.sleep(0.35)  # give some time to view
-                    self.end_turn()
-                else:
-                    self.draw_map()
-                    self.draw_scoreboard(True)
-                    pygame.display.flip()
-                if player.won:
-                    self.draw_scoreboard(False)
-                    pygame.display.flip()
-
-            # Iterate through events
-            for eventti in pygame.event.get():
+                    waiting = False
+                    # The AI makes moves for a frame at most
+                    self.play_computer(player)
+
+            # Iterate through events; while waiting, sleep until there are
+            # some
+            if waiting:
+                events = wait_events(IDLE_TIMEOUT)
+            else:
+                events = pygame.event.get()
+            for eventti in events:
+                # The window was uncovered
+                if eventti.type == pygame.VIDEOEXPOSE:
+                    self.invalidate()
+                # Mouse wheel over the map: zoom, keeping the hex under the
+                # mouse where it is
+                if eventti.type == pygame.MOUSEBUTTONDOWN \
+                        and eventti.button in (4, 5):
+                    if MAP_AREA.collidepoint(eventti.pos):
+                        self.view.zoom(1 if eventti.button == 5 else -1,
+                                       eventti.pos)
                 # Mouse click
-                if eventti.type == pygame.MOUSEBUTTONDOWN:
-                    x1, y1 = pixel_to_hex_map(eventti.pos)
+                elif eventti.type == pygame.MOUSEBUTTONDOWN \
+                        and self.computer_turn is not None:
+                    # A computer player is moving: the game can only be quit
+                    self.cursor.mouse_pos = eventti.pos
+                    if eventti.button == 1 \
+                            and self.cursor.on_button("button_quit"):
+                        self.end_game()
+                elif eventti.type == pygame.MOUSEBUTTONDOWN \
+                        and self.view.zoom_level > 0 \
+                        and MAP_AREA.collidepoint(eventti.pos):
+                    # Zoomed out, a click on the map zooms in on it
+                    if eventti.button == 1:
+                        self.view.zoom(-self.view.zoom_level, eventti.pos)
+                elif eventti.type == pygame.MOUSEBUTTONDOWN:
                     # Scrolling included in calculations
-                    x1 += self.cursor.scroll_x
+                    x1, y1 = self.view.to_hex(eventti.pos)
                     # Coordinates into cursor's memory
                     self.cursor.x, self.cursor.y = x1, y1
                     self.cursor.mouse_pos = eventti.pos
@@ -179,45 +231,142 @@ class ClientBoard(GameBoard):
                     # Right mouse button = draft and update soldiers if
                     # NOT in map editing mode
                     if not self.map_edit_mode:
-                        if eventti.button == 3 and y1 < 15 and x1 < 30:
+                        if eventti.button == 3 and self.isvisible(x1, y1) \
+                                and self.isvalid(x1, y1):
                             self.draft_soldier(self.cursor.x, self.cursor.y)
                 # Key press
                 if eventti.type == pygame.KEYDOWN:
                     if eventti.key == pygame.K_LEFT:
                         # Scroll screen left
-                        self.cursor.scroll(-1)
+                        self.view.scroll(-1)
                     if eventti.key == pygame.K_RIGHT:
                         # Scroll screen right
-                        self.cursor.scroll(1)
+                        self.view.scroll(1)
+                    if eventti.key == pygame.K_PAGEUP:
+                        # Scroll screen up
+                        self.view.scroll(0, -1)
+                    if eventti.key == pygame.K_PAGEDOWN:
+                        # Scroll screen down
+                        self.view.scroll(0, 1)
+                    if eventti.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        # Zoom out
+                        self.view.zoom(1)
+                    if eventti.key in (pygame.K_PLUS, pygame.K_EQUALS,
+                                       pygame.K_KP_PLUS):
+                        # Zoom in
+                        self.view.zoom(-1)
 
                     if not self.map_edit_mode:
-                        if eventti.key == pygame.K_m:
-                            self.show_own_units_that_can_move()
-                        if eventti.key == pygame.K_e:
-                            self.end_turn()
+                        if eventti.key == pygame.K_f:
+                            # Fast forward computer turns, or stop it
+                            self.fast_forward = not self.fast_forward
+                        if self.computer_turn is None:
+                            if eventti.key == pygame.K_m:
+                                self.show_own_units_that_can_move()
+                            if eventti.key == pygame.K_e:
+                                self.end_turn()
+                        if eventti.key == pygame.K_UP:
+                            self.view.scroll(0, -1)
+                        if eventti.key == pygame.K_DOWN:
+                            self.view.scroll(0, 1)
                     else:
                         # In map editor mode, UP and DOWN keys change
                         # selected land
                         if eventti.key == pygame.K_UP:
                             self.map_edit_info[2] += 1
-                            if self.map_edit_info[2] > 6:
-                                self.map_edit_info[2] = 6
+                            if self.map_edit_info[2] > MAX_PLAYERS:
+                                self.map_edit_info[2] = MAX_PLAYERS
                         if eventti.key == pygame.K_DOWN:
                             self.map_edit_info[2] -= 1
                             if self.map_edit_info[2] < 0:
                                 self.map_edit_info[2] = 0
-                # Draw the scoreboard without calculating and sorting scores
-                self.draw_scoreboard(False)
-                # Draw the map
-                self.draw_map()
-                # Show the drawn content
-                pygame.display.flip()
+
+            # Draw what changed, without calculating and sorting scores;
+            # when fast forwarding computer turns, only now and then
+            now = time.monotonic()
+            if waiting or events or not self.fast_forward \
+                    or now - drawn_at >= FAST_FORWARD_FRAME:
+                self.render()
+                drawn_at = now
+
+    def play_computer(self, player):
+        """Go on with the turn of a computer player for a frame at most.
+
+        The player thinks in a thread on a copy of the board (see
+        ComputerTurn). The moves and drafts it makes are made here as they
+        come, each drawn unless fast forwarding, and then shown for a
+        while.
+        """
+        turn = self.computer_turn
+        if turn is None:
+            turn = self.computer_turn = ComputerTurn(self)
+            self.status = "Player %s is making moves..." % player.name
+            self.cpu_moves = {}
+            self.moves_shown_until = None
+        if not turn.finished:
+            for action in turn.take(COMPUTER_FRAME):
+                if not self.make_computer_action(action):
+                    warnings.warn("The board refused a computer player's "
+                                  "action; ending its turn.")
+                    turn.finished = True
+                    break
+                if not self.fast_forward:
+                    self.render()
+            if not turn.finished:
+                return
+
+            # Show CPU player's moves
+            self.status = None
+            self.update_scores()
+            if not self.fast_forward:
+                self.moves_shown_until = time.monotonic() + MOVES_SHOWN
+        if self.moves_shown_until is not None:
+            # Give some time to view, answering events meanwhile
+            remaining = self.moves_shown_until - time.monotonic()
+            if remaining > 0:
+                time.sleep(min(remaining, COMPUTER_FRAME))
+                return
+        self.cpu_moves = {}
+        self.computer_turn = None
+        self.end_turn()
+
+    def make_computer_action(self, action):
+        """Make a move or draft a computer player made on its copy.
+
+        Combat has the outcome it had there. Return False if the board
+        refuses the action.
+        """
+        ruleset = self.ruleset
+        self.ruleset = ScriptedRuleset(ruleset)
+        try:
+            if action[0] == OP_MOVE:
+                _, x1, y1, x2, y2, success = action
+                actor = self.actor_at(x1, y1)
+                if actor is None or actor.dump or actor.side != self.turn:
+                    return False
+                self.ruleset.outcome = success
+                result = super().attempt_move(actor, x2, y2, False)
+                if result is None or isinstance(result, BlockedResponse):
+                    return False
+                if self.show_cpu_moves_with_lines:
+                    self.cpu_moves[x1, y1] = x2, y2
+            else:
+                _, x, y = action
+                if self.draft_soldier(x, y, sound=False) is None:
+                    return False
+        finally:
+            self.ruleset = ruleset
+        return True
 
     def isvisible(self, x, y):
         """Return True if the coordinate is currently visible by player."""
-        return 0 + self.cursor.scroll_x <= x <= 14 + self.cursor.scroll_x
+        return self.view.visible(x, y)
 
-    def draw_map_edit_utilities(self):
+    def to_screen(self, x, y):
+        """Return the top left pixel of a hex on the (scrolled) screen."""
+        return self.view.to_screen(x, y)
+
+    def compose_map_edit_utilities(self, scene):
         # Extra drawing routines for scenario editing mode
 
         # Text for selected map tile
@@ -233,45 +382,41 @@ class ClientBoard(GameBoard):
                 tool_name = "Land #%d without player" % self.map_edit_info[2]
 
         # Show the selected map tile text
-        self.text_at("Selected:", (620, 80), font=font4,
-                     wipe_background=False, color=(0, 0, 0))
-        self.text_at(tool_name, (620, 100), font=font4, wipe_background=False,
-                     color=(0, 0, 0))
+        scene.text(self.client, "Selected:", (620, 80), font=font4,
+                   wipe_background=False, color=(0, 0, 0))
+        scene.text(self.client, tool_name, (620, 100), font=font4,
+                   wipe_background=False, color=(0, 0, 0))
+
+        # Draw the captions of the players and lands, as many as fit below
+        # each other around the selected one
+        humans, cpus, selected = self.map_edit_info
+        lands = max(DEFAULT_PLAYERS, humans + cpus, selected)
+        first = max(1, min(selected - EDIT_ROWS // 2, lands - EDIT_ROWS + 1))
+        last = min(lands, first + EDIT_ROWS - 1)
+        for row, land in enumerate(range(first, last + 1), 1):
+            if land <= humans:
+                caption = "Player #%d = Human" % land
+            elif land <= humans + cpus:
+                caption = "Player #%d = CPU" % land
+            else:
+                caption = "Player #%d = No player" % land
+            if (row == 1 and first > 1) or (row == EDIT_ROWS and last < lands):
+                caption = "..."
+            scene.text(self.client, caption, (620, 130 + row * 20),
+                       font=font4, wipe_background=False, color=(0, 0, 0))
 
-        # Draw players captions in the scenario
-        counter = 0
-        for i in range(0, self.map_edit_info[0]):
-            counter += 1
-            self.text_at("Player #%d = Human" % counter,
-                         (620, 130 + counter * 20), font=font4,
-                         wipe_background=False,
-                         color=(0, 0, 0))
-        for i in range(0, self.map_edit_info[1]):
-            counter += 1
-            self.text_at("Player #%d = CPU" % counter,
-                         (620, 130 + counter * 20), font=font4,
-                         wipe_background=False,
-                         color=(0, 0, 0))
-        if (6 - counter) > 0:
-            for i in range(0, (6 - counter)):
-                counter += 1
-                self.text_at("Player #%d = No player" % counter,
-                             (620, 130 + counter * 20), font=font4,
-                             wipe_background=False, color=(0, 0, 0))
-
-    def draw_actor(self, actor, px, py):
+    def compose_actor(self, scene, actor, px, py):
         if actor.dump:
             # a Resource Dump was found
-            self.screen.blit(self.client.ih.gi("dump"), (px + 3, py + 8))
+            scene.blit(self.client.ih.gi("dump"), (px + 3, py + 8))
 
             # If the dump is on our side and we are not AI controlled, then
             # we'll draw the supply count on the dump.
             if actor.side == self.turn and not self.get_player_by_side(
                     actor.side).ai_controller:
-                self.text_at(str(actor.supplies),
-                             (px + 15, py + 13),
-                             font=font2,
-                             wipe_background=False)
+                scene.text(self.client, str(actor.supplies),
+                           (px + 15, py + 13), font=font2,
+                           wipe_background=False)
         else:
             # a Soldier was found
             # Make a text for soldier-> level and X if moved
@@ -279,84 +424,131 @@ class ClientBoard(GameBoard):
             if actor.moved:
                 text += "X"
             # Draw soldier
-            self.screen.blit(
-                self.client.ih.gi("soldier" + str(actor.level)),
-                (px, py))
+            scene.blit(self.client.ih.gi("soldier" + str(actor.level)),
+                       (px, py))
             # Draw text for the soldier
-            self.text_at(text, (px + 20, py + 20), font=font1)
+            scene.text(self.client, text, (px + 20, py + 20), font=font1)
 
-    def draw_map(self):
-        """Draw the interface."""
+    def compose(self):
+        """Return the Scene of the interface as it is now."""
 
         # Draw the correct interface
         if not self.map_edit_mode:
             # Game interface
-            self.screen.blit(self.client.ih.gi("interface"), (0, 0))
-            self.draw_scoreboard(False)
+            scene = Scene(self.client.ih.gi("interface"))
+            self.compose_scoreboard(scene)
         else:
             # Map editing interface
-            self.screen.blit(self.client.ih.gi("mapedit"), (0, 0))
-            self.draw_map_edit_utilities()
-
-        # Loop pieces to be drawn (horizontally there is scrolling too)
-        for x in range(self.cursor.scroll_x, 15 + self.cursor.scroll_x):
-            for y in range(14):
-                # There is land to draw
-                if self.data[x, y] > 0:
-
-                    # Get pixel coordinates
-                    px, py = hex_map_to_pixel(x - self.cursor.scroll_x, y)
-
-                    # Draw the piece
-                    self.screen.blit(self.client.ih.gi(str(self.data[x, y])),
-                                     (px, py))
-
+            scene = Scene(self.client.ih.gi("mapedit"))
+            self.compose_map_edit_utilities(scene)
+
+        # The land, of which only hexes that changed owner are drawn again
+        view = self.view
+        x0, y0 = view.scroll_x, view.scroll_y
+        terrain = self.terrains[view.zoom_level]
+        for rect in terrain.compose(scene, self.data, x0, y0):
+            self.renderer.invalidate(rect)
+
+        # Actors are drawn only close up
+        if view.level.drawing == SPRITES:
+            # Loop actors to be drawn (there is scrolling both ways)
+            for x in range(x0, min(x0 + view.level.columns, self.width)):
+                for y in range(y0, min(y0 + view.level.rows, self.height)):
                     # Check if actor is found at the coordinates
                     actor = self.actor_at(x, y)
                     if actor:
-                        self.draw_actor(actor, px, py)
-        # If an actor is selected, then we'll draw red box around the actor
-        if self.cursor.chosen_actor:
-            px, py = hex_map_to_pixel(self.cursor.x - self.cursor.scroll_x,
-                                      self.cursor.y)
-            pygame.draw.rect(self.screen, self.cursor.get_color(),
-                             (px, py, 40, 40), 2)
+                        px, py = view.positions[x - x0, y - y0]
+                        self.compose_actor(scene, actor, px, py)
+            # If an actor is selected, then we'll draw red box around the
+            # actor
+            if self.cursor.chosen_actor:
+                px, py = self.to_screen(self.cursor.x, self.cursor.y)
+                scene.rectangle(self.cursor.get_color(), (px, py, 40, 40), 2)
 
         # If an dump is chosen, we'll draw information about it:
         #   Revenues, Expenses, Supplies
         if self.cursor.chosen_dump:
             text_colour = tuple(self.sc["unit_status_text_color"])
             x1, y1 = self.sc["unit_status_text_topleft_corner"]
-            self.text_at("Resource dump", (x1, y1 + 30), font=font4,
-                         wipe_background=False, color=text_colour)
-            self.text_at("Revenues: %d" % self.cursor.chosen_dump.revenue,
-                         (x1, y1 + 50), font=font4,
-                         wipe_background=False, color=text_colour)
-            self.text_at("Expenses: %d" % self.cursor.chosen_dump.expenses,
-                         (x1, y1 + 70), font=font4,
-                         wipe_background=False, color=text_colour)
-            self.text_at("Supplies: %d" % self.cursor.chosen_dump.supplies,
-                         (x1, y1 + 90), font=font4,
-                         wipe_background=False, color=text_colour)
-            self.screen.blit(self.client.ih.gi("dump"), (x1, y1))
+            scene.text(self.client, "Resource dump", (x1, y1 + 30),
+                       font=font4, wipe_background=False, color=text_colour)
+            scene.text(self.client,
+                       "Revenues: %d" % self.cursor.chosen_dump.revenue,
+                       (x1, y1 + 50), font=font4,
+                       wipe_background=False, color=text_colour)
+            scene.text(self.client,
+                       "Expenses: %d" % self.cursor.chosen_dump.expenses,
+                       (x1, y1 + 70), font=font4,
+                       wipe_background=False, color=text_colour)
+            scene.text(self.client,
+                       "Supplies: %d" % self.cursor.chosen_dump.supplies,
+                       (x1, y1 + 90), font=font4,
+                       wipe_background=False, color=text_colour)
+            scene.blit(self.client.ih.gi("dump"), (x1, y1))
+
+        self.compose_overlay(scene)
+        return scene
+
+    def compose_overlay(self, scene):
+        """Add the status line, computer moves and marks over the map."""
+        if self.status is not None:
+            scene.text(self.client, self.status,
+                       self.sc["making_moves_text_topleft_corner"],
+                       font=font3, wipe_background=False,
+                       color=tuple(self.sc["making_moves_text_color"]))
+
+        # Draw CPU player's moves
+        view = self.view
+        for key, value in self.cpu_moves.items():
+            if self.isvisible(key[0], key[1]) \
+                    and self.isvisible(value[0], value[1]):
+                scene.line((255, 0, 0), view.centre(key[0], key[1]),
+                           view.centre(value[0], value[1]), 2)
+
+        # Marks are as large as the hexes they are on
+        scale = view.level.geometry.scale
+        for x, y, colour, radius, width, text in self.marks:
+            if self.isvisible(x, y):
+                px, py = self.to_screen(x, y)
+                radius = max(2, round(radius * scale))
+                scene.circle(colour, view.centre(x, y), radius,
+                             min(width, radius))
+                if text is not None:
+                    scene.text(self.client, text, (px, py + 15), font=font2)
+
+    def draw_map(self):
+        """Draw the whole interface; the caller shows it."""
+        self.renderer.invalidate()
+        self.renderer.draw(self.compose())
+
+    def render(self):
+        """Draw and show the parts of the interface that changed."""
+        rects = self.renderer.draw(self.compose())
+        if rects:
+            pygame.display.update(rects)
+
+    def invalidate(self, rect=None):
+        """Have rect, or the whole screen, drawn again by the next render.
+
+        Needed after drawing on the screen other than through compose.
+        """
+        self.renderer.invalidate(rect)
 
     def text_at(self, *args, **kwargs):
         self.client.text_at(*args, **kwargs)
 
-    def draw_scoreboard(self, update=False):
-        """
-        Draw Scoreboard
-        update -> If true, scores are calculated and sorted
-        """
-        if update:
-            # Update scores
-            scores = {}
-            for peluri in self.playerlist:
-                if not peluri.lost:
-                    # Count existing players land count
-                    scores[peluri] = self.whole_map_situation_score(peluri.id)
-            # Sort points
-            self.scores = sorted(scores.items(), key=itemgetter(1))
+    def update_scores(self):
+        """Calculate and sort the scores shown on the scoreboard."""
+        scores = {}
+        for peluri in self.playerlist:
+            if not peluri.lost:
+                # Count existing players land count
+                scores[peluri] = self.whole_map_situation_score(peluri.id)
+        # Sort points
+        self.scores = sorted(scores.items(), key=itemgetter(1))
+
+    def compose_scoreboard(self, scene):
+        """Add the scoreboard, as of the last update_scores."""
 
         # Iterate every player
         for player in self.playerlist:
@@ -366,34 +558,32 @@ class ClientBoard(GameBoard):
                 self.cursor.chosen_actor = None
                 self.cursor.chosen_dump = None
                 if player.ai_controller:
-                    self.text_at("%s won the game!" % player.name,
-                                 (200, 200), font=font4,
-                                 color=(255, 255, 255))
+                    scene.text(self.client, "%s won the game!" % player.name,
+                               (200, 200), font=font4, color=(255, 255, 255))
                 else:
-                    self.text_at("You (%s) won the game!" % player.name,
-                                 (200, 200), font=font4,
-                                 color=(255, 255, 255))
-                pygame.display.flip()
+                    scene.text(self.client,
+                               "You (%s) won the game!" % player.name,
+                               (200, 200), font=font4, color=(255, 255, 255))
 
         counter = 0
         # Draw the scores, counter puts text in right row.
         # Skin configuration file is used here
-        for jau in reversed(self.scores):
-            self.screen.blit(
-                self.client.ih.gi("%d" % jau[0].id), (
+        for jau in list(reversed(self.scores))[:SCOREBOARD_ROWS]:
+            scene.blit(
+                self.client.hextile(jau[0].id), (
                     self.sc["scoreboard_text_topleft_corner"][0],
                     self.sc["scoreboard_text_topleft_corner"][
                         1] + 35 * counter - 13))
 
-            self.text_at("{:<4}{}".format(jau[1], jau[0].name),
-                         (self.sc["scoreboard_text_topleft_corner"][0] + 15,
-                          self.sc["scoreboard_text_topleft_corner"][
-                              1] + 35 * counter),
-                         color=(self.sc["scoreboard_text_color"][0],
-                                self.sc["scoreboard_text_color"][1],
-                                self.sc["scoreboard_text_color"][2]),
-                         font=mono_font,
-                         wipe_background=False)
+            scene.text(self.client, "{:<4}{}".format(jau[1], jau[0].name),
+                       (self.sc["scoreboard_text_topleft_corner"][0] + 15,
+                        self.sc["scoreboard_text_topleft_corner"][
+                            1] + 35 * counter),
+                       color=(self.sc["scoreboard_text_color"][0],
+                              self.sc["scoreboard_text_color"][1],
+                              self.sc["scoreboard_text_color"][2]),
+                       font=mono_font,
+                       wipe_background=False)
 
             counter += 1
 
@@ -403,27 +593,25 @@ class ClientBoard(GameBoard):
         if player and not player.ai_controller:
             if not player.lost:
                 # Human player's turn, tell it
-                self.text_at("Your (%s) turn" % player.name, (630, 300),
-                             color=(0, 0, 0),
-                             font=font3, wipe_background=False)
+                scene.text(self.client, "Your (%s) turn" % player.name,
+                           (630, 300), color=(0, 0, 0),
+                           font=font3, wipe_background=False)
             else:
                 # The human player has lost, tell it
-                self.text_at("You (%s) lost..." % player.name, (635, 300),
-                             color=(0, 0, 0),
-                             font=font3, wipe_background=False)
+                scene.text(self.client, "You (%s) lost..." % player.name,
+                           (635, 300), color=(0, 0, 0),
+                           font=font3, wipe_background=False)
 
     def show_own_units_that_can_move(self):
-        # Draw own units that have not moved yet
-        for actor in self.actors:
-            if not actor.moved and actor.side == self.turn and not actor.dump:
-                if self.isvisible(actor.x, actor.y):
-                    px, py = hex_map_to_pixel(
-                        actor.x - self.cursor.scroll_x, actor.y)
-                    pygame.draw.circle(self.screen, (255, 255, 20),
-                                       (px + 20, py + 20), 20, 3)
-        pygame.display.flip()
+        # Circle own units that have not moved yet
+        self.marks = [(actor.x, actor.y, (255, 255, 20), 20, 3, None)
+                      for actor in self.actors
+                      if not actor.moved and actor.side == self.turn
+                      and not actor.dump]
+        self.render()
         time.sleep(0.5)
-        self.draw_map()
+        self.marks = []
+        self.render()
 
     def attempt_move(self, actor, x2, y2, only_simulation):
         result = super().attempt_move(actor, x2, y2, only_simulation)
@@ -435,41 +623,32 @@ class ClientBoard(GameBoard):
             if self.isvisible(x, y):
                 # Clear selected actor
                 self.cursor.chosen_actor = None
-                # Convert (scrolled) hex map coordinates into screen pixels
-                # and draw circle there
-                px, py = hex_map_to_pixel(x - self.cursor.scroll_x, y)
-                pygame.draw.circle(self.screen, (0, 255, 0),
-                                   (px + 20, py + 20), 30, 2)
-                self.text_at(block_desc(result.reason), (px, py + 15),
-                             font=font2)
-                pygame.display.flip()
+                # Circle the reason for a while
+                self.marks = [(x, y, (0, 255, 0), 30, 2,
+                               block_desc(result.reason))]
+                self.render()
                 # Little time to actually see it
                 time.sleep(0.35)
-                self.draw_map()
-                pygame.display.flip()
+                self.marks = []
+                self.render()
+        return result
+
+
+def wait_events(timeout):
+    """Wait at most timeout ms for an event; return the events there are."""
+    event = pygame.event.wait(timeout)
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
 
 
 def pixel_to_hex_map(x_y):
-    x, y = x_y
-    grid_x = x // hex_system.GRID_WIDTH
-    grid_y = y // hex_system.GRID_HEIGHT
-    grid_pixel_x = x % hex_system.GRID_WIDTH
-    grid_pixel_y = y % hex_system.GRID_HEIGHT
-    if grid_y & 1:
-        hx = grid_x + hex_system.GRID_ODD_ROWS[grid_pixel_y][grid_pixel_x][0]
-        hy = grid_y + hex_system.GRID_ODD_ROWS[grid_pixel_y][grid_pixel_x][1]
-    else:
-        hx = grid_x + hex_system.GRID_EVEN_ROWS[grid_pixel_y][grid_pixel_x][0]
-        hy = grid_y + hex_system.GRID_EVEN_ROWS[grid_pixel_y][grid_pixel_x][1]
-    return hx, hy
+    """Return the hex of the view a pixel of the screen is on."""
+    return GEOMETRY.to_hex(*x_y)
 
 
 def hex_map_to_pixel(x, y):
     """
     Returns the top left pixel location of a hexagon map location.
     """
-    if y & 1:
-        # Odd rows will be moved to the right.
-        return x * hex_system.TILE_WIDTH + hex_system.ODD_ROW_X_MOD, y * hex_system.ROW_HEIGHT
-    else:
-        return x * hex_system.TILE_WIDTH, y * hex_system.ROW_HEIGHT
+    return GEOMETRY.to_pixel(x, y)
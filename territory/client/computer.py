@@ -0,0 +1,112 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Computer players' turns, thought out away from the user interface.
+
+A ComputerTurn plays the turn of the computer player of a board in a
+thread, on a copy of the board restored from a snapshot with the state of
+its random generator. The moves and drafts the player makes are passed
+back as they are made, so that the board can make them too, one by one,
+while the window goes on answering events.
+"""
+
+import queue
+import threading
+
+from territory.replay import OP_MOVE, OP_DRAFT
+from territory.server.serverboard import ServerBoard
+
+
+class ActionStream:
+    """Recorder (see GameBoard.recorder) putting moves and drafts in a queue.
+    """
+
+    def __init__(self, actions: queue.Queue):
+        self.actions = actions
+
+    def record_move(self, x1, y1, x2, y2, success):
+        self.actions.put((OP_MOVE, x1, y1, x2, y2, success))
+
+    def record_draft(self, x, y):
+        self.actions.put((OP_DRAFT, x, y))
+
+    def record_settle(self):
+        pass
+
+    def record_end_turn(self, board):
+        pass
+
+
+class ComputerTurn:
+    """The turn of the computer player of a board, played in a thread.
+
+    The thread only touches its copy of the board, and is left to finish
+    on its own if the turn is abandoned.
+    """
+
+    def __init__(self, board):
+        self.copy = ServerBoard(board.server, board.ruleset)
+        self.copy.restore(board.snapshot())
+        self.copy.rng.setstate(board.rng.getstate())
+        self.actions = queue.Queue()
+        # True once every action was taken
+        self.finished = False
+        self.error = None
+        self.thread = threading.Thread(target=self.think, daemon=True)
+        self.thread.start()
+
+    def think(self):
+        board = self.copy
+        board.recorder = ActionStream(self.actions)
+        try:
+            player = board.get_player_by_side(board.turn)
+            if player is not None and player.ai_controller is not None:
+                player.ai_controller.act()
+        except Exception as error:
+            self.error = error
+        finally:
+            board.recorder = None
+            # The end of the turn
+            self.actions.put(None)
+
+    def take(self, timeout):
+        """Return the actions made since last taken.
+
+        Wait at most timeout seconds for the first one. An exception raised
+        by the player is raised here.
+        """
+        taken = []
+        block = True
+        while not self.finished:
+            try:
+                action = self.actions.get(block, timeout)
+            except queue.Empty:
+                break
+            if action is None:
+                self.finished = True
+                if self.error is not None:
+                    raise self.error
+            else:
+                taken.append(action)
+            block = False
+        return taken
@@ -21,6 +21,8 @@
 #
 # ------------------------------------------------------------------------
 
+from .viewport import MAP_AREA
+
 
 class Cursor:
     """The mouse cursor in-game."""
@@ -29,20 +31,12 @@ class Cursor:
                  client):
         self.x = 10
         self.y = 10
-        self.scroll_x = 0
         self.chosen_actor = None
         self.chosen_dump = None
         self.board = board
         self.client = client
         self.mouse_pos = (0, 0)
 
-    def scroll(self, dx):
-        self.scroll_x += dx
-        if self.scroll_x > 15:
-            self.scroll_x = 15
-        if self.scroll_x < 0:
-            self.scroll_x = 0
-
     def click(self):
         mx = self.mouse_pos[0]
         my = self.mouse_pos[1]
@@ -60,16 +54,11 @@ class Cursor:
                 self.chosen_actor = None
                 self.chosen_dump = None
                 self.board.end_game()
-            if mx < 573 and my < 444:
+            if MAP_AREA.collidepoint(mx, my):
                 if self.chosen_actor:
                     self.board.attempt_move(self.chosen_actor, self.x, self.y,
                                             False)
-                    self.board.destroy_lonely_actors()
-                    self.board.has_anyone_lost_the_game()
-                    if self.board.check_and_mark_if_someone_won():
-                        self.board.data = {}
-                        self.board.actors.clear()
-                        self.board.fill_map(0)
+                    if self.board.settle():
                         return
                 else:
                     # Do we have clicked our own soldier?
@@ -105,12 +94,20 @@ class Cursor:
             if 607 <= mx <= 792 and 560 <= my <= 591:
                 # "Quit" pressed
                 self.board.running = False
-            if mx < 573 and my < 444:
+            if MAP_AREA.collidepoint(mx, my):
                 # Map editor pressed
-                if 0 < self.x < 29 and 0 < self.y < 13:
+                if 0 < self.x < self.board.width - 1 \
+                        and 0 < self.y < self.board.height - 1:
                     self.board.data[self.x, self.y] = self.board.map_edit_info[
                         2]
 
+    def on_button(self, name):
+        """Return True if the mouse is on the button of the skin called name.
+        """
+        (x1, y1), (x2, y2) = self.board.sc[name]
+        mx, my = self.mouse_pos
+        return x1 <= mx <= x2 and y1 <= my <= y2
+
     def get_color(self):
         if self.chosen_actor:
             return 255, 0, 0
@@ -23,6 +23,8 @@
 
 import pygame
 
+from .resources import menu_font
+
 
 class GameMenu:
     def __init__(self, client, bg_image, logo1, menuitems, start_xy, settings,
@@ -34,7 +36,7 @@ class GameMenu:
         # Pointer to pygame screen
         self.client = client
         # Font to be used with the menu
-        self.used_font = pygame.font.Font("fonts/AveriaSerif-Regular.ttf", 24)
+        self.used_font = menu_font
         # Coordinates where to render the menu
         self.start_x, self.start_y = start_xy
         # Space between menuitems
@@ -132,30 +134,27 @@ class GameMenu:
 
         # Draw the items
         self.draw_items(text)
+        pygame.display.flip()
 
-        # Create instance of pygame Clock
-        clock = pygame.time.Clock()
-
-        # Endless loop
+        # Endless loop, sleeping until there is an event
         while True:
-            # Limit fps to 30
-            clock.tick(30)
-
-            # Iterate through events
-            for e in pygame.event.get():
-                if e.type == pygame.KEYDOWN:
-                    if e.key == pygame.K_DOWN:
-                        self.shift_menu(1)
-                    elif e.key == pygame.K_UP:
-                        self.shift_menu(-1)
-                    elif e.key == pygame.K_RETURN:
-                        tulos = self.select()
-                        return tulos
-                    elif e.key == pygame.K_LEFT:
-                        self.edit_value(-1)
-                    elif e.key == pygame.K_RIGHT:
-                        self.edit_value(1)
-                    self.draw_items(text)
+            e = pygame.event.wait()
+            if e.type == pygame.KEYDOWN:
+                if e.key == pygame.K_DOWN:
+                    self.shift_menu(1)
+                elif e.key == pygame.K_UP:
+                    self.shift_menu(-1)
+                elif e.key == pygame.K_RETURN:
+                    tulos = self.select()
+                    return tulos
+                elif e.key == pygame.K_LEFT:
+                    self.edit_value(-1)
+                elif e.key == pygame.K_RIGHT:
+                    self.edit_value(1)
+                self.draw_items(text)
+            elif e.type != pygame.VIDEOEXPOSE:
+                continue
+            # Show the menu drawn again, or uncovered
             pygame.display.flip()
 
     def select(self):
@@ -20,26 +20,141 @@
 #    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
 #
 # ------------------------------------------------------------------------
+import colorsys
+from collections import OrderedDict
+
 import pygame
 
+# Bytes of rendered text kept by a TextCache by default
+TEXT_CACHE_BUDGET = 2 * 2 ** 20
+
+
+def player_colour(pid):
+    """Return a colour for a player beyond the skin's hex tiles.
+
+    Hues are spread with the golden ratio so that neighbouring ids differ.
+    """
+    hue = (pid * 0.618033988749895) % 1.0
+    r, g, b = colorsys.hsv_to_rgb(hue, 0.65, 1.0)
+    return int(r * 255), int(g * 255), int(b * 255)
+
+
+def recolour(image, colour):
+    """Return a copy of image tinted with colour by the pixels' lightness.
+
+    Pixels of the colour key are left as they are, and so is alpha.
+    """
+    tile = image.copy()
+    key = tile.get_colorkey()
+    red, green, blue = colour
+    pixels = pygame.PixelArray(tile)
+    for x in range(tile.get_width()):
+        for y in range(tile.get_height()):
+            pixel = tile.unmap_rgb(pixels[x, y])
+            if pixel.a == 0 or key is not None \
+                    and tuple(pixel)[:3] == tuple(key)[:3]:
+                continue
+            lightness = max(pixel.r, pixel.g, pixel.b)
+            pixels[x, y] = (red * lightness // 255, green * lightness // 255,
+                            blue * lightness // 255, pixel.a)
+    del pixels
+    return tile
+
 
 class ImageHandler:
     """Simple image container."""
 
     def __init__(self):
         self.images = {}
+        # Functions loading images not asked for yet
+        self.loaders = {}
 
     def add_image(self, image, id):
         self.images[id] = image
 
+    def add_loader(self, load, id):
+        """Have the image id loaded by load() when it is first asked for."""
+        self.loaders[id] = load
+
     # Get Image
     def gi(self, id):
-        return self.images.get(id, None)
+        image = self.images.get(id, None)
+        if image is None and id in self.loaders:
+            image = self.loaders.pop(id)()
+            self.images[id] = image
+        return image
+
+
+class TextCache:
+    """Rendered text surfaces, the least recently used dropped first.
+
+    Surfaces are keyed by font, text and colour, and kept until their
+    pixels take more than budget bytes. Preloaded ones are always kept.
+    """
+
+    def __init__(self, budget=TEXT_CACHE_BUDGET):
+        self.budget = budget
+        self.surfaces = OrderedDict()
+        self.preloaded = {}
+        # Bytes of the pixels of surfaces
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, colour):
+        """Return text rendered antialiased by font in colour."""
+        key = font, text, tuple(colour)
+        surface = self.preloaded.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = font.render(text, 1, colour)
+        self.surfaces[key] = surface
+        self.size += surface.get_width() * surface.get_height() \
+            * surface.get_bytesize()
+        while self.size > self.budget and len(self.surfaces) > 1:
+            _, dropped = self.surfaces.popitem(last=False)
+            self.size -= dropped.get_width() * dropped.get_height() \
+                * dropped.get_bytesize()
+        return surface
+
+    def preload(self, font, texts, colours):
+        """Render texts in every colour, to be kept for good."""
+        for text in texts:
+            for colour in colours:
+                key = font, text, tuple(colour)
+                self.preloaded[key] = font.render(text, 1, colour)
+
+
+class LazyFont:
+    """A pygame font, opened when it is first used.
+
+    pygame.font is initialized then too, so importing fonts costs nothing.
+    """
+
+    def __init__(self, file, size):
+        # Underscored, not to hide the attributes of the font
+        self._file = file
+        self._size = size
+        self._font = None
+
+    def __getattr__(self, name):
+        if self._font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self._font = pygame.font.Font(self._file, self._size)
+        return getattr(self._font, name)
 
 
-pygame.font.init()
-font1 = pygame.font.Font(None, 12)
-font2 = pygame.font.Font(None, 16)
-font3 = pygame.font.Font(None, 24)
-font4 = pygame.font.Font("fonts/AveriaSerif-Regular.ttf", 20)
-mono_font = pygame.font.Font("fonts/ConsolaMono-Bold.ttf", 17)
+font1 = LazyFont(None, 12)
+font2 = LazyFont(None, 16)
+font3 = LazyFont(None, 24)
+font4 = LazyFont("fonts/AveriaSerif-Regular.ttf", 20)
+mono_font = LazyFont("fonts/ConsolaMono-Bold.ttf", 17)
+menu_font = LazyFont("fonts/AveriaSerif-Regular.ttf", 24)
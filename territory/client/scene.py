@@ -0,0 +1,165 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Retained drawing: only the parts of the screen that changed are drawn.
+
+A frame is described as a Scene, the items drawn over a background in
+order, each with a key telling what it looks like and the rectangle it
+covers. A Renderer compares a scene with the one it drew last: where items
+appeared, disappeared or moved, it draws the background and the items
+there again, clipped, and returns those rectangles for
+pygame.display.update.
+"""
+
+import pygame
+
+from .resources import font2
+
+
+def text_rect(text, coords, font=font2, centre=False):
+    """Return a rectangle covering what Client.text_at draws."""
+    width, height = font.size(text)
+    x = coords[0] - width / 2 if centre else coords[0]
+    # A pixel around for the shadow and the rounding of centred text
+    return pygame.Rect(int(x) - 1, int(coords[1]) - 1, width + 3, height + 3)
+
+
+def merge(rects):
+    """Return rectangles covering rects, overlapping ones joined."""
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        while True:
+            index = rect.collidelist(merged)
+            if index < 0:
+                break
+            rect.union_ip(merged.pop(index))
+        merged.append(rect)
+    return merged
+
+
+class Scene:
+    """What a frame shows: items drawn in order over a background."""
+
+    def __init__(self, background):
+        """
+        :param background: image blitted at (0, 0) first; None for black.
+        """
+        self.background = background
+        # (key, rect, draw) of every item; draw(screen) draws it
+        self.items = []
+
+    def add(self, key, rect, draw):
+        self.items.append((key, pygame.Rect(rect), draw))
+
+    def blit(self, image, position, area=None):
+        """Add image at position; area is the part of it to blit."""
+        position = tuple(position)
+        if area is None:
+            self.add(("blit", image, position),
+                     image.get_rect(topleft=position),
+                     lambda screen: screen.blit(image, position))
+        else:
+            area = pygame.Rect(area)
+            self.add(("blit", image, position, tuple(area)),
+                     pygame.Rect(position, area.size),
+                     lambda screen: screen.blit(image, position, area))
+
+    def text(self, client, text, coords, **options):
+        """Add text drawn by client.text_at(text, coords, **options)."""
+        coords = tuple(coords)
+        key = tuple(sorted(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in options.items()))
+        rect = text_rect(text, coords, options.get("font", font2),
+                         options.get("centre", False))
+        self.add(("text", text, coords, key), rect,
+                 lambda screen: client.text_at(text, coords, **options))
+
+    def rectangle(self, colour, rect, width=0):
+        colour, rect = tuple(colour), tuple(rect)
+        self.add(("rectangle", colour, rect, width), rect,
+                 lambda screen: pygame.draw.rect(screen, colour, rect, width))
+
+    def circle(self, colour, centre, radius, width=0):
+        colour, centre = tuple(colour), tuple(centre)
+        rect = pygame.Rect(centre[0] - radius - 1, centre[1] - radius - 1,
+                           2 * radius + 3, 2 * radius + 3)
+        self.add(("circle", colour, centre, radius, width), rect,
+                 lambda screen: pygame.draw.circle(screen, colour, centre,
+                                                   radius, width))
+
+    def line(self, colour, start, end, width=1):
+        colour, start, end = tuple(colour), tuple(start), tuple(end)
+        rect = pygame.Rect(min(start[0], end[0]), min(start[1], end[1]),
+                           abs(end[0] - start[0]), abs(end[1] - start[1]))
+        self.add(("line", colour, start, end, width),
+                 rect.inflate(2 * width + 2, 2 * width + 2),
+                 lambda screen: pygame.draw.line(screen, colour, start, end,
+                                                 width))
+
+
+class Renderer:
+    """Draws scenes on a surface, drawing again only what changed."""
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = None
+        # (key, rect) of the items on the screen
+        self.drawn = set()
+        # Rectangles drawn over by others, to draw again
+        self.invalid = []
+        self.everything = True
+
+    def invalidate(self, rect=None):
+        """Have rect, or by default the whole screen, drawn again."""
+        if rect is None:
+            self.everything = True
+        else:
+            self.invalid.append(pygame.Rect(rect))
+
+    def draw(self, scene: Scene):
+        """Draw a scene; return the rectangles of the screen that changed."""
+        items = {(key, tuple(rect)) for key, rect, _ in scene.items}
+        bounds = self.screen.get_rect()
+        if self.everything or scene.background is not self.background:
+            dirty = [bounds]
+        else:
+            dirty = [bounds.clip(rect) for rect in merge(
+                self.invalid + [rect for _, rect in items ^ self.drawn])]
+            dirty = [rect for rect in dirty if rect.width and rect.height]
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            if scene.background is None:
+                self.screen.fill((0, 0, 0), rect)
+            else:
+                self.screen.blit(scene.background, rect, rect)
+            for _, item_rect, draw in scene.items:
+                if item_rect.colliderect(rect):
+                    draw(self.screen)
+        self.screen.set_clip(None)
+        self.background = scene.background
+        self.drawn = items
+        self.invalid = []
+        self.everything = False
+        return dirty
@@ -0,0 +1,319 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""The land of the map, drawn once and kept off the screen.
+
+Hex tiles are drawn on surfaces of CHUNK_COLUMNS by CHUNK_ROWS hexes,
+which are blitted where they show in the view. A tile is drawn again only
+when the owner of its hex changes, found by comparing the columns of the
+map with those the chunk was drawn from whenever the map's version
+changes.
+
+From further away, the tiles are flat hexes of their owner's colour
+(FlatTiles), and furthest the map is an image of a pixel or a few per hex
+made from the owners of the hexes at once (OwnerMap).
+"""
+
+from collections import OrderedDict
+
+import pygame
+
+from territory.hex_system import GEOMETRY, VIEW_COLUMNS, VIEW_ROWS
+
+# Hexes in a chunk; rows are even so that odd rows stay odd in chunks
+CHUNK_COLUMNS = 16
+CHUNK_ROWS = 16
+
+# Chunks kept, the least recently shown dropped first, unless the view
+# shows more than half as many. A chunk of tiles takes about 1.3 MB at 32
+# bits per pixel, and the view shows at most four.
+CACHED_CHUNKS = 16
+
+# Colour of the pixels of chunks without land
+KEY = (255, 0, 255)
+
+
+def area(columns, rows, tile_size, geometry=GEOMETRY):
+    """Return the rectangle covered by the tiles of columns x rows hexes."""
+    width, height = tile_size
+    return pygame.Rect(
+        0, 0,
+        (columns - 1) * geometry.tile_width + geometry.odd_row_x_mod + width,
+        (rows - 1) * geometry.row_height + height)
+
+
+def flat_tile(colour, geometry):
+    """Return a hex of one colour, as large as the tiles of geometry."""
+    width = geometry.tile_width
+    height = round(geometry.row_height * 4 / 3)
+    tile = pygame.Surface((width, height)).convert()
+    tile.fill(KEY)
+    tile.set_colorkey(KEY)
+    corners = [(width / 2, 0), (width, height / 4), (width, height * 3 / 4),
+               (width / 2, height), (0, height * 3 / 4), (0, height / 4)]
+    pygame.draw.polygon(tile, colour, corners)
+    if width >= 16:
+        # Borders between hexes, while there is room for them
+        pygame.draw.polygon(tile, [c * 3 // 4 for c in colour], corners, 1)
+    return tile
+
+
+class FlatTiles:
+    """Flat hex tiles of the colour of every owner, made when first used."""
+
+    def __init__(self, colour, geometry):
+        """
+        :param colour: function returning the colour of land of an owner.
+        """
+        self.colour = colour
+        self.geometry = geometry
+        self.tiles = {}
+
+    def __call__(self, owner):
+        tile = self.tiles.get(owner)
+        if tile is None:
+            tile = self.tiles[owner] = flat_tile(self.colour(owner),
+                                                 self.geometry)
+        return tile
+
+
+class Chunk:
+    """Tiles of hexes x0...x0 + CHUNK_COLUMNS - 1, y0...y0 + CHUNK_ROWS - 1."""
+
+    def __init__(self, x0, y0, size):
+        self.x0 = x0
+        self.y0 = y0
+        self.surface = pygame.Surface(size).convert()
+        self.surface.set_colorkey(KEY)
+        # The owners the tiles were drawn for, a bytes object per column
+        self.columns = []
+        # Version of the map when the columns were last compared
+        self.version = None
+
+
+class Terrain:
+    """Chunks of the land of a map, updated as hexes change owner."""
+
+    def __init__(self, tile, geometry=GEOMETRY, columns=VIEW_COLUMNS,
+                 rows=VIEW_ROWS, bounds=None):
+        """
+        :param tile: function returning the hex tile image of an owner.
+        :param geometry: where the tiles of hexes are drawn.
+        :param columns: columns of hexes of the view.
+        :param rows: rows of hexes of the view.
+        :param bounds: rectangle of the screen the land is drawn in; by
+            default that of the tiles of the view.
+        """
+        self.tile = tile
+        self.geometry = geometry
+        self.columns = columns
+        self.rows = rows
+        self.bounds = bounds
+        # Tiles are larger than the spacing of hexes and overlap
+        self.tile_size = None
+        # Where the tiles of the view are on the screen
+        self.view = None
+        self.data = None
+        self.chunks = OrderedDict()
+        self.cached = max(CACHED_CHUNKS,
+                          2 * (columns // CHUNK_COLUMNS + 2)
+                          * (rows // CHUNK_ROWS + 2))
+        # Tiles drawn again since the chunks were made, for benchmarks
+        self.redrawn = 0
+
+    def clear(self):
+        """Draw every chunk again when next shown."""
+        self.tile_size = self.tile(1).get_size()
+        self.view = area(self.columns, self.rows, self.tile_size,
+                         self.geometry)
+        if self.bounds is not None:
+            self.view = self.view.clip(self.bounds)
+        self.chunks.clear()
+
+    def compose(self, scene, data, scroll_x, scroll_y):
+        """Add the land shown from (scroll_x, scroll_y) to scene.
+
+        scroll_y must be even, as the view's rows are. Returns the
+        rectangles of the screen where tiles changed since the last call.
+        """
+        if data is not self.data:
+            self.data = data
+            self.clear()
+        changed = []
+        height = data.height
+        first_x = max(scroll_x - 1, 0) // CHUNK_COLUMNS
+        last_x = min(scroll_x + self.columns, data.width - 1) // CHUNK_COLUMNS
+        first_y = max(scroll_y - 1, 0) // CHUNK_ROWS
+        last_y = min(scroll_y + self.rows, height - 1) // CHUNK_ROWS
+        for cx in range(first_x, last_x + 1):
+            for cy in range(first_y, last_y + 1):
+                chunk = self.chunk(cx * CHUNK_COLUMNS, cy * CHUNK_ROWS)
+                left, top = self.geometry.to_pixel(chunk.x0 - scroll_x,
+                                                   chunk.y0 - scroll_y)
+                rects = self.update(chunk)
+                for rect in rects:
+                    rect = self.view.clip(rect.move(left, top))
+                    if rect:
+                        changed.append(rect)
+                shown = self.view.clip(
+                    chunk.surface.get_rect(topleft=(left, top)))
+                if shown:
+                    scene.blit(chunk.surface, shown.topleft,
+                               shown.move(-left, -top))
+        return changed
+
+    def chunk(self, x0, y0):
+        """Return the chunk at (x0, y0), drawing it if it is not kept."""
+        key = x0, y0
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        chunk = Chunk(x0, y0, area(CHUNK_COLUMNS, CHUNK_ROWS, self.tile_size,
+                                   self.geometry).size)
+        chunk.surface.fill(KEY)
+        to_pixel = self.geometry.to_pixel
+        for x in range(x0, min(x0 + CHUNK_COLUMNS, self.data.width)):
+            column = self.column(chunk, x)
+            for y, owner in enumerate(column, y0):
+                if owner > 0:
+                    chunk.surface.blit(self.tile(owner),
+                                       to_pixel(x - x0, y - y0))
+            chunk.columns.append(column)
+        chunk.version = self.data.version
+        self.chunks[key] = chunk
+        if len(self.chunks) > self.cached:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def column(self, chunk, x):
+        """Return the owners of the hexes of column x in chunk."""
+        data = self.data
+        start = x * data.height + chunk.y0
+        stop = x * data.height + min(chunk.y0 + CHUNK_ROWS, data.height)
+        return bytes(data.cells[start:stop])
+
+    def update(self, chunk):
+        """Draw the tiles of chunk whose owner changed; return their rects."""
+        if chunk.version == self.data.version:
+            return []
+        chunk.version = self.data.version
+        changed = []
+        for index, drawn in enumerate(chunk.columns):
+            column = self.column(chunk, chunk.x0 + index)
+            if column != drawn:
+                chunk.columns[index] = column
+                changed.extend((index, y) for y, (old, new)
+                               in enumerate(zip(drawn, column)) if old != new)
+        return [self.redraw(chunk, x, y) for x, y in changed]
+
+    def redraw(self, chunk, x, y):
+        """Draw the tile of hex (x, y) of chunk again; return its rect.
+
+        Tiles overlap their neighbours, so those are drawn again over it,
+        in the order they were first drawn.
+        """
+        surface = chunk.surface
+        to_pixel = self.geometry.to_pixel
+        rect = pygame.Rect(to_pixel(x, y), self.tile_size)
+        surface.set_clip(rect)
+        surface.fill(KEY)
+        for nx in range(max(x - 1, 0), min(x + 2, len(chunk.columns))):
+            column = chunk.columns[nx]
+            for ny in range(max(y - 1, 0), min(y + 2, len(column))):
+                if column[ny] > 0:
+                    surface.blit(self.tile(column[ny]), to_pixel(nx, ny))
+        surface.set_clip(None)
+        self.redrawn += 1
+        return rect
+
+
+class OwnerMap:
+    """The owners of the hexes of a map as an image, a square per hex.
+
+    The image has a pixel per hex, in a palette of the colours of owners,
+    and is made again at once from the map whenever the map's version
+    changes; the part of it shown is scaled to squares of geometry.
+    """
+
+    def __init__(self, colour, geometry, columns, rows, bounds):
+        """
+        :param colour: function returning the colour of land of an owner.
+        :param geometry: a SquareGeometry.
+        :param columns: columns of hexes of the view.
+        :param rows: rows of hexes of the view.
+        :param bounds: rectangle of the screen the land is drawn in.
+        """
+        self.colour = colour
+        self.geometry = geometry
+        self.columns = columns
+        self.rows = rows
+        self.bounds = bounds
+        self.palette = None
+        self.data = None
+        self.version = None
+        self.image = None
+        # ((scroll_x, scroll_y), image) of the part of the map last shown
+        self.shown = None
+
+    def compose(self, scene, data, scroll_x, scroll_y):
+        """Add the land shown from (scroll_x, scroll_y) to scene.
+
+        Returns no rectangles: the image shown is a new one whenever what
+        it shows changes.
+        """
+        if data is not self.data or data.version != self.version:
+            self.data = data
+            self.version = data.version
+            self.image = self.make_image(data)
+            self.shown = None
+        if self.shown is None or self.shown[0] != (scroll_x, scroll_y):
+            part = self.image.subsurface(pygame.Rect(
+                scroll_x, scroll_y, self.columns, self.rows).clip(
+                    self.image.get_rect()))
+            width, height = part.get_size()
+            size = self.geometry.tile_width, self.geometry.row_height
+            if size != (1, 1):
+                part = pygame.transform.scale(
+                    part, (width * size[0], height * size[1]))
+            self.shown = (scroll_x, scroll_y), part
+        part = self.shown[1]
+        shown = self.bounds.clip(part.get_rect(topleft=self.bounds.topleft))
+        scene.blit(part, shown.topleft, shown.move(-self.bounds.left,
+                                                   -self.bounds.top))
+        return []
+
+    def make_image(self, data):
+        """Return an image of the owners of the hexes, without the sea."""
+        if self.palette is None:
+            self.palette = [KEY] + [self.colour(owner)
+                                    for owner in range(1, 256)]
+        # Cells are stored column by column, so the image is made
+        # transposed first
+        image = pygame.image.frombytes(bytes(data.cells),
+                                       (data.height, data.width), "P")
+        image = pygame.transform.flip(pygame.transform.rotate(image, -90),
+                                      True, False)
+        image.set_palette(self.palette)
+        image.set_colorkey(0)
+        return image
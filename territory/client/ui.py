@@ -23,12 +23,21 @@
 
 from pathlib import Path
 import pygame
+from .atlas import AtlasCache, HEX_TILES
 from .clientboard import ClientBoard
-from .resources import font2, font4
+from .resources import font1, font2, font4, player_colour, recolour, \
+    TextCache
 from territory.configuration import ConfigurationManager
+from territory.gameboard import MAX_PLAYERS, random_map_size
+from territory.mappool import MapPool
 from territory.ruleset import ClassicRuleset, SlayRuleset, DefaultRuleset
 
 
+# Levels of soldiers, and of those that moved, drawn on every soldier
+SOLDIER_LABELS = [str(level) + moved for moved in ("", "X")
+                  for level in range(1, 7)]
+
+
 class Client:
     """Primary game controller."""
 
@@ -37,12 +46,30 @@ class Client:
         self.screen = screen
         self.game_path = gp
 
+        # Rendered text drawn by text_at
+        self.text_cache = TextCache()
+
+        # Sprites of skins compiled into an atlas (see load_sprites)
+        self.atlas_cache = AtlasCache()
+        self.atlas = None
+        # Colours of land by owner, seen from far (see land_colour)
+        self.land_colours = {}
+
         # Map
         self.board = ClientBoard(server, self, screen)
 
         # Configuration
         self.configuration = ConfigurationManager()
         self.board.show_cpu_moves = self.configuration.show_cpu_moves
+        if self.configuration.record_replays:
+            self.board.replay_dir = gp / "replays"
+        if self.configuration.map_pool_size > 0:
+            # Keep random maps ready for every player count of the menu
+            pool = MapPool(gp, size=self.configuration.map_pool_size)
+            for players in range(2, 7):
+                pool.warm(pool.key(*random_map_size(players), players,
+                                   "boxes"))
+            self.board.map_pool = pool
 
         # Connect to server
         self.server = server
@@ -55,81 +82,72 @@ class Client:
             server.ruleset = DefaultRuleset()
 
     def load_interface_images(self):
-        """Load the interface images."""
+        """Load the menu background.
+
+        The backgrounds of the game and the map editor are loaded when they
+        are first drawn.
+        """
         graphics_root = Path(
             self.configuration.skin('resources.graphics', ["images"])[0])
 
-        self.ih.add_image(
-            pygame.image.load(
-                str(graphics_root /
-                    self.configuration.skin("screenbg.gameboard",
-                                            ["gameboard.png"])[0])
-            ).convert(),
-            "interface"
-        )
-        self.ih.add_image(
-            pygame.image.load(
-                str(graphics_root / self.configuration.skin("screenbg.mapedit",
-                                                            ["mapedit.png"])[0])
-            ).convert(),
-            "mapedit"
-        )
-        self.ih.add_image(
-            pygame.image.load(
-                str(graphics_root /
-                    self.configuration.skin("menu.background", ["menu.png"])[0])
-            ).convert(),
-            "menu_interface"
-        )
-
-    def load_hextile_graphics(self):
-        imagehandler = self.ih
+        def loader(option, default):
+            name = self.configuration.skin(option, [default])[0]
+            path = graphics_root / name
+            return lambda: pygame.image.load(str(path)).convert()
 
-        hextile_path = Path(
-            self.configuration.skin("hextile.folder", ["images"])[0])
+        self.ih.add_loader(loader("screenbg.gameboard", "gameboard.png"),
+                           "interface")
+        self.ih.add_loader(loader("screenbg.mapedit", "mapedit.png"),
+                           "mapedit")
+        self.ih.add_image(loader("menu.background", "menu.png")(),
+                          "menu_interface")
 
-        # Load hextiles 1...6
-        for i in range(1, 7):
-            image = pygame.image.load(
-                str(hextile_path / "hextile{}_.png".format(i))
-            ).convert()
+    def load_sprites(self):
+        """Load the sprites of the skin from its atlas (see atlas)."""
+        atlas, rects = self.atlas_cache.load(self.configuration)
+        self.atlas = atlas
+        self.land_colours = {}
+        for name, rect in rects.items():
+            image = atlas.subsurface(rect)
+            # The colour key of the top left pixel, as the sprites have always
+            # had, keeps SDL blending their edges the same
             image.set_colorkey(image.get_at((0, 0)))
-            imagehandler.add_image(image, str(i))
+            self.ih.add_image(image, name)
 
-    def load_unit_graphics(self):
-        imagehandler = self.ih
+    def hextile(self, pid):
+        """Return the hex tile image of land owned by player pid.
 
-        uisettings = self.configuration.skin("unitimage", {})
-        unit_path = uisettings.get("folder", ["images"])[0] + "/"
-        default_unit_path = uisettings.get("default", ["soldier.png"])[0]
-        # TODO: if no need for more images, don't load them...
-        for i in range(6):  # Number of possible players: 6
-            uimg = \
-                uisettings.get("soldier{}".format(i + 1), [default_unit_path])[
-                    0]
-            temppi = pygame.image.load(unit_path + uimg).convert()
-            temppi.set_colorkey(temppi.get_at((0, 0)))
-            imagehandler.add_image(temppi, "soldier{}".format(i + 1))
-
-    def load_game_graphics(self):
-        imagehandler = self.ih
+        Tiles of players beyond the skin's six are made from the first
+        tile when they are first needed.
+        """
+        image = self.ih.gi(str(pid))
+        if image is None:
+            image = recolour(self.ih.gi("1"), player_colour(pid))
+            self.ih.add_image(image, str(pid))
+        return image
 
-        graphics_path = Path(
-            self.configuration.skin("gfx.directory", ["images"])[0])
-        temppi = pygame.image.load(
-            str(graphics_path / "skull7.png")).convert_alpha()
-        temppi.set_colorkey(temppi.get_at((0, 0)))
-        imagehandler.add_image(temppi, "skull")
-        temppi = pygame.image.load(
-            str(graphics_path / "armytent.png")).convert_alpha()
-        temppi.set_colorkey(temppi.get_at((0, 0)))
-        imagehandler.add_image(temppi, "dump")
+    def land_colour(self, pid):
+        """Return the colour of land owned by player pid, seen from far.
+
+        That is the average colour of the hex tile. Tiles beyond the skin's
+        are not recoloured for it: theirs is the player's colour, as light
+        as the first tile.
+        """
+        colour = self.land_colours.get(pid)
+        if colour is None:
+            if pid <= HEX_TILES:
+                colour = tuple(pygame.transform.average_color(
+                    self.hextile(pid), consider_alpha=True))[:3]
+            else:
+                lightness = max(self.land_colour(1))
+                colour = tuple(c * lightness // 255
+                               for c in player_colour(pid))
+            self.land_colours[pid] = colour
+        return colour
 
     def load_graphics(self):
         imagehandler = self.ih
-        self.load_hextile_graphics()
-        self.load_unit_graphics()
-        self.load_game_graphics()
+        self.load_sprites()
 
         # Load logo
         logo = self.configuration.skin("menu.logo", ["logo.png"])[0]
@@ -137,6 +155,10 @@ class Client:
         imagehandler.add_image(pygame.image.load(logof + logo).convert_alpha(),
                                "logo")
 
+        # Soldier labels with their shadows, as drawn by ClientBoard
+        self.text_cache.preload(font1, SOLDIER_LABELS,
+                                ((255, 255, 255), (0, 0, 0)))
+
     def text_at(self, text, coords, wipe_background=True, drop_shadow=True,
                 font=font2, color=(255, 255, 255),
                 flip_immediately=False, centre=False):
@@ -149,11 +171,11 @@ class Client:
         color = (255,255,255) -> font color
         flippaa = False -> immediately flip the screen
         """
-        # Render text
-        text_ = font.render(text, 1, color)
+        # Render text, or take it from the cache
+        text_ = self.text_cache.render(font, text, color)
 
         # Metrics
-        koko = font.size(text)
+        koko = text_.get_size()
         text_x = coords[0] - koko[0] / 2 if centre else coords[0]
 
         # Wipe_Background
@@ -163,7 +185,7 @@ class Client:
 
         # Shadow
         if drop_shadow:
-            shadow_text_ = font.render(text, 1, (
+            shadow_text_ = self.text_cache.render(font, text, (
                 255 - color[0], 255 - color[1], 255 - color[2]))
             self.screen.blit(shadow_text_, (text_x + 1, coords[1] + 1))
 
@@ -182,14 +204,13 @@ class Client:
                      wipe_background=False)
         pygame.display.flip()
         while True:
-            pygame.draw.rect(self.screen, (30, 30, 30), (x1, y1, w1, h1))
-            self.text_at(caption, (x1 + w1 // 4, y1), font=font2,
-                         wipe_background=False)
-            e = pygame.event.poll()
-            if e.type == pygame.KEYDOWN:
-                k = e.key
-            else:
+            # Sleep until there is an event
+            e = pygame.event.wait()
+            if e.type == pygame.VIDEOEXPOSE:
+                pygame.display.flip()
+            if e.type != pygame.KEYDOWN:
                 continue
+            k = e.key
 
             if k == pygame.K_BACKSPACE:
                 if curstr:
@@ -202,11 +223,16 @@ class Client:
             elif k <= 127 and k != pygame.K_BACKSPACE \
                     and e.unicode in '0123456789':
                 curstr.append(e.unicode)
+            pygame.draw.rect(self.screen, (30, 30, 30), (x1, y1, w1, h1))
+            self.text_at(caption, (x1 + w1 // 4, y1), font=font2,
+                         wipe_background=False)
             self.text_at("".join(curstr),
                          (((x1 + (x1 + w1)) // 2) - (len(curstr) * 4), y1 + 15),
                          wipe_background=False,
                          font=font4)
             pygame.display.flip()
+        # The box is drawn over the board, so have it drawn again
+        self.board.invalidate((x1, y1, w1, h1))
         return "".join(curstr)
 
     def get_human_and_cpu_count(self):
@@ -219,17 +245,18 @@ class Client:
         while True:
             try:
                 humans = int(
-                    self.text_input("How many human players (1–6)?",
+                    self.text_input("How many human players (1–%d)?"
+                                    % MAX_PLAYERS,
                                     (800 // 2 - 110, 300), (240, 45),
                                     onlynumbers=True))
             except ValueError:
                 continue
-            if 1 <= humans <= 6:
+            if 1 <= humans <= MAX_PLAYERS:
                 break
 
         cpus = 0
         low_limit = 1 if humans == 1 else 0
-        hi_limit = 6 - humans
+        hi_limit = MAX_PLAYERS - humans
         if low_limit == hi_limit:
             return humans, low_limit
 
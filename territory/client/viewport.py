@@ -0,0 +1,155 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""The part of the map in view, and how closely it is seen.
+
+The view scrolls by hexes both ways and zooms through ZOOM_LEVELS. Close
+up, hexes are drawn with their tiles and actors; further away, as flat
+hexes of their owner's colour, and furthest as squares of a pixel or a
+few, both without actors.
+"""
+
+import collections
+import math
+
+import pygame
+
+from territory.hex_system import GEOMETRY, GRID_WIDTH, HexGeometry, \
+    SquareGeometry, VIEW_COLUMNS, VIEW_ROWS
+
+# Part of the screen showing the map, left of and above the panels
+MAP_AREA = pygame.Rect(0, 0, 573, 444)
+
+# How the hexes of a zoom level are drawn
+SPRITES = "sprites"
+POLYGONS = "polygons"
+PIXELS = "pixels"
+
+ZoomLevel = collections.namedtuple(
+    'ZoomLevel', ['drawing', 'geometry', 'columns', 'rows'])
+
+
+def zoom_level(drawing, geometry):
+    """Return the ZoomLevel with the columns and rows covering MAP_AREA."""
+    return ZoomLevel(
+        drawing, geometry,
+        math.ceil(MAP_AREA.width / geometry.tile_width) + 1,
+        math.ceil(MAP_AREA.height / geometry.row_height) + 1)
+
+
+# Zoom levels, closest first. The first shows the view the game always
+# had.
+ZOOM_LEVELS = [
+    ZoomLevel(SPRITES, GEOMETRY, VIEW_COLUMNS, VIEW_ROWS),
+    zoom_level(POLYGONS, HexGeometry(1 / 2)),
+    zoom_level(POLYGONS, HexGeometry(1 / 4)),
+    zoom_level(PIXELS, SquareGeometry(2)),
+    zoom_level(PIXELS, SquareGeometry(1)),
+]
+
+
+class Viewport:
+    """The scroll and zoom of the view of the map of a board."""
+
+    def __init__(self, board):
+        self.board = board
+        # The hex at the top left of the view; its row is even, so that
+        # odd rows stay odd on the screen
+        self.scroll_x = 0
+        self.scroll_y = 0
+        self.zoom_level = 0
+        # Screen pixels of the hexes of the closest view, by their position
+        # in it
+        self.positions = GEOMETRY.view_positions()
+
+    @property
+    def level(self):
+        return ZOOM_LEVELS[self.zoom_level]
+
+    def reset(self):
+        """Show the map from its top left, close up."""
+        self.scroll_x = 0
+        self.scroll_y = 0
+        self.zoom_level = 0
+
+    def scroll(self, dx, dy=0):
+        """Scroll the view by dx and 2 * dy steps of a hex when close.
+
+        Steps are as many hexes as take a hex's width of the closest view,
+        and rows scroll in pairs.
+        """
+        step = max(1, round(GRID_WIDTH / self.level.geometry.tile_width))
+        self.scroll_to(self.scroll_x + dx * step,
+                       self.scroll_y + 2 * dy * step)
+
+    def scroll_to(self, x, y):
+        """Scroll the view to hex (x, y), or as near as the map allows."""
+        level = self.level
+        self.scroll_x = max(0, min(x, self.board.width - level.columns))
+        max_y = self.board.height - level.rows
+        self.scroll_y = max(0, min(y - y % 2, max_y + max_y % 2))
+
+    def zoom(self, steps, position=MAP_AREA.center):
+        """Zoom out by steps levels, or in if negative.
+
+        The hex at position of the screen stays there, as far as the map
+        allows.
+        """
+        zoom_level = max(0, min(self.zoom_level + steps,
+                                len(ZOOM_LEVELS) - 1))
+        if zoom_level == self.zoom_level:
+            return
+        x, y = self.to_hex(position)
+        self.zoom_level = zoom_level
+        dx, dy = self.level.geometry.to_hex(*position)
+        self.scroll_to(x - dx, y - dy)
+
+    def visible(self, x, y):
+        """Return True if hex (x, y) is in view."""
+        level = self.level
+        return self.scroll_x <= x < self.scroll_x + level.columns \
+            and self.scroll_y <= y < self.scroll_y + level.rows
+
+    def to_screen(self, x, y):
+        """Return the top left pixel of hex (x, y) on the screen."""
+        dx, dy = x - self.scroll_x, y - self.scroll_y
+        if self.zoom_level == 0:
+            position = self.positions.get((dx, dy))
+            if position is not None:
+                return position
+        return self.level.geometry.to_pixel(dx, dy)
+
+    def centre(self, x, y):
+        """Return the pixel of the screen at the middle of hex (x, y)."""
+        px, py = self.to_screen(x, y)
+        geometry = self.level.geometry
+        if self.zoom_level == 0:
+            # Where the game always drew marks on hexes
+            return px + 20, py + 20
+        return px + geometry.tile_width // 2, \
+            py + geometry.row_height * 2 // 3
+
+    def to_hex(self, position):
+        """Return the hex at position of the screen."""
+        dx, dy = self.level.geometry.to_hex(*position)
+        return self.scroll_x + dx, self.scroll_y + dy
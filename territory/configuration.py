@@ -30,12 +30,15 @@ class ConfigurationManager:
 
     def __init__(self):
         self.skin_name = "default"
+        self.skin_path = None
         self.sc = {}
 
         # Misc options
         self.ai_recursion_depth = None
         self.show_cpu_moves = None
         self.ruleset = None
+        self.record_replays = False
+        self.map_pool_size = 0
 
         # Load the options file
         self.ini_options = configparser.RawConfigParser()
@@ -62,9 +65,14 @@ class ConfigurationManager:
         self.show_cpu_moves = self.ini_options.get("MainConf",
                                                    "cpu_movesl") == "true"
         self.ruleset = self.ini_options.get("MainConf", "ruleset")
+        self.record_replays = self.ini_options.get(
+            "MainConf", "record_replays", fallback="false") == "true"
+        self.map_pool_size = self.ini_options.getint(
+            "MainConf", "map_pool_size", fallback=0)
 
     def load_skin_file(self, filename1):
         """Load skin configuration file and read it into sc."""
+        self.skin_path = filename1
 
         file = open(filename1, "r")
         for line in file:
@@ -27,42 +27,53 @@
 # Some progress was made in Territory 0.2.2... but there's still a lot that can
 # be done.
 
-import json
+import collections
+import math
 import random
 import time
 from pathlib import Path
 
-from territory import soundtrack
+from territory import mapgen, soundtrack
 from territory.ai import AI
-from territory.actor import Actor
+from territory.actor import Actor, ActorSet
+from territory.hexmap import HexMap, HEX_EVEN_Y, HEX_ODD_Y
 from territory.player import Player
 from territory.recurser import Recurser
+from territory.replay import ReplayRecorder
 from territory.server import Server
 import territory.serializer as serializer
+import territory.snapshot as snapshot
 
 _DEBUG = 0
 
-# Six direction neighbourhood matrix for even y coordinates
-# (0, 2, 4, ..., n % 2 = 0)
-HEX_EVEN_Y = (
-    (1, 0),
-    (0, 1),
-    (-1, 1),
-    (-1, 0),
-    (-1, -1),
-    (0, -1)
-)
-
-# Six direction neighbourhood matrix for odd y coordinates
-# (0, 2, 4, ..., n % 2 = 1)
-HEX_ODD_Y = (
-    (1, 0),
-    (1, 1),
-    (0, 1),
-    (-1, 0),
-    (0, -1),
-    (1, -1)
-)
+# Size of randomly generated maps unless asked otherwise
+DEFAULT_WIDTH = 30
+DEFAULT_HEIGHT = 14
+
+# Random maps with more hexes grow from one island instead of joining
+# islands stamped all over the map, which takes ever longer on big maps
+SCATTERED_AREA = 300 * 300
+
+# Hexes store their owner in one byte
+MAX_PLAYERS = 255
+
+# Generators of random maps (see new_game)
+MAP_STYLES = ("boxes", "noise")
+
+# Players the default random map is made for
+DEFAULT_PLAYERS = 6
+
+
+def random_map_size(players):
+    """Return the width and height of a random map for players.
+
+    The default map grows with more than DEFAULT_PLAYERS players, keeping its
+    shape, so that every player gets about as much land as on it.
+    """
+    if players <= DEFAULT_PLAYERS:
+        return DEFAULT_WIDTH, DEFAULT_HEIGHT
+    scale = math.sqrt(players / DEFAULT_PLAYERS)
+    return round(DEFAULT_WIDTH * scale), round(DEFAULT_HEIGHT * scale)
 
 
 class CombatEngaged:
@@ -75,6 +86,9 @@ class CombatEngaged:
 class GameBoard:
     """Class for game board and its logic."""
 
+    # Whether game events play sound effects
+    play_sounds = True
+
     @staticmethod
     def get_right_edm(y: int):
         # Selected right neighbourhood coordinate matrix
@@ -94,11 +108,11 @@ class GameBoard:
         self.server = server
         self.ruleset = ruleset
 
-        # DATA is dictionary which has board pieces.
+        # DATA is a HexMap which has board pieces.
         # Values: playerid; 0 = Empty Space, 1-6 are player id:s
-        self.data = {}
-        self.width = 30
-        self.height = 14
+        self.data = HexMap(0, 0)
+        self.width = DEFAULT_WIDTH
+        self.height = DEFAULT_HEIGHT
 
         # Pretty self-explanatory
         self.show_cpu_moves_with_lines = True
@@ -123,43 +137,77 @@ class GameBoard:
         self.scores = ()
 
         # Actors set (set for optimization purposes) which holds every
-        # instance of Actor-class (Soldiers and Dumps at the moment)
-        self.actors = {Actor(0, 0, 0)}  # Make pycharm infer correct type
-        self.actors.clear()
+        # instance of Actor-class (Soldiers and Dumps at the moment), indexed
+        # by position
+        self.actors = ActorSet()
 
         # List of current players in a game
         self.playerlist = []
 
-    def write_edit_map(self, path: Path):
-        """Write edited map to file."""
+        # Random generator for maps and dump placement. It is separate from
+        # the one used by AIs and combat, so replays can reproduce it.
+        self.rng = random.Random()
+
+        # Directory to record games into (None: do not record) and the
+        # recorder of the current game
+        self.replay_dir = None
+        self.recorder = None
+
+        # MapPool to take random boards from, if any
+        self.map_pool = None
+
+    def write_edit_map(self, path: Path, binary=True):
+        """Write edited map to file.
+
+        :param binary: write the binary scenario format; False writes the old
+            JSON format.
+        """
         humans, computers = self.map_edit_info[0:2]
-        with path.open('w') as file:
-            json.dump({
-                "players": ["human" for _ in range(humans)] +
-                           ["ai" for _ in range(computers)],
-                "data": serializer.to_string_dict(self.data),
-                "width": self.width,
-                "height": self.height
-            }, file)
+        players = ["human"] * humans + ["ai"] * computers
+        serializer.write_scenario(
+            path,
+            serializer.Scenario(players, self.width, self.height, self.data),
+            binary=binary)
+
+    def snapshot(self):
+        """Return the complete game state as compact bytes."""
+        return snapshot.encode(self)
+
+    def restore(self, state):
+        """Restore a game state returned by snapshot().
+
+        :param state: bytes or a buffer such as a shared memory block.
+        """
+        snapshot.decode(self, state)
+        self.map_edit_mode = False
+        self.scores = ()
 
     def read_scenarios(self):
-        # Get list of the scenario - folder's files and remove ".svn" - folder
-        scenario_list = (self.server.game_path / "scenarios").iterdir()
-        slc = [file for file in scenario_list
-               if file.is_file()  # no directories
-               and file.name[0] != "."  # no hidden files
-               and file.name[-1] != "~"  # no backup files
-               ]
-        return slc
-
-    def new_game(self, file=None, cpus=3, humans=3, cpu_names=None):
+        # Paths of the readable scenarios, from the server's catalogue
+        return [info.path for info in self.server.catalogue.scenarios()]
+
+    def new_game(self, file=None, cpus=3, humans=3, cpu_names=None,
+                 mapped=False, width=None, height=None, seed=None,
+                 style=None):
         """
         Prepare a new game.
 
         :param file: Filename for scenario; None for random generation
         :param cpus: CPU Player count in random generated map
         :param humans: Human Player count in random generated map
+        :param mapped: Memory-map the scenario (see load_map) instead of
+            using the catalogue's cached first turn
+        :param width: Width of random generated map; by default, see
+            random_map_size
+        :param height: Height of random generated map
+        :param seed: Seed for random generated map
+        :param style: "boxes" for the classic random generator, "noise" for
+            the noise generator with fair player areas. By default boxes
+            for up to DEFAULT_PLAYERS players, noise for more: boxes gives
+            land hex by hex to random players, and with many players few
+            of them get two hexes next to each other.
         """
+        self.stop_recording()
 
         # Initial conditions
         self.turn = 1
@@ -181,16 +229,93 @@ class GameBoard:
                 self.playerlist.append(
                     Player(name, i + (humans + 1), AI(self)))
 
-        # Clear data and actors from possible previous maps
-        self.data = {}
+        # Clear actors from possible previous maps; the data is replaced below
         self.actors.clear()
 
+        state = None
+        # Dumps of the first turn, for mapped scenarios
+        dumps = None
         if file is None:
+            default_width, default_height = random_map_size(
+                len(self.playerlist))
+            if width is None:
+                width = default_width
+            if height is None:
+                height = default_height
+            if style is None:
+                style = "boxes" if len(self.playerlist) <= DEFAULT_PLAYERS \
+                    else "noise"
+            # Take a pre-generated map if we have one (unless it must be the
+            # map of a specific seed)
+            if self.map_pool is not None and seed is None:
+                state = self.map_pool.pop(self.map_pool.key(
+                    width, height, len(self.playerlist), style))
+
+        if file is None and state is None:
             # Generate random map
-            self.generate_map(50)
+            self.width, self.height = width, height
+            if style == "noise":
+                self.generate_noise_map(len(self.playerlist), seed=seed)
+            elif style == "boxes":
+                # 50 lands on the default map, the same share on others
+                self.generate_map(
+                    max(50 * width * height // (30 * 14), 1),
+                    players=max(6, len(self.playerlist)), seed=seed,
+                    scatter=float(width * height <= SCATTERED_AREA))
+            else:
+                raise ValueError("unknown map style {}".format(style))
+        elif file is not None:
+            # The catalogue keeps the prepared first turn of every scenario
+            if not mapped:
+                state = self.server.catalogue.initial_state(file)
+            if state is None:
+                # Read a scenario
+                self.load_map(self.server.game_path / "scenarios" / file,
+                              mapped=mapped)
+            if mapped:
+                # Restoring the first turn would read the whole mapped map,
+                # so only its dumps are taken from the catalogue.
+                info = self.server.catalogue.info(file)
+                if info is not None:
+                    dumps = info.dumps
+
+        if state is not None:
+            players = self.playerlist
+            self.restore(state)
+            if file is None:
+                # Pooled maps come with placeholder players
+                self.playerlist = players
+        elif dumps is not None:
+            self.place_first_dumps(dumps)
         else:
-            # Read a scenario
-            self.load_map(self.server.game_path / "scenarios" / file)
+            self.prepare_first_turn()
+
+        if self.replay_dir is not None:
+            if file is None:
+                scenario, scenario_hash = "random", ""
+            else:
+                info = self.server.catalogue.info(file)
+                scenario, scenario_hash = file, info.hash if info else ""
+            self.start_recording(
+                self.replay_dir / time.strftime("%Y%m%d-%H%M%S.replay"),
+                scenario, scenario_hash)
+
+    def start_recording(self, path: Path, scenario="random",
+                        scenario_hash=""):
+        """Record the rest of the game into a replay file."""
+        self.stop_recording()
+        seed = random.getrandbits(64)
+        self.rng.seed(seed)
+        self.recorder = ReplayRecorder(path, self, seed, scenario,
+                                       scenario_hash)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def prepare_first_turn(self):
+        """Place dumps and calculate supplies for a freshly loaded map."""
 
         # Add resource dumps
         self.land_was_conquered()
@@ -202,13 +327,26 @@ class GameBoard:
         # Calculate everyone's supply, income and expenses
         self.salary_time_to_dumps_by_turn(self.get_player_id_list(), True)
 
+    def place_first_dumps(self, dumps):
+        """Place the dumps of a prepared first turn (see catalogue).
+
+        Only the hexes of the dumps are read, so a mapped map stays unread.
+        """
+        for dump in dumps:
+            actor = Actor(dump.x, dump.y, self.data[dump.x, dump.y],
+                          dump=True)
+            actor.supplies = dump.supplies
+            actor.revenue = dump.revenue
+            actor.expenses = dump.expenses
+            self.actors.add(actor)
+
     def get_player_id_list(self):
         # Make a player-id - list and return it
         return [it.id for it in self.playerlist]
 
     def count_world_area(self):
         """Count whole world's land count."""
-        return sum(1 for v in self.data.values() if v > 0)
+        return len(self.data) - self.data.count(0)
 
     def destroy_lonely_actors(self):
         """Destroy soldiers and dumps isolated onto one square."""
@@ -237,6 +375,9 @@ class GameBoard:
             # The soldier has already moved
             return
 
+        # Where the actor moves from, for the replay
+        x1, y1 = actor.x, actor.y
+
         # Blocked[0] -> Boolean value whether the target land is blocked
         # Blocked[1], Blocked[2] -> if target land is blocked, these
         # hold the coordinates for the reason of block.
@@ -258,7 +399,9 @@ class GameBoard:
                 self.actors.discard(actor)
 
                 # Dump creation may be needed.
-                self.land_was_conquered()
+                self.land_was_conquered([(x2, y2)])
+                if self.recorder is not None:
+                    self.recorder.record_move(x1, y1, x2, y2, True)
                 return
 
             # Check for success (in lvl-6 vs lvl-6 battles the actor might
@@ -277,24 +420,27 @@ class GameBoard:
                 if not only_simulation:
                     # Not simulating, not blocked, attacker conquered target
                     # land.
-                    actor.x, actor.y = x2, y2
+                    self.actors.move(actor, x2, y2)
                     actor.moved = True
                     if target:
                         # If there was an actor (unit/dump) at target
                         # land, it is discarded (destroyed)
-                        target.die()
+                        target.die(sound=self.play_sounds)
                         self.actors.discard(target)
 
-                    # Fix this to check one island (x2, y2) if dump creating
+                    # Check the islands around (x2, y2) if dump creating
                     # needed
-                    self.land_was_conquered()
+                    self.land_was_conquered([(x2, y2)])
             elif not only_simulation:
                 # Unfortunately the target succeeds and actor dies.
-                actor.die()
+                actor.die(sound=self.play_sounds)
                 self.actors.discard(actor)
 
                 # One less actor -> maybe can fill dumps
-                self.land_was_conquered()
+                self.land_was_conquered([(x2, y2)])
+
+            if not only_simulation and self.recorder is not None:
+                self.recorder.record_move(x1, y1, x2, y2, success)
 
             # Return result.
             return CombatEngaged(success)
@@ -366,16 +512,28 @@ class GameBoard:
             # Now the dump is registered
             self.actors.add(new_dump)
 
-    def land_was_conquered(self):
-        """Should be called when lands are conquered."""
+    def land_was_conquered(self, around=None):
+        """Should be called when lands are conquered.
+
+        :param around: hexes whose owner changed; only the islands next to
+            them are checked. Every island is checked by default.
+        """
 
         # Keep count of already searched lands
         searched = set()
 
-        # Get list of current non-lost players
-        alive_players = self.get_player_id_list()
+        # Get set of current non-lost players
+        alive_players = set(self.get_player_id_list())
 
-        for xy, xy_pid in self.data.items():
+        if around is None:
+            hexes = self.data.items()
+        else:
+            hexes = [((x, y), self.data[x, y])
+                     for x1, y1 in around
+                     for x, y in ((x1, y1),) + tuple(self.neighbours(x1, y1))
+                     if self.isvalid(x, y)]
+
+        for xy, xy_pid in hexes:
 
             # Is the coordinate already crawled
             if xy in searched:
@@ -405,7 +563,7 @@ class GameBoard:
                     for _ in range(100):
                         # Find a new place for dump:
                         #   - get a random legal coordinate from crawled island
-                        coord = random.choice(list(search_dumps[1]))
+                        coord = self.rng.choice(list(search_dumps[1]))
 
                         if coord and not self.actor_at(coord):
                             # If a place was found for dump, we'll add
@@ -421,19 +579,18 @@ class GameBoard:
                     self.merge_dumps(search_dumps[0], list(search_dumps[1]))
 
     def fill_map(self, piece):
-        self.data = {}
-        for x in range(self.width):
-            for y in range(self.height):
-                self.data[x, y] = piece
+        self.data = HexMap(self.width, self.height)
+        if piece:
+            self.data.fill(piece)
 
     def actor_at(self, x, y=None):
         if y is None:
             x, y = x
 
-        # Search actor - instances by coordinates
-        for actor in self.actors:
-            if actor.x == x and actor.y == y and not actor.dead:
-                return actor
+        # Look the actor up in the position index
+        actor = self.actors.at(x, y)
+        if actor is not None and not actor.dead:
+            return actor
 
         # No actor found, return None
         return None
@@ -442,10 +599,9 @@ class GameBoard:
         """Get the actor at the given coordinates.
 
         Raise an exception if no actor found."""
-        x, y = xy
-        for actor in self.actors:
-            if actor.x == x and actor.y == y and not actor.dead:
-                return actor
+        actor = self.actor_at(xy)
+        if actor is not None:
+            return actor
         raise ValueError('no actor found at {}'.format(xy))
 
     def fill_random_boxes(self, d, for_whom):
@@ -456,30 +612,45 @@ class GameBoard:
         # This just basically randoms coordinates and fills map
         if d > 0:
             while d > 0:
-                x = random.randint(2, self.width - 1)
-                y = random.randint(2, self.height - 1)
+                x = self.rng.randint(2, self.width - 1)
+                y = self.rng.randint(2, self.height - 1)
                 for nx, ny in self.neighbours(x, y):
                     if self.isvalid(nx, ny):
-                        pid = random.choice(for_whom)
+                        pid = self.rng.choice(for_whom)
                         self.data[nx, ny] = pid
                 d -= 1
 
     def whole_map_situation_score(self, for_whom):
-        return list(self.data.values()).count(for_whom)
+        return self.data.count(for_whom)
 
     def is_blocked(self, actor, x, y):
         return self.ruleset.is_blocked(self, actor, x, y)
 
-    def generate_map(self, minsize):
-        """Generate a simple random map."""
-        self.fill_map(0)
-        while True:
-            self.fill_random_boxes(1, [1, 2, 3, 4, 5, 6])
-            if self.rek.iscontiguous() and self.count_world_area() >= minsize:
-                break
+    def generate_map(self, minsize, players=6, seed=None, scatter=1.0):
+        """Generate a simple random map.
+
+        :param players: land is given to players 1...players
+        :param seed: seed for the board's random generator, if given
+        :param scatter: see mapgen.generate_boxes
+        """
+        if seed is not None:
+            self.rng.seed(seed)
+        self.data = mapgen.generate_boxes(self.width, self.height, minsize,
+                                          players, self.rng, scatter)
         self.land_was_conquered()
         self.salary_time_to_dumps_by_turn(self.get_player_id_list(), True)
 
+    def generate_noise_map(self, players, seed=None, **options):
+        """Generate a random map with noise; see mapgen.generate_noise.
+
+        :param players: land is given to players 1...players
+        :param seed: seed for the board's random generator, if given
+        """
+        if seed is not None:
+            self.rng.seed(seed)
+        self.data = mapgen.generate_noise(self.width, self.height, players,
+                                          self.rng, **options)
+
     def clean_dead(self):
         """Remove dead actors from the map."""
         for actor in self.actors.copy():
@@ -492,42 +663,52 @@ class GameBoard:
         if len(no_losers) == 1:
             no_losers[0].won = True
             # calculate sound
-            if not no_losers[0].ai_controller:
+            if not no_losers[0].ai_controller and self.play_sounds:
                 soundtrack.play_sfx("victory")
             return True
         return False
 
-    def load_map(self, map_path: Path):
-        """Load a map from a file."""
+    def load_map(self, map_path: Path, mapped=False):
+        """Load a map from a file.
+
+        :param mapped: Memory-map the ownership layer of an uncompressed
+            binary scenario instead of reading it. Meant for huge maps:
+            loading takes constant time and only the parts of the map that
+            are accessed are read from disk. Changes are copy-on-write and
+            never reach the file.
+        """
         # TODO: Proper error handling.
         if self.map_edit_mode:
             self.map_edit_info = [0, 0, 1]
 
-        with map_path.open('r') as file:
-            data = json.load(file)
-            self.width = data.get("width", self.width)
-            self.height = data.get("height", self.height)
-            self.data = serializer.from_string_dict(data["data"])
-            for i, player in enumerate(data["players"]):
-                if player == "human":
-                    if not self.map_edit_mode:
-                        self.playerlist.append(
-                            Player("Player %d" % (i + 1), i + 1, None))
-                    else:
-                        self.map_edit_info[0] += 1
-                elif player == "ai":
-                    if not self.map_edit_mode:
-                        self.playerlist.append(
-                            Player("CPU {}".format(i + 1), i + 1, AI(self)))
-                    else:
-                        self.map_edit_info[1] += 1
+        # Both the binary and the old JSON scenario formats are accepted.
+        scenario = serializer.read_scenario(map_path, mapped=mapped)
+        self.width = scenario.width
+        self.height = scenario.height
+        self.data = scenario.data
+        for i, player in enumerate(scenario.players):
+            if player == "human":
+                if not self.map_edit_mode:
+                    self.playerlist.append(
+                        Player("Player %d" % (i + 1), i + 1, None))
+                else:
+                    self.map_edit_info[0] += 1
+            elif player == "ai":
+                if not self.map_edit_mode:
+                    self.playerlist.append(
+                        Player("CPU {}".format(i + 1), i + 1, AI(self)))
+                else:
+                    self.map_edit_info[1] += 1
 
     def has_anyone_lost_the_game(self):
         # Check if anyone has recently lost the game:
         #   - not marked as lost and has 0 dumps
+        # Count every player's dumps in one pass over the actors
+        dumps = collections.Counter(
+            actor.side for actor in self.actors
+            if actor.dump and not actor.dead)
         for candidate in self.playerlist:
-            if self.count_dumps(
-                    candidate.id) == 0 and not candidate.lost:
+            if dumps[candidate.id] == 0 and not candidate.lost:
                 candidate.lost = True
 
     def count_dumps(self, pid):
@@ -550,16 +731,15 @@ class GameBoard:
         :param just_do_math: If true, only income and expenses are calculated.
         """
         dead = []
-        coordinates = set()
         for city in self.cities(sides):
             possible_dead = []
-            coordinates.clear()
             expense = 0
-            self.rek.crawl(city.x, city.y, [city.side], coordinates)
+            coordinates = self.rek.island(city.x, city.y)
             area = len(coordinates)
-            for unit in self.actors:
+            for xy in coordinates:
                 # Soldiers are costly for dump
-                if (unit.x, unit.y) in coordinates and not unit.dump:
+                unit = self.actors.at(*xy)
+                if unit is not None and not unit.dump:
                     assert not unit.dead and unit.side == city.side
                     possible_dead.append(unit)
                     expense += self.ruleset.upkeep_costs[unit.level]
@@ -626,13 +806,42 @@ class GameBoard:
                 self.actors.add(ret)
             else:
                 # The soldier is now updated
-                soldier_to_update.upgrade(sound=sound)
+                soldier_to_update.upgrade(sound=sound and self.play_sounds)
                 ret = soldier_to_update
             # Calculate dumps income and expends
             self.salary_time_to_dumps_by_turn([self.turn], True)
+            if self.recorder is not None:
+                self.recorder.record_draft(x, y)
             return ret
 
+    def settle(self):
+        """Resolve the consequences of a player's move.
+
+        Return True if the move won the game, which clears the board.
+        """
+        self.destroy_lonely_actors()
+        self.has_anyone_lost_the_game()
+        won = self.check_and_mark_if_someone_won()
+        if won:
+            self.actors.clear()
+            self.fill_map(0)
+        if self.recorder is not None:
+            self.recorder.record_settle()
+        return won
+
     def end_turn(self):
+        self.advance_turn()
+        if self.recorder is not None:
+            self.recorder.record_end_turn(self)
+
+    def new_round(self):
+        """Give the turn back to the first player."""
+        self.turn = 1
+        # Every actor's "moved" is reset
+        for actor in self.actors:
+            actor.moved = False
+
+    def advance_turn(self):
 
         self.destroy_lonely_actors()
         self.has_anyone_lost_the_game()
@@ -642,7 +851,6 @@ class GameBoard:
         if self.check_and_mark_if_someone_won():
             # Someone won, break the recursion loop
             self.turn = 0
-            self.data = {}
             self.actors.clear()
             self.fill_map(0)
             return
@@ -656,12 +864,7 @@ class GameBoard:
 
         # Check if all players are scheduled already
         if len(self.playerlist) + 1 <= self.turn:
-            # Show last player's moves
-            time.sleep(0.2)
-            self.turn = 1
-            # Every actor's "moved" is reset
-            for actor in self.actors:
-                actor.moved = False
+            self.new_round()
 
         # Update salaries and kill own unsupplied soldiers
         self.salary_time_to_dumps_by_turn([self.turn], False)
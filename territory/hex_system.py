@@ -21,6 +21,8 @@
 #
 # ------------------------------------------------------------------------
 
+from array import array
+
 # This is the rectangular size of the hexagon tiles.
 TILE_WIDTH = 38
 TILE_HEIGHT = 41
@@ -31,6 +33,10 @@ ROW_HEIGHT = 31
 # This value will be applied to all odd rows x value.
 ODD_ROW_X_MOD = 19
 
+# This is the size of the map view on the screen, in hexes.
+VIEW_COLUMNS = 15
+VIEW_ROWS = 14
+
 # This is the size of the square grid that will help us convert pixel locations
 # to hexagon map locations.
 GRID_WIDTH = 38
@@ -56,3 +62,104 @@ GRID_ODD_ROWS = [
     if i < 10 else [a2] * 19 + [c2] * 19
     for i in range(31)
 ]
+
+
+class HexGeometry:
+    """Conversions between hexes and pixels, for tiles of a scale.
+
+    Which hex a pixel is on is looked up in a flat table of the offsets of
+    every pixel of a grid cell, built once from GRID_EVEN_ROWS and
+    GRID_ODD_ROWS scaled to the tiles.
+    """
+
+    def __init__(self, scale=1):
+        self.scale = scale
+        self.odd_row_x_mod = max(1, round(ODD_ROW_X_MOD * scale))
+        # Tiles are as wide as the grid, and odd rows half a tile to the
+        # right
+        self.tile_width = self.grid_width = 2 * self.odd_row_x_mod
+        self.row_height = self.grid_height = max(1, round(GRID_HEIGHT * scale))
+
+        # (dx, dy) of the pixels of a cell of even rows, row by row, then
+        # of odd rows; the tuples are those of the GRID tables
+        self.offsets = [
+            rows[py * GRID_HEIGHT // self.grid_height][
+                px * GRID_WIDTH // self.grid_width]
+            for rows in (GRID_EVEN_ROWS, GRID_ODD_ROWS)
+            for py in range(self.grid_height)
+            for px in range(self.grid_width)]
+
+    def to_pixel(self, x, y):
+        """Return the top left pixel of hex (x, y)."""
+        if y & 1:
+            # Odd rows will be moved to the right.
+            return x * self.tile_width + self.odd_row_x_mod, \
+                y * self.row_height
+        return x * self.tile_width, y * self.row_height
+
+    def to_hex(self, x, y):
+        """Return the hex pixel (x, y) is on."""
+        grid_width, grid_height = self.grid_width, self.grid_height
+        grid_x, grid_y = x // grid_width, y // grid_height
+        dx, dy = self.offsets[((grid_y & 1) * grid_height + y % grid_height)
+                              * grid_width + x % grid_width]
+        return grid_x + dx, grid_y + dy
+
+    def to_pixels(self, xs, ys):
+        """Return arrays of the top left pixels of hexes (xs[i], ys[i])."""
+        tile_width, row_height = self.tile_width, self.row_height
+        odd_row_x_mod = self.odd_row_x_mod
+        return (array('l', [x * tile_width + (y & 1) * odd_row_x_mod
+                            for x, y in zip(xs, ys)]),
+                array('l', [y * row_height for y in ys]))
+
+    def to_hexes(self, xs, ys):
+        """Return arrays of the hexes pixels (xs[i], ys[i]) are on."""
+        grid_width, grid_height = self.grid_width, self.grid_height
+        offsets = self.offsets
+        found = [offsets[((y // grid_height & 1) * grid_height
+                          + y % grid_height) * grid_width + x % grid_width]
+                 for x, y in zip(xs, ys)]
+        return (array('l', [x // grid_width + offset[0]
+                            for x, offset in zip(xs, found)]),
+                array('l', [y // grid_height + offset[1]
+                            for y, offset in zip(ys, found)]))
+
+    def view_positions(self, columns=VIEW_COLUMNS, rows=VIEW_ROWS):
+        """Return the top left pixels of the hexes of a view by (dx, dy).
+
+        (dx, dy) is relative to the hex at the top left of the view, whose
+        row must be even; the hexes partly in the view around it are
+        included.
+        """
+        hexes = [(dx, dy) for dx in range(-1, columns + 1)
+                 for dy in range(-1, rows + 1)]
+        xs, ys = self.to_pixels([dx for dx, _ in hexes],
+                                [dy for _, dy in hexes])
+        return dict(zip(hexes, zip(xs, ys)))
+
+
+class SquareGeometry:
+    """Hexes drawn as squares of size pixels, odd rows not moved.
+
+    For maps seen from far, a pixel or a few per hex, where the shape of
+    hexes does not show.
+    """
+
+    def __init__(self, size):
+        self.scale = size / TILE_WIDTH
+        self.odd_row_x_mod = 0
+        self.tile_width = self.grid_width = size
+        self.row_height = self.grid_height = size
+
+    def to_pixel(self, x, y):
+        """Return the top left pixel of hex (x, y)."""
+        return x * self.tile_width, y * self.row_height
+
+    def to_hex(self, x, y):
+        """Return the hex pixel (x, y) is on."""
+        return x // self.tile_width, y // self.row_height
+
+
+# Geometry of the tiles as they are drawn
+GEOMETRY = HexGeometry()
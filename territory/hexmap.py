@@ -0,0 +1,189 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Array storage for the ownership of hexes."""
+
+from collections.abc import MutableMapping
+
+# Six direction neighbourhood matrix for even y coordinates
+# (0, 2, 4, ..., n % 2 = 0)
+HEX_EVEN_Y = (
+    (1, 0),
+    (0, 1),
+    (-1, 1),
+    (-1, 0),
+    (-1, -1),
+    (0, -1)
+)
+
+# Six direction neighbourhood matrix for odd y coordinates
+# (0, 2, 4, ..., n % 2 = 1)
+HEX_ODD_Y = (
+    (1, 0),
+    (1, 1),
+    (0, 1),
+    (-1, 0),
+    (0, -1),
+    (1, -1)
+)
+
+# Key of a journal in which every hex may have changed
+JOURNAL_ALL = -1
+
+
+class HexMap(MutableMapping):
+    """Owner of every hex of a rectangular map, one byte per hex.
+
+    Behaves like the dictionary keyed by (x, y) tuples that the board used
+    to hold, but keeps the values in a single buffer. Hexes are stored
+    column by column (index = x * height + y), so a horizontal window of the
+    map is one contiguous range of the buffer.
+    """
+
+    def __init__(self, width, height, cells=None):
+        """
+        :param cells: writable buffer of width * height bytes (bytearray,
+            memoryview or mmap); a zeroed bytearray by default.
+        """
+        if cells is None:
+            cells = bytearray(width * height)
+        elif len(cells) != width * height:
+            raise ValueError("expected {} cells, got {}".format(
+                width * height, len(cells)))
+        self.width = width
+        self.height = height
+        self.cells = cells
+        # Incremented by every change made through the map (not through
+        # cells), so that results computed from the map can be cached
+        self.version = 0
+        # While journaling (see start_journal), the value every hex changed
+        # since had before, by buffer index
+        self.journal = None
+
+    @classmethod
+    def from_dict(cls, width, height, data):
+        """Create a map from a dictionary keyed by (x, y) tuples."""
+        hexmap = cls(width, height)
+        for xy, value in data.items():
+            hexmap[xy] = value
+        return hexmap
+
+    def index(self, x, y):
+        """Return the buffer index of (x, y), or -1 if it is off the map."""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return x * self.height + y
+        return -1
+
+    def __getitem__(self, xy):
+        x, y = xy
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[x * self.height + y]
+        raise KeyError(xy)
+
+    def __setitem__(self, xy, value):
+        x, y = xy
+        if 0 <= x < self.width and 0 <= y < self.height:
+            index = x * self.height + y
+            if self.journal is not None and index not in self.journal:
+                self.journal[index] = self.cells[index]
+            self.cells[index] = value
+            self.version += 1
+        else:
+            raise KeyError(xy)
+
+    def __delitem__(self, xy):
+        raise TypeError("hexes cannot be removed from a HexMap")
+
+    def __contains__(self, xy):
+        x, y = xy
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def __iter__(self):
+        for x in range(self.width):
+            for y in range(self.height):
+                yield x, y
+
+    def __len__(self):
+        return self.width * self.height
+
+    def __repr__(self):
+        return "<HexMap {}x{}>".format(self.width, self.height)
+
+    def columns(self, start=0, stop=None):
+        """Yield the cells of columns start...stop - 1 as bytes.
+
+        Only the requested columns of a memory-mapped map are read.
+        """
+        height = self.height
+        cells = self.cells
+        stop = self.width if stop is None else min(stop, self.width)
+        for x in range(max(start, 0), stop):
+            yield bytes(cells[x * height:(x + 1) * height])
+
+    def items(self):
+        for x, column in enumerate(self.columns()):
+            for y, value in enumerate(column):
+                yield (x, y), value
+
+    def values(self):
+        for column in self.columns():
+            yield from column
+
+    def fill(self, value):
+        """Set every hex to value."""
+        if self.journal is not None:
+            # Cheaper to send the whole map than a journal of all of it
+            self.journal[JOURNAL_ALL] = None
+        self.cells[:] = bytes((value,)) * len(self.cells)
+        self.version += 1
+
+    def start_journal(self):
+        """Start recording the changes made through the map."""
+        self.journal = {}
+
+    def take_journal(self):
+        """Return the changes recorded since the journal was last taken.
+
+        The result maps buffer indices to the values they had before; it
+        contains JOURNAL_ALL if every hex may have changed. A new journal is
+        started.
+        """
+        journal = self.journal
+        self.journal = {}
+        return journal
+
+    def count(self, value):
+        """Count the hexes owned by value."""
+        cells = self.cells
+        if isinstance(cells, (bytes, bytearray)):
+            return cells.count(value)
+        # Count column by column instead of copying a mapped file at once.
+        return sum(column.count(value) for column in self.columns())
+
+    def copy(self):
+        return HexMap(self.width, self.height, bytearray(self.cells))
+
+    def tobytes(self):
+        """Return the cells as bytes, column by column."""
+        cells = self.cells
+        return cells if isinstance(cells, bytes) else bytes(cells)
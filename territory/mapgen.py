@@ -0,0 +1,425 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Random map generation.
+
+Two styles are available: generate_boxes stamps random hexagons of land like
+the original generator did, and generate_noise shapes land with value noise
+and divides it fairly between players.
+"""
+
+import random
+from array import array
+from collections import deque
+from itertools import compress
+
+from territory.hexmap import HexMap, HEX_EVEN_Y, HEX_ODD_Y
+
+
+class UnionFind:
+    """Disjoint sets of hex indices that keeps count of the sets."""
+
+    def __init__(self, size):
+        self.parent = array('l', range(size))
+        self.size = array('l', [1]) * size
+        # Number of sets added and not merged yet
+        self.components = 0
+
+    def add(self, i):
+        """Start a new set containing only i."""
+        self.components += 1
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            # Path halving
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        self.components -= 1
+
+
+def generate_boxes(width, height, minsize, players=6, rng=None,
+                   scatter=1.0):
+    """Generate a contiguous map by stamping random hexagons of land.
+
+    Every stamp gives the six neighbours of a random hex to random players.
+    Connectivity of the land is kept up to date in a union-find as hexes are
+    stamped, so generation stops as soon as all land is connected and at
+    least minsize hexes big, without crawling the whole map.
+
+    :param players: land is given to players 1...players.
+    :param rng: random.Random to use; a new unseeded one by default.
+    :param scatter: probability of stamping anywhere on the map. Other
+        stamps are centred on the coast of existing land and grow it; low
+        values let big maps (a million hexes) finish in seconds.
+    :return: HexMap of the generated map.
+    """
+    if minsize > width * height:
+        raise ValueError("map of {}×{} cannot hold {} hexes of land".format(
+            width, height, minsize))
+    rng = rng if rng is not None else random.Random()
+    hexmap = HexMap(width, height)
+    cells = hexmap.cells
+    uniform = rng.random
+    components = UnionFind(width * height)
+    union = components.union
+    # Amount of land, and land that may still have water next to it
+    area = 0
+    coast = []
+
+    # Stamp centres; like the original generator, avoid the top left edges
+    low_x, low_y = min(2, width - 1), min(2, height - 1)
+    while components.components != 1 or area < minsize:
+        if coast and rng.random() >= scatter:
+            # Grow the land from a random hex of its coast
+            k = rng.randrange(len(coast))
+            x, y = divmod(coast[k], height)
+            if all(not (0 <= x + dx < width and 0 <= y + dy < height)
+                   or cells[(x + dx) * height + y + dy]
+                   for dx, dy in (HEX_ODD_Y if y % 2 else HEX_EVEN_Y)):
+                # Surrounded by land, no longer coast
+                coast[k] = coast[-1]
+                coast.pop()
+                continue
+        else:
+            x = rng.randint(low_x, width - 1)
+            y = rng.randint(low_y, height - 1)
+
+        for dx, dy in HEX_ODD_Y if y % 2 else HEX_EVEN_Y:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+            i = nx * height + ny
+            if not cells[i]:
+                # New land: join it with the land around it
+                area += 1
+                coast.append(i)
+                components.add(i)
+                for ddx, ddy in HEX_ODD_Y if ny % 2 else HEX_EVEN_Y:
+                    mx, my = nx + ddx, ny + ddy
+                    if 0 <= mx < width and 0 <= my < height \
+                            and cells[mx * height + my]:
+                        union(i, mx * height + my)
+            cells[i] = 1 + int(uniform() * players)
+    return hexmap
+
+
+def smoothstep(t):
+    return t * t * (3 - 2 * t)
+
+
+def value_noise(width, height, scale, rng):
+    """Return smooth random values in [0, 1) for every hex, column by column.
+
+    Random values on a lattice every scale hexes are interpolated. The
+    interpolation weights of every row are computed once, and each column is
+    produced by one comprehension.
+    """
+    lattice_height = int(height / scale) + 2
+    lattice = [[rng.random() for _ in range(lattice_height)]
+               for _ in range(int(width / scale) + 2)]
+    rows = []
+    for y in range(height):
+        j, t = divmod(y / scale, 1)
+        rows.append((int(j), smoothstep(t)))
+
+    noise = []
+    for x in range(width):
+        i, s = divmod(x / scale, 1)
+        s = smoothstep(s)
+        left, right = lattice[int(i)], lattice[int(i) + 1]
+        column = [a + (b - a) * s for a, b in zip(left, right)]
+        noise.extend([column[j] + (column[j + 1] - column[j]) * t
+                      for j, t in rows])
+    return noise
+
+
+def largest_component(width, height, mask):
+    """Return indices of the largest connected group of nonzero mask bytes."""
+    components = UnionFind(width * height)
+    union = components.union
+    land = list(compress(range(width * height), mask))
+    for i in land:
+        x, y = divmod(i, height)
+        # Neighbours earlier in the buffer; later ones join us themselves
+        for dx, dy in HEX_ODD_Y if y % 2 else HEX_EVEN_Y:
+            if dx > 0 or (dx == 0 and dy > 0):
+                continue
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height \
+                    and mask[nx * height + ny]:
+                union(i, nx * height + ny)
+    if not land:
+        return []
+    find = components.find
+    roots = [find(i) for i in land]
+    best = max(set(roots), key=lambda root: components.size[root])
+    return [i for i, root in zip(land, roots) if root == best]
+
+
+def spread_seeds(width, height, land, count, rng):
+    """Choose count land indices far apart from each other."""
+    candidates = rng.sample(land, min(len(land), count * 32))
+    seeds = [candidates.pop()]
+
+    def position(i):
+        x, y = divmod(i, height)
+        # Odd rows are offset by half a hex
+        return x + 0.5 * (y % 2), y
+
+    positions = [position(i) for i in candidates]
+    sx, sy = position(seeds[0])
+    distances = [(x - sx) ** 2 + (y - sy) ** 2 for x, y in positions]
+    while len(seeds) < count:
+        k = distances.index(max(distances))
+        seed = candidates.pop(k)
+        positions.pop(k)
+        distances.pop(k)
+        seeds.append(seed)
+        sx, sy = position(seed)
+        distances = [min(d, (x - sx) ** 2 + (y - sy) ** 2)
+                     for d, (x, y) in zip(distances, positions)]
+    return seeds
+
+
+def generate_noise(width, height, players=6, rng=None, land=0.5, scale=8.0,
+                   octaves=3, regions=1):
+    """Generate a map whose land is shaped by value noise.
+
+    The land is the fraction land of the hexes where the noise is highest,
+    reduced to its largest connected group. It is then divided between the
+    players by growing regions from seeds spread over the land, one hex per
+    player in turn and each up to its share, and balance_areas evens out
+    what enclosed regions could not reach: all players get the same area,
+    give or take one hex.
+
+    :param players: land is given to players 1...players.
+    :param rng: random.Random to use; a new unseeded one by default.
+    :param land: fraction of the map that is land before small islands are
+        removed.
+    :param scale: size in hexes of the largest features.
+    :param octaves: number of layers of ever smaller detail.
+    :param regions: number of separate starting regions of each player.
+    :return: HexMap of the generated map.
+    """
+    rng = rng if rng is not None else random.Random()
+    size = width * height
+
+    noise = [0.0] * size
+    amplitude = 1.0
+    total = 0.0
+    for octave in range(octaves):
+        layer = value_noise(width, height, max(scale / 2 ** octave, 1), rng)
+        noise = [a + b * amplitude for a, b in zip(noise, layer)]
+        total += amplitude
+        amplitude /= 2
+
+    # Threshold the noise on its histogram, so exactly the requested
+    # fraction of the map is land.
+    levels = bytes([int(value * 255 / total) for value in noise])
+    threshold = 256
+    sea = size
+    while threshold > 0 and sea > size * (1 - land):
+        threshold -= 1
+        sea -= levels.count(threshold)
+    mask = levels.translate(bytes(int(level >= threshold)
+                                  for level in range(256)))
+
+    island = largest_component(width, height, mask)
+    if len(island) < players * regions:
+        raise ValueError("not enough land for {} players".format(players))
+
+    # Grow the players' regions from their seeds in turns, each up to its
+    # share of the land, then let any region take what is left
+    hexmap = HexMap(width, height)
+    cells = hexmap.cells
+    is_land = bytearray(size)
+    for i in island:
+        is_land[i] = 1
+    frontiers = [deque() for _ in range(players)]
+    seeds = spread_seeds(width, height, island, players * regions, rng)
+    rng.shuffle(seeds)
+    areas = [0] * (players + 1)
+    for k, seed in enumerate(seeds):
+        cells[seed] = k % players + 1
+        areas[k % players + 1] += 1
+        frontiers[k % players].append(seed)
+    quota = -(-len(island) // players)
+    grow_regions(hexmap, is_land, frontiers, areas, quota)
+    grow_regions(hexmap, is_land, frontiers, areas, len(island))
+
+    balance_areas(hexmap, island, players)
+    return hexmap
+
+
+def grow_regions(hexmap, is_land, frontiers, areas, quota):
+    """Claim free land for the players in turns, one hex at a time.
+
+    Player k claims land next to the hexes in frontiers[k - 1] until it has
+    quota hexes or nothing left to claim.
+    """
+    width, height, cells = hexmap.width, hexmap.height, hexmap.cells
+    growing = [player for player in range(len(frontiers))
+               if areas[player + 1] < quota]
+    while growing:
+        for player in list(growing):
+            frontier = frontiers[player]
+            while frontier:
+                x, y = divmod(frontier[0], height)
+                for dx, dy in HEX_ODD_Y if y % 2 else HEX_EVEN_Y:
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < width and 0 <= ny < height:
+                        i = nx * height + ny
+                        if is_land[i] and not cells[i]:
+                            cells[i] = player + 1
+                            areas[player + 1] += 1
+                            frontier.append(i)
+                            break
+                else:
+                    # Nothing left to claim around this hex
+                    frontier.popleft()
+                    continue
+                break
+            if not frontier or areas[player + 1] >= quota:
+                growing.remove(player)
+
+
+def balance_areas(hexmap, land, players):
+    """Even out the players' areas to within one hex.
+
+    Regions enclosed while growing end up small, and the regions around them
+    big. Land is passed from a big region to a small one along a chain of
+    neighbouring regions: each region on the chain grows into the next one
+    by as much as it got, so only the ends change size. The hexes of each
+    region that touch each other region are kept up to date as hexes change
+    hands, so no pass over the whole map is needed.
+    """
+    width, height, cells = hexmap.width, hexmap.height, hexmap.cells
+
+    def adjacent(i):
+        x, y = divmod(i, height)
+        return [nx * height + ny
+                for nx, ny in ((x + dx, y + dy) for dx, dy in
+                               (HEX_ODD_Y if y % 2 else HEX_EVEN_Y))
+                if 0 <= nx < width and 0 <= ny < height
+                and cells[nx * height + ny]]
+
+    areas = [0] * (players + 1)
+    # Hexes of region a that touch region b, by (a, b)
+    contacts = {}
+    for i in land:
+        owner = cells[i]
+        areas[owner] += 1
+        for j in adjacent(i):
+            if cells[j] != owner:
+                contacts.setdefault((owner, cells[j]), set()).add(i)
+
+    def give(i, new):
+        old = cells[i]
+        cells[i] = new
+        areas[old] -= 1
+        areas[new] += 1
+        for j in adjacent(i):
+            other = cells[j]
+            if other != old:
+                contacts[old, other].discard(i)
+                if all(cells[k] != old for k in adjacent(j)):
+                    contacts[other, old].discard(j)
+            if other != new:
+                contacts.setdefault((new, other), set()).add(i)
+                contacts.setdefault((other, new), set()).add(j)
+
+    def grow_into(taker, giver, amount):
+        """Give up to amount hexes of giver next to taker; return how many."""
+        queue = deque(sorted(contacts.get((giver, taker), ())))
+        queued = set(queue)
+        moved = 0
+        while queue and moved < amount:
+            i = queue.popleft()
+            give(i, taker)
+            moved += 1
+            for j in adjacent(i):
+                if cells[j] == giver and j not in queued:
+                    queued.add(j)
+                    queue.append(j)
+        return moved
+
+    # Shares differ by at most one hex; the biggest regions keep the extras
+    order = sorted(range(1, players + 1), key=lambda p: -areas[p])
+    quotas = [0] * (players + 1)
+    for k, player in enumerate(order):
+        quotas[player] = len(land) // players + (k < len(land) % players)
+
+    # Chains that could not pass any land on, and players beyond help
+    blocked = set()
+    stuck = set()
+    while True:
+        short = [p for p in range(1, players + 1)
+                 if areas[p] < quotas[p] and p not in stuck]
+        if not short:
+            break
+        target = min(short, key=lambda p: areas[p] - quotas[p])
+
+        # Nearest region with land to spare, by breadth-first search
+        # through the regions bordering each other
+        givers = {}
+        for (a, b), hexes in contacts.items():
+            if hexes and (a, b) not in blocked:
+                givers.setdefault(b, []).append(a)
+        previous = {target: None}
+        queue = deque([target])
+        source = None
+        while queue and source is None:
+            region = queue.popleft()
+            for giver in sorted(givers.get(region, ())):
+                if giver not in previous:
+                    previous[giver] = region
+                    if areas[giver] > quotas[giver]:
+                        source = giver
+                        break
+                    queue.append(giver)
+        if source is None:
+            stuck.add(target)
+            continue
+
+        amount = min(areas[source] - quotas[source],
+                     quotas[target] - areas[target])
+        giver = source
+        while giver != target:
+            taker = previous[giver]
+            amount = grow_into(taker, giver, amount)
+            if not amount:
+                blocked.add((giver, taker))
+                break
+            giver = taker
@@ -0,0 +1,171 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Pool of pre-generated random boards, filled in the background."""
+
+import collections
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+PoolKey = collections.namedtuple(
+    'PoolKey',
+    ['width', 'height', 'players', 'style']
+)
+
+# Server and board of a worker process, created on its first job
+_worker_board = None
+
+
+def generate(game_path: Path, key: PoolKey, path: Path):
+    """Generate the first turn of a random game and save its snapshot.
+
+    Runs in a worker process.
+    """
+    global _worker_board
+    if _worker_board is None:
+        # Imported here: the game board imports this module's users.
+        from territory.server import Server
+        from territory.server.serverboard import ServerBoard
+        server = Server(game_path)
+        _worker_board = ServerBoard(server, server.ruleset)
+    board = _worker_board
+    board.rng.seed(os.urandom(16))
+    board.new_game(cpus=key.players, humans=0, width=key.width,
+                   height=key.height, style=key.style)
+    temporary = path.with_suffix(".tmp")
+    temporary.write_bytes(board.snapshot())
+    os.replace(str(temporary), str(path))
+    return path
+
+
+class MapPool:
+    """Keeps ready-to-play random boards for every key that is asked for.
+
+    Boards are snapshots of the first turn of a random game, generated by
+    worker processes and stored as files in the cache directory, so they
+    survive between runs. Taking one is a file read.
+    """
+
+    def __init__(self, game_path: Path, size=2, workers=1, cache_dir=None):
+        """
+        :param size: number of boards to keep ready per key.
+        :param workers: number of worker processes.
+        """
+        self.game_path = game_path
+        self.size = size
+        self.workers = workers
+        if cache_dir is None:
+            cache_dir = game_path / "cache" / "maps"
+        self.cache_dir = cache_dir
+        self.executor = None
+
+        # Guards ready and pending, which worker callbacks update
+        self.lock = threading.Lock()
+        # Paths of generated boards by key, oldest first
+        self.ready = {}
+        # Boards being generated by key
+        self.pending = collections.Counter()
+
+    @staticmethod
+    def key(width, height, players, style):
+        return PoolKey(width, height, players, style)
+
+    def directory(self, key: PoolKey):
+        return self.cache_dir / "{}x{}-{}-{}".format(
+            key.width, key.height, key.players, key.style)
+
+    def boards(self, key: PoolKey):
+        """Return the deque of ready boards of key, reading the cache once.
+
+        Must be called with the lock held.
+        """
+        if key not in self.ready:
+            directory = self.directory(key)
+            try:
+                with os.scandir(str(directory)) as entries:
+                    paths = [Path(entry.path) for entry in entries
+                             if entry.name.endswith(".state")]
+            except OSError:
+                paths = []
+            self.ready[key] = collections.deque(paths)
+        return self.ready[key]
+
+    def pop(self, key: PoolKey):
+        """Take a ready board's snapshot, or return None if there is none.
+
+        Generation of a replacement starts in the background.
+        """
+        state = None
+        with self.lock:
+            boards = self.boards(key)
+            while boards and state is None:
+                path = boards.popleft()
+                try:
+                    state = path.read_bytes()
+                    path.unlink()
+                except OSError:
+                    # Taken by another instance of the game
+                    state = None
+        self.warm(key)
+        return state
+
+    def warm(self, key: PoolKey):
+        """Start generating boards until size boards of key are ready."""
+        with self.lock:
+            missing = self.size - len(self.boards(key)) - self.pending[key]
+            if missing <= 0:
+                return
+            directory = self.directory(key)
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+            except OSError:
+                return
+            if self.executor is None:
+                # Workers are started fresh: forking would copy the display
+                # and the threads of the game (like the sound preload)
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"))
+            for _ in range(missing):
+                path = directory / (uuid.uuid4().hex + ".state")
+                future = self.executor.submit(generate, self.game_path, key,
+                                              path)
+                future.add_done_callback(
+                    lambda future, key=key: self.generated(key, future))
+                self.pending[key] += 1
+
+    def generated(self, key, future):
+        with self.lock:
+            self.pending[key] -= 1
+            if not future.cancelled() and future.exception() is None:
+                self.boards(key).append(future.result())
+
+    def close(self):
+        """Stop the workers; boards being generated are abandoned."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
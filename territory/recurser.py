@@ -22,15 +22,52 @@
 # ------------------------------------------------------------------------
 
 
+# Every value a hex can have for land
+LAND = frozenset(range(1, 256))
+
+
 class Recurser:
     def __init__(self, board):
         self.board = board
 
+        # Islands crawled since the map last changed, by each of their hexes
+        self.islands = {}
+        # Border lands of those islands, by island
+        self.borders = {}
+        self.islands_map = None
+        self.islands_version = None
+
+    def expire(self):
+        """Forget the cached islands if the map has changed since."""
+        data = self.board.data
+        if data is not self.islands_map or \
+                data.version != self.islands_version:
+            self.islands.clear()
+            self.borders.clear()
+            self.islands_map = data
+            self.islands_version = data.version
+
+    def island(self, x, y):
+        """Return the frozenset of hexes of the island (x, y) belongs to.
+
+        An island is the land of one owner connected to (x, y). Islands are
+        cached until the map changes, so asking for the island of every
+        hex of an island crawls it once.
+        """
+        self.expire()
+        data = self.board.data
+        island = self.islands.get((x, y))
+        if island is None:
+            island = frozenset(self.crawl(x, y, [data[x, y]]))
+            for xy in island:
+                self.islands[xy] = island
+        return island
+
     def count_dumps_on_island(self, x, y):
         dumps_coord_list = []
         player = self.board.data[x, y]
         # Crawl island from (x, y)
-        land_area = self.crawl(x, y, [player])
+        land_area = self.island(x, y)
         # Let's iterate through crawled places
         for coordinate in land_area:
             # Check if current coordinate has a dump
@@ -56,26 +93,48 @@ class Recurser:
         assert land_area > 0
 
         x, y = self.find_land()
-        return len(self.crawl(x, y, [1, 2, 3, 4, 5, 6])) == land_area
+        return len(self.crawl(x, y, LAND)) == land_area
 
     def get_island_border_lands(self, x, y):
-        land_area_set = set()
-        island_owner = self.board.data[x, y]
-        self.crawl(x, y, [island_owner], land_area_set)
+        """Return the frozenset of other players' lands next to an island.
+
+        Cached like the islands.
+        """
+        land_area_set = self.island(x, y)
+        border_area_set = self.borders.get(land_area_set)
+        if border_area_set is not None:
+            return border_area_set
+
+        data = self.board.data
+        island_owner = data[x, y]
+        cells = data.cells
+        width, height = data.width, data.height
+        get_right_edm = self.board.get_right_edm
         border_area_set = set()
-        for xy in land_area_set:
-            x1, y1 = xy
-            for nx, ny in self.board.neighbours(x1, y1):
-                if self.board.isvalid(nx, ny) \
-                        and self.board.data[nx, ny] != island_owner \
-                        and self.board.data[nx, ny] != 0:
-                    # This works because set can't have duplicates
-                    border_area_set.add((nx, ny))
+        for x1, y1 in land_area_set:
+            for dx, dy in get_right_edm(y1):
+                nx, ny = x1 + dx, y1 + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    owner = cells[nx * height + ny]
+                    if owner != island_owner and owner != 0:
+                        # This works because set can't have duplicates
+                        border_area_set.add((nx, ny))
+        border_area_set = frozenset(border_area_set)
+        self.borders[land_area_set] = border_area_set
         return border_area_set
 
     def island_size(self, x, y):
         """Count the amount of land of the specified island."""
-        return len(self.crawl(x, y, [self.board.data[x, y]]))
+        return len(self.island(x, y))
+
+    def joined_size(self, x, y, owner):
+        """Count the land of the island (x, y) would join if owner took it."""
+        data = self.board.data
+        islands = set()
+        for nx, ny in self.board.neighbours(x, y):
+            if data.index(nx, ny) >= 0 and data[nx, ny] == owner:
+                islands.add(self.island(nx, ny))
+        return 1 + sum(len(island) for island in islands)
 
     def crawl(self, x, y, find_list, crawled=None):
         """
@@ -84,11 +143,25 @@ class Recurser:
         find_list -> list of players whose lands are to be searched
         """
         crawled = crawled if crawled is not None else set()
-        if self.board.isvalid(x, y) and \
-                        self.board.data[x, y] in find_list and \
-                        (x, y) not in crawled:
-            crawled.add((x, y))
+        data = self.board.data
+        if data.index(x, y) < 0 or data[x, y] not in find_list \
+                or (x, y) in crawled:
+            return crawled
+
+        # Read the map buffer directly: this is the hottest loop of the game.
+        cells = data.cells
+        width, height = data.width, data.height
+        get_right_edm = self.board.get_right_edm
+        crawled.add((x, y))
+        stack = [(x, y)]
+        while stack:
+            x, y = stack.pop()
             # Crawl neighbours
-            for nx, ny in self.board.neighbours(x, y):
-                self.crawl(nx, ny, find_list, crawled)
+            for dx, dy in get_right_edm(y):
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height \
+                        and cells[nx * height + ny] in find_list \
+                        and (nx, ny) not in crawled:
+                    crawled.add((nx, ny))
+                    stack.append((nx, ny))
         return crawled  # places crawled
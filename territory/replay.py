@@ -0,0 +1,353 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Recording of games as compact action logs, and headless playback.
+
+A replay starts with a header holding the random seed of the board, the
+ruleset, the scenario and a snapshot of the first turn. It is followed by
+one record per action: moves (with the outcome of combat), drafts, settling
+after a player's move and ends of turn (with a digest of the state).
+Records are only ever appended, so a game that crashes leaves a replay that
+can be played up to the crash.
+"""
+
+import argparse
+import hashlib
+import struct
+import sys
+import time
+from pathlib import Path
+
+import territory.ruleset
+
+MAGIC = b"TRPL"
+VERSION = 1
+
+# magic, version, seed
+HEADER = struct.Struct("<4sBQ")
+# length prefix of the strings and the snapshot in the header
+SHORT_LENGTH = struct.Struct("<H")
+LONG_LENGTH = struct.Struct("<I")
+
+OP_MOVE = ord("M")
+OP_DRAFT = ord("D")
+OP_SETTLE = ord("S")
+OP_END_TURN = ord("E")
+
+# op, x1, y1, x2, y2, outcome
+MOVE = struct.Struct("<BIIIIB")
+# op, x, y
+DRAFT = struct.Struct("<BII")
+# op
+SETTLE = struct.Struct("<B")
+# op, turn afterwards, state digest
+END_TURN = struct.Struct("<BI16s")
+
+RECORDS = {OP_MOVE: MOVE, OP_DRAFT: DRAFT, OP_SETTLE: SETTLE,
+           OP_END_TURN: END_TURN}
+
+# Turns between the snapshots a player keeps for seeking
+KEYFRAME_INTERVAL = 20
+
+
+class ReplayError(ValueError):
+    """The replay is malformed or does not match the game."""
+
+
+def state_digest(board):
+    """Return a digest of the complete state of the board."""
+    return hashlib.blake2b(board.snapshot(), digest_size=16).digest()
+
+
+def pack_string(text):
+    encoded = text.encode("utf-8")
+    return SHORT_LENGTH.pack(len(encoded)) + encoded
+
+
+def unpack_string(buf, offset):
+    length, = SHORT_LENGTH.unpack_from(buf, offset)
+    offset += SHORT_LENGTH.size
+    return bytes(buf[offset:offset + length]).decode("utf-8"), \
+        offset + length
+
+
+def decode_records(buf, offset=0):
+    """Return the records in buf from offset on, as tuples (op, fields...).
+
+    A record cut short at the end, as a crash leaves it, is ignored.
+    """
+    records = []
+    try:
+        while offset < len(buf):
+            record = RECORDS[buf[offset]]
+            if offset + record.size > len(buf):
+                break
+            records.append(record.unpack_from(buf, offset))
+            offset += record.size
+    except KeyError as e:
+        raise ReplayError("corrupt replay") from e
+    return records
+
+
+class ReplayRecorder:
+    """Appends the actions of a game to a replay file."""
+
+    def __init__(self, path: Path, board, seed, scenario="random",
+                 scenario_hash=""):
+        """Start recording; the board must be at the start of its game.
+
+        :param seed: the seed the board's random generator was just given.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.file = path.open('wb')
+        snapshot = board.snapshot()
+        self.file.write(b"".join([
+            HEADER.pack(MAGIC, VERSION, seed),
+            pack_string(type(board.ruleset).__name__),
+            pack_string(scenario),
+            pack_string(scenario_hash),
+            LONG_LENGTH.pack(len(snapshot)),
+            snapshot
+        ]))
+
+    def record_move(self, x1, y1, x2, y2, success):
+        self.file.write(MOVE.pack(OP_MOVE, x1, y1, x2, y2, success))
+
+    def record_draft(self, x, y):
+        self.file.write(DRAFT.pack(OP_DRAFT, x, y))
+
+    def record_settle(self):
+        self.file.write(SETTLE.pack(OP_SETTLE))
+
+    def record_end_turn(self, board):
+        self.file.write(END_TURN.pack(OP_END_TURN, board.turn,
+                                      state_digest(board)))
+        # A turn is a reasonable unit to lose in a crash.
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Replay:
+    """A replay read into memory."""
+
+    def __init__(self, seed, ruleset, scenario, scenario_hash, snapshot,
+                 records):
+        self.seed = seed
+        self.ruleset = ruleset
+        self.scenario = scenario
+        self.scenario_hash = scenario_hash
+        self.snapshot = snapshot
+        # Tuples as unpacked from the file: (op, fields...)
+        self.records = records
+
+    @classmethod
+    def read(cls, path: Path):
+        return cls.decode(path.read_bytes())
+
+    @classmethod
+    def decode(cls, buf):
+        try:
+            magic, version, seed = HEADER.unpack_from(buf)
+            if magic != MAGIC:
+                raise ReplayError("not a replay")
+            if version != VERSION:
+                raise ReplayError(
+                    "unsupported replay version {}".format(version))
+            offset = HEADER.size
+            ruleset, offset = unpack_string(buf, offset)
+            scenario, offset = unpack_string(buf, offset)
+            scenario_hash, offset = unpack_string(buf, offset)
+            length, = LONG_LENGTH.unpack_from(buf, offset)
+            offset += LONG_LENGTH.size
+            snapshot = bytes(buf[offset:offset + length])
+            offset += length
+        except struct.error as e:
+            raise ReplayError("corrupt replay") from e
+        records = decode_records(buf, offset)
+        return cls(seed, ruleset, scenario, scenario_hash, snapshot, records)
+
+    def turn_count(self):
+        return sum(1 for record in self.records if record[0] == OP_END_TURN)
+
+
+class ScriptedRuleset:
+    """Ruleset whose combat outcome is set from outside.
+
+    Everything but takeover_attempt is delegated to the wrapped ruleset.
+    """
+
+    def __init__(self, ruleset):
+        self.ruleset = ruleset
+        self.outcome = True
+
+    def __getattr__(self, name):
+        return getattr(self.ruleset, name)
+
+    def takeover_attempt(self, actor, target):
+        return self.outcome
+
+
+class ReplayPlayer:
+    """Re-executes a replay on a board at full engine speed."""
+
+    def __init__(self, replay: Replay, board, verify=True):
+        """
+        :param board: a board without user interface, e.g. a ServerBoard.
+        :param verify: compare the state with the recorded digest at every
+            end of turn and raise ReplayError on a mismatch.
+        """
+        self.replay = replay
+        self.board = board
+        self.verify = verify
+        ruleset_class = getattr(territory.ruleset, replay.ruleset, None)
+        if not isinstance(ruleset_class, type):
+            raise ReplayError("unknown ruleset {}".format(replay.ruleset))
+        self.ruleset = ScriptedRuleset(ruleset_class())
+
+        # Index of the next record, and number of turns played so far
+        self.position = 0
+        self.turn = 0
+
+        # Keyframes for seeking: turn -> (position, snapshot, rng state)
+        self.keyframes = {}
+        self.rewind()
+
+    def rewind(self):
+        """Go back to the start of the game."""
+        self.board.restore(self.replay.snapshot)
+        self.board.ruleset = self.ruleset
+        self.board.recorder = None
+        self.board.rng.seed(self.replay.seed)
+        self.position = 0
+        self.turn = 0
+        self.keyframes[0] = (0, self.replay.snapshot,
+                             self.board.rng.getstate())
+
+    def finished(self):
+        return self.position >= len(self.replay.records)
+
+    def step(self):
+        """Execute the next record and return it."""
+        record = self.replay.records[self.position]
+        self.position += 1
+        board = self.board
+        op = record[0]
+        if op == OP_MOVE:
+            _, x1, y1, x2, y2, success = record
+            actor = board.actor_at(x1, y1)
+            if actor is None:
+                raise ReplayError("no actor at ({}, {}) at record {}".format(
+                    x1, y1, self.position - 1))
+            self.ruleset.outcome = bool(success)
+            board.attempt_move(actor, x2, y2, False)
+        elif op == OP_DRAFT:
+            _, x, y = record
+            board.draft_soldier(x, y, sound=False)
+        elif op == OP_SETTLE:
+            board.settle()
+        elif op == OP_END_TURN:
+            _, turn, digest = record
+            board.end_turn()
+            self.turn += 1
+            if self.verify and (board.turn != turn or
+                                state_digest(board) != digest):
+                raise ReplayError("state differs after turn {}".format(
+                    self.turn))
+            if self.turn % KEYFRAME_INTERVAL == 0:
+                self.keyframes[self.turn] = (
+                    self.position, board.snapshot(), board.rng.getstate())
+        return record
+
+    def play_turn(self):
+        """Execute records up to and including the next end of turn."""
+        while not self.finished():
+            if self.step()[0] == OP_END_TURN:
+                return True
+        return False
+
+    def play(self):
+        """Execute the rest of the replay."""
+        while not self.finished():
+            self.step()
+
+    def seek(self, turn):
+        """Bring the board to the state after the given number of turns."""
+        # Jump to the closest keyframe we have, if that saves playing
+        best = max(t for t in self.keyframes if t <= turn)
+        if turn < self.turn or best > self.turn:
+            position, snapshot, rng_state = self.keyframes[best]
+            self.board.restore(snapshot)
+            self.board.ruleset = self.ruleset
+            self.board.rng.setstate(rng_state)
+            self.position = position
+            self.turn = best
+        while self.turn < turn and self.play_turn():
+            pass
+        return self.turn
+
+
+def main(argv=None):
+    """Play replays headlessly, verifying them and timing the playback."""
+    parser = argparse.ArgumentParser(
+        prog="python -m territory.replay",
+        description="Verify and time Territory replays.")
+    parser.add_argument("replay", type=Path, nargs="+")
+    parser.add_argument("--no-verify", action="store_true",
+                        help="do not compare state digests")
+    parser.add_argument("--seek", type=int, metavar="TURN",
+                        help="only play up to the given turn")
+    args = parser.parse_args(argv)
+
+    # Imported here to keep the module free of the server at import time.
+    from territory.server import Server
+    from territory.server.serverboard import ServerBoard
+
+    server = Server(Path(sys.path[0] or "."))
+    status = 0
+    for path in args.replay:
+        try:
+            replay = Replay.read(path)
+            player = ReplayPlayer(replay,
+                                  ServerBoard(server, server.ruleset),
+                                  verify=not args.no_verify)
+            start = time.perf_counter()
+            if args.seek is None:
+                player.play()
+            else:
+                player.seek(args.seek)
+            elapsed = time.perf_counter() - start
+        except (OSError, ReplayError) as e:
+            print("{}: {}".format(path, e), file=sys.stderr)
+            status = 1
+            continue
+        print("{}: {} ({}), {} turns in {:.3f} s ({:.0f} turns/s)".format(
+            path, replay.scenario, replay.ruleset, player.turn, elapsed,
+            player.turn / elapsed if elapsed else float('inf')))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -80,11 +80,11 @@ class DefaultRuleset:
         if board.data[x, y] == 0:
             return BlockedResponse(True, x, y, "spaceisnotlegal")
 
-        # Set that holds recursed land piece coordinates
-        crawl_list = set()
-
-        # Recurse every land on the island where attacking soldier is
-        board.rek.crawl(actor.x, actor.y, [board.turn], crawl_list)
+        # Every land on the island where attacking soldier is
+        if board.data[actor.x, actor.y] == board.turn:
+            crawl_list = board.rek.island(actor.x, actor.y)
+        else:
+            crawl_list = frozenset()
 
         found = False
         edm = board.get_right_edm(y)
@@ -21,10 +21,240 @@
 #
 # ------------------------------------------------------------------------
 
-import ast
+"""Reading and writing of scenario files.
+
+Scenarios are stored in a compact binary format: a fixed header with the
+map size and player kinds, followed by one ownership byte per hex (column by
+column, as in HexMap), optionally compressed. The old JSON format, which
+stores every hex as a ``"(x, y)": "owner"`` entry, can still be read and
+written.
+"""
+
+import argparse
+import collections
+import json
+import mmap
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+from territory.hexmap import HexMap
+
+MAGIC = b"TMAP"
+VERSION = 1
+
+# magic, version, compression, width, height, player count
+HEADER = struct.Struct("<4sBBIIH")
+
+COMPRESS_NONE = 0
+COMPRESS_ZLIB = 1
+COMPRESS_RLE = 2
+COMPRESSIONS = {"none": COMPRESS_NONE, "zlib": COMPRESS_ZLIB,
+                "rle": COMPRESS_RLE}
+
+# Player kinds are stored as one byte each, by index in this tuple.
+PLAYER_KINDS = ("human", "ai")
+
+Scenario = collections.namedtuple(
+    'Scenario',
+    ['players', 'width', 'height', 'data']
+)
+
+
+class ScenarioError(ValueError):
+    """The scenario file is malformed."""
+
 
 def to_string_dict(data):
     return {repr(k): repr(v) for (k, v) in data.items()}
 
+
 def from_string_dict(data):
-    return {ast.literal_eval(k): ast.literal_eval(v) for (k, v) in data.items()}
+    result = {}
+    for key, value in data.items():
+        x, y = key.strip("()").split(",")
+        result[int(x), int(y)] = int(value.strip("'\""))
+    return result
+
+
+def rle_encode(cells):
+    """Encode bytes as (run length, value) byte pairs."""
+    out = bytearray()
+    run_value = None
+    run_length = 0
+    for value in cells:
+        if value == run_value and run_length < 255:
+            run_length += 1
+        else:
+            if run_length:
+                out += bytes((run_length, run_value))
+            run_value = value
+            run_length = 1
+    if run_length:
+        out += bytes((run_length, run_value))
+    return bytes(out)
+
+
+def rle_decode(payload):
+    return b"".join(bytes((value,)) * length
+                    for length, value in zip(payload[::2], payload[1::2]))
+
+
+def is_binary(path: Path):
+    """Return True if the file at path is a binary scenario."""
+    with path.open('rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def encode_scenario(scenario, compression=COMPRESS_ZLIB):
+    """Encode a scenario in the binary format."""
+    cells = scenario.data.tobytes()
+    if compression == COMPRESS_ZLIB:
+        cells = zlib.compress(cells, 9)
+    elif compression == COMPRESS_RLE:
+        cells = rle_encode(cells)
+    elif compression != COMPRESS_NONE:
+        raise ValueError("unknown compression {}".format(compression))
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, compression, scenario.width,
+                    scenario.height, len(scenario.players)),
+        bytes(PLAYER_KINDS.index(player) for player in scenario.players),
+        cells
+    ])
+
+
+def decode_scenario(buf, copy=True):
+    """Decode a binary scenario.
+
+    :param buf: the contents of a scenario file, as bytes or mmap.
+    :param copy: if False and the payload is uncompressed, the map reads
+        and writes directly through buf instead of a copy.
+    """
+    try:
+        magic, version, compression, width, height, player_count = \
+            HEADER.unpack_from(buf)
+    except struct.error as e:
+        raise ScenarioError("truncated scenario header") from e
+    if magic != MAGIC:
+        raise ScenarioError("not a binary scenario")
+    if version != VERSION:
+        raise ScenarioError("unsupported scenario version {}".format(version))
+
+    offset = HEADER.size
+    try:
+        players = [PLAYER_KINDS[kind]
+                   for kind in buf[offset:offset + player_count]]
+    except IndexError as e:
+        raise ScenarioError("unknown player kind") from e
+    offset += player_count
+
+    size = width * height
+    if compression == COMPRESS_NONE:
+        if copy:
+            cells = bytearray(buf[offset:offset + size])
+        else:
+            cells = memoryview(buf)[offset:offset + size]
+    elif compression == COMPRESS_ZLIB:
+        cells = bytearray(zlib.decompress(buf[offset:]))
+    elif compression == COMPRESS_RLE:
+        cells = bytearray(rle_decode(buf[offset:]))
+    else:
+        raise ScenarioError("unknown compression {}".format(compression))
+    if len(cells) != size:
+        raise ScenarioError("expected {} hexes, got {}".format(
+            size, len(cells)))
+    return Scenario(players, width, height, HexMap(width, height, cells))
+
+
+def read_json_scenario(path: Path):
+    """Read a scenario in the old JSON format."""
+    with path.open('r') as file:
+        contents = json.load(file)
+    data = from_string_dict(contents["data"])
+    width = contents.get("width", max(x for x, _ in data) + 1)
+    height = contents.get("height", max(y for _, y in data) + 1)
+    return Scenario(contents["players"], width, height,
+                    HexMap.from_dict(width, height, data))
+
+
+def write_json_scenario(path: Path, scenario):
+    """Write a scenario in the old JSON format."""
+    with path.open('w') as file:
+        json.dump({
+            "players": scenario.players,
+            "data": to_string_dict(scenario.data),
+            "width": scenario.width,
+            "height": scenario.height
+        }, file)
+
+
+def read_scenario(path: Path, mapped=False):
+    """Read a scenario in either format.
+
+    :param mapped: memory-map an uncompressed binary scenario instead of
+        reading it, so loading takes constant time and only the pages of
+        the hexes that are accessed are ever read. The map is
+        copy-on-write: changes stay in memory and are never written back to
+        the file. JSON and compressed scenarios are read as usual.
+    """
+    if not is_binary(path):
+        return read_json_scenario(path)
+    with path.open('rb') as file:
+        if mapped:
+            buf = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+            if hasattr(buf, "madvise"):
+                # Hexes are read in scattered windows; do not read ahead.
+                buf.madvise(mmap.MADV_RANDOM)
+        else:
+            buf = file.read()
+    return decode_scenario(buf, copy=not mapped)
+
+
+def write_scenario(path: Path, scenario, binary=True,
+                   compression=COMPRESS_ZLIB):
+    """Write a scenario, in the binary format unless binary is False."""
+    if not binary:
+        write_json_scenario(path, scenario)
+        return
+    # Encode before opening: the map may be mapped from the same file.
+    encoded = encode_scenario(scenario, compression)
+    with path.open('wb') as file:
+        file.write(encoded)
+
+
+def main(argv=None):
+    """Convert scenario files between the JSON and binary formats."""
+    parser = argparse.ArgumentParser(
+        prog="python -m territory.serializer",
+        description="Convert Territory scenario files.")
+    parser.add_argument("source", type=Path, nargs="+",
+                        help="scenario files to convert")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="output file or directory (default: in place)")
+    parser.add_argument("--json", action="store_true",
+                        help="write the old JSON format")
+    parser.add_argument("--compression", choices=sorted(COMPRESSIONS),
+                        default="zlib")
+    args = parser.parse_args(argv)
+
+    if args.output and len(args.source) > 1 and not args.output.is_dir():
+        parser.error("--output must be a directory for several sources")
+
+    for source in args.source:
+        target = args.output or source
+        if target.is_dir():
+            target = target / source.name
+        try:
+            scenario = read_scenario(source)
+        except (OSError, ValueError, KeyError) as e:
+            print("{}: {}".format(source, e), file=sys.stderr)
+            return 1
+        write_scenario(target, scenario, binary=not args.json,
+                       compression=COMPRESSIONS[args.compression])
+        print("{} -> {}".format(source, target))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
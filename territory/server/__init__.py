@@ -24,6 +24,7 @@
 """Backend for the game, ideally handling logic but not display."""
 from pathlib import Path
 
+from territory.catalogue import ScenarioCatalogue
 from territory.ruleset import DefaultRuleset
 
 
@@ -44,6 +45,9 @@ class Server:
         self.cpu_names = []
         self.load_cpu_names()
 
+        # Scenario metadata and prepared first turns
+        self.catalogue = ScenarioCatalogue(self)
+
     def load_cpu_names(self):
         """Read names from file to cpu name list."""
 
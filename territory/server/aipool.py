@@ -0,0 +1,233 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Pool of worker processes playing the turns of computer players.
+
+The AI is CPU bound, so running it in a server's event loop would stall
+every other game. An AIPool sends each computer turn as a job, that is a
+snapshot, the state of the board's random generator and a time budget, to
+a worker process. The worker plays the turn on a board of its own and
+returns the moves and drafts made, which the host applies to the game
+with the checks it makes for players (see GameHost.apply_actions).
+
+Jobs of different games take turns: a game has at most one job at a time,
+and games get a worker in the order they asked for one.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+from territory.replay import OP_MOVE, OP_DRAFT
+from territory.server import Server
+from territory.server.serverboard import ServerBoard
+
+# Board of a worker process (see start_worker)
+worker_board = None
+
+
+def start_worker(game_path: Path):
+    global worker_board
+    server = Server(game_path)
+    worker_board = ServerBoard(server, server.ruleset)
+
+
+class ActionCollector:
+    """Recorder (see GameBoard.recorder) keeping the moves and drafts."""
+
+    def __init__(self):
+        self.actions = []
+
+    def record_move(self, x1, y1, x2, y2, success):
+        self.actions.append((OP_MOVE, x1, y1, x2, y2, success))
+
+    def record_draft(self, x, y):
+        self.actions.append((OP_DRAFT, x, y))
+
+    def record_settle(self):
+        pass
+
+    def record_end_turn(self, board):
+        pass
+
+
+def think(state, rng_state, budget):
+    """Play the computer turn of a snapshot in a worker process.
+
+    Return the actions made and the seconds it took.
+    """
+    start = time.monotonic()
+    board = worker_board
+    board.restore(state)
+    board.rng.setstate(rng_state)
+    collector = ActionCollector()
+    board.recorder = collector
+    try:
+        player = board.get_player_by_side(board.turn)
+        if player is not None and player.ai_controller is not None:
+            player.ai_controller.act(deadline=start + budget)
+    finally:
+        board.recorder = None
+    return collector.actions, time.monotonic() - start
+
+
+def percentiles(samples):
+    """Median and 99th percentile of samples in milliseconds."""
+    if not samples:
+        return {"median": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+    return {"median": 1000 * ordered[len(ordered) // 2],
+            "p99": 1000 * ordered[int(len(ordered) * 0.99)]}
+
+
+class AIPool:
+    """Plays the turns of computer players in worker processes."""
+
+    def __init__(self, game_path: Path, workers=None, budget=1.0):
+        """
+        :param workers: number of worker processes, one per CPU by default.
+        :param budget: seconds a computer player may think about a turn.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.budget = budget
+        # Workers are started fresh rather than forked from a process that
+        # runs an event loop
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=start_worker, initargs=(game_path,))
+
+        # Game id -> (state, rng state, future, time queued) of the games
+        # waiting for a worker, first come first served
+        self.queue = collections.OrderedDict()
+        # Game id -> (job, future, time queued) of the games being played
+        self.running = {}
+        # Cancelled jobs still keeping a worker busy
+        self.abandoned = set()
+
+        # Statistics; times of the last jobs in seconds
+        self.jobs = 0
+        self.cancelled = 0
+        self.waits = collections.deque(maxlen=1000)
+        self.think_times = collections.deque(maxlen=1000)
+        self.latencies = collections.deque(maxlen=1000)
+
+    def busy(self, game_id):
+        return game_id in self.queue or game_id in self.running
+
+    async def think(self, game_id, state, rng_state):
+        """Return the actions of the computer player to play in state.
+
+        Return None if the job is cancelled.
+        """
+        if self.busy(game_id):
+            raise RuntimeError("game {} already has a job".format(game_id))
+        future = asyncio.get_running_loop().create_future()
+        self.queue[game_id] = (state, rng_state, future, time.monotonic())
+        self.schedule()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Nobody waits for the actions any more
+            waiting = self.queue.get(game_id) or self.running.get(game_id)
+            if waiting is not None and waiting[-2] is future:
+                self.cancel(game_id)
+            raise
+
+    def schedule(self):
+        """Give free workers to the games waiting longest."""
+        loop = asyncio.get_running_loop()
+
+        def done(job, game_id):
+            # Called in a thread of the executor
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self.finished, game_id, job)
+
+        while (self.queue and
+               len(self.running) + len(self.abandoned) < self.workers):
+            game_id, (state, rng_state, future, queued) = \
+                self.queue.popitem(last=False)
+            self.waits.append(time.monotonic() - queued)
+            job = self.executor.submit(think, state, rng_state, self.budget)
+            self.running[game_id] = (job, future, queued)
+            job.add_done_callback(lambda job, game_id=game_id:
+                                  done(job, game_id))
+
+    def finished(self, game_id, job):
+        running = self.running.get(game_id)
+        if running is None or running[0] is not job:
+            # Cancelled; its worker is free only now
+            self.abandoned.discard(job)
+            self.schedule()
+            return
+        del self.running[game_id]
+        _, future, queued = running
+        self.jobs += 1
+        self.schedule()
+        if future.done():
+            return
+        if job.exception() is not None:
+            future.set_exception(job.exception())
+            return
+        actions, seconds = job.result()
+        self.think_times.append(seconds)
+        self.latencies.append(time.monotonic() - queued)
+        future.set_result(actions)
+
+    def cancel(self, game_id):
+        """Drop the job of a game, e.g. because the game is over.
+
+        A job already running in a worker is left to finish, but its result
+        is ignored. Its worker is not given another job until then.
+        """
+        waiting = self.queue.pop(game_id, None)
+        running = self.running.pop(game_id, None)
+        for entry in (waiting, running):
+            if entry is not None:
+                self.cancelled += 1
+                future = entry[-2]
+                if not future.done():
+                    future.set_result(None)
+        if running is not None:
+            self.abandoned.add(running[0])
+            running[0].cancel()
+
+    def metrics(self):
+        """Queue depth, job counts and times in milliseconds."""
+        return {
+            "workers": self.workers,
+            "queued": len(self.queue),
+            "running": len(self.running),
+            "abandoned": len(self.abandoned),
+            "jobs": self.jobs,
+            "cancelled": self.cancelled,
+            "wait_ms": percentiles(self.waits),
+            "think_ms": percentiles(self.think_times),
+            "latency_ms": percentiles(self.latencies),
+        }
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
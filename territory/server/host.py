@@ -0,0 +1,564 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Hosting of many headless games in one process."""
+
+import asyncio
+import collections
+import functools
+import os
+import secrets
+import time
+from pathlib import Path
+
+from territory.gameboard import MAP_STYLES, MAX_PLAYERS, random_map_size
+from territory.replay import OP_MOVE, ScriptedRuleset
+from territory.ruleset import BlockedResponse
+from territory.server.protocol import UPDATES, encode_frames
+from territory.server import Server
+from territory.server.serverboard import ServerBoard
+from territory.server.store import replay_log
+from territory.sync import SyncEncoder
+
+# A player's seat in a game; the token authenticates the player
+Session = collections.namedtuple('Session', ['token', 'game', 'player'])
+
+
+class HostError(Exception):
+    """A request that cannot be carried out; the message is for the player."""
+
+
+class HostedGame:
+    """A game of a host.
+
+    The game is either live as a board, parked in memory as a snapshot, or
+    evicted to a snapshot file.
+    """
+
+    def __init__(self, id_):
+        self.id = id_
+        self.board = None
+        self.state = None
+        self.on_disk = False
+        # (rng, records) logged in the store after state, replayed when
+        # the board is restored (see GameHost.recover)
+        self.log = None
+        # Someone has won; the game is dropped when it becomes idle
+        self.finished = False
+        # Only computer players play (see GameHost.advance)
+        self.tournament = False
+        # Player id -> session token of the players who joined
+        self.seats = {}
+        self.last_active = time.monotonic()
+
+        # Sync messages (see territory.sync) are made once somebody asks
+        # for them, while the game is live
+        self.encoder = None
+        # Number of the last sync message
+        self.sequence = 0
+        # (sequence, message, UPDATES frame) from the last keyframe on
+        self.messages = []
+        # Spectators (see watch) sent every new frame
+        self.watchers = set()
+
+
+class GameHost:
+    """Runs games for remote players.
+
+    Only the most recently used games are kept as boards; the others are
+    parked as snapshots of a few kilobytes, and games nobody has touched for
+    idle_timeout seconds are written to disk. Computer players move as soon
+    as it is their turn.
+
+    Methods that may play computer players' turns are coroutines: with an
+    AIPool, the event loop serves other games while the AI thinks.
+    """
+
+    def __init__(self, server: Server, directory: Path, live_boards=256,
+                 idle_timeout=300.0, max_area=1000 * 1000, pool=None,
+                 store=None):
+        """
+        :param directory: where evicted games are written.
+        :param live_boards: number of games kept as boards.
+        :param max_area: largest map (width * height) a game can ask for.
+        :param pool: AIPool playing the computer players' turns; without
+            one they are played in the caller's thread.
+        :param store: GameStore keeping the games across restarts (see
+            recover).
+        """
+        self.server = server
+        self.directory = directory
+        self.live_boards = live_boards
+        self.idle_timeout = idle_timeout
+        self.max_area = max_area
+        self.pool = pool
+        self.store = store
+
+        self.games = {}
+        self.sessions = {}
+        # Games that have a board, least recently used first
+        self.live = collections.OrderedDict()
+        self.next_id = 1
+
+        # Turns played in all games, and computer players' actions refused
+        # by apply_actions, for statistics
+        self.turns = 0
+        self.refused_actions = 0
+
+    def stats(self):
+        """Return statistics of the host and its pool."""
+        stats = {"games": len(self.games), "live": len(self.live),
+                 "turns": self.turns, "refused_actions": self.refused_actions}
+        if self.pool is not None:
+            stats["pool"] = self.pool.metrics()
+        return stats
+
+    def path(self, game: HostedGame):
+        return self.directory / "{}.state".format(game.id)
+
+    async def new_game(self, humans=1, cpus=1, width=None, height=None,
+                       seed=None, style=None, scenario=None):
+        """Start a game and return it; see GameBoard.new_game.
+
+        A game without human players is a tournament: it is played a turn
+        at a time by advance, for spectators to watch.
+        """
+        if scenario is not None:
+            if self.server.catalogue.info(scenario) is None:
+                raise HostError("unknown scenario {}".format(scenario))
+        else:
+            if humans < 0 or cpus < 0 or humans + cpus < 2 \
+                    or humans + cpus > MAX_PLAYERS:
+                raise HostError("bad player count")
+            default_width, default_height = random_map_size(humans + cpus)
+            if width is None:
+                width = default_width
+            if height is None:
+                height = default_height
+            if width < 1 or height < 1 or width * height > self.max_area:
+                raise HostError("bad map size")
+            if style is not None and style not in MAP_STYLES:
+                raise HostError("unknown map style {}".format(style))
+        board = ServerBoard(self.server, self.server.ruleset)
+        start = functools.partial(
+            board.new_game, file=scenario, cpus=cpus, humans=humans,
+            width=width, height=height, seed=seed, style=style)
+        try:
+            if scenario is None:
+                # Big maps take seconds to generate; the other games go on
+                # meanwhile
+                await asyncio.get_running_loop().run_in_executor(None, start)
+            else:
+                # Scenarios start from the catalogue's prepared first turn
+                start()
+        except (ValueError, OSError) as e:
+            raise HostError(str(e))
+
+        game = HostedGame(self.next_id)
+        self.next_id += 1
+        game.tournament = all(player.ai_controller is not None
+                              for player in board.playerlist)
+        self.games[game.id] = game
+        self.attach(game, board)
+        await self.play_computers(game)
+        return game
+
+    def attach(self, game: HostedGame, board, stored=False):
+        """Make board the live board of game.
+
+        :param stored: the store already holds this state of the game.
+        """
+        game.board = board
+        if self.store is not None:
+            # A new or restored board starts a new snapshot, as the state
+            # of its random generator is not the one logged
+            board.recorder = self.store.recorder(game)
+            if not stored:
+                self.store.save(game, board)
+        self.live[game.id] = game
+        while len(self.live) > self.live_boards:
+            _, oldest = self.live.popitem(last=False)
+            self.park(oldest)
+
+    def park(self, game: HostedGame):
+        """Replace the board of a game by its snapshot."""
+        game.state = game.board.snapshot()
+        game.board = None
+        game.encoder = None
+        self.live.pop(game.id, None)
+
+    def board(self, game: HostedGame):
+        """Return the board of a game, restoring it if it was parked."""
+        game.last_active = time.monotonic()
+        if game.board is not None:
+            self.live.move_to_end(game.id)
+            return game.board
+        if game.on_disk:
+            path = self.path(game)
+            state = path.read_bytes()
+            path.unlink()
+            game.on_disk = False
+        else:
+            state = game.state
+        board = ServerBoard(self.server, self.server.ruleset)
+        game.state = None
+        if game.log is not None:
+            replay_log(board, state, *game.log)
+            game.log = None
+            self.attach(game, board, stored=True)
+        else:
+            board.restore(state)
+            self.attach(game, board)
+        return board
+
+    def evict_idle(self, now=None):
+        """Write games idle for idle_timeout seconds to disk.
+
+        Finished games are dropped instead. Return the number of games
+        evicted.
+        """
+        if now is None:
+            now = time.monotonic()
+        evicted = 0
+        for game in list(self.games.values()):
+            if game.on_disk or now - game.last_active < self.idle_timeout:
+                continue
+            if game.finished:
+                self.drop(game)
+            else:
+                if game.log is not None:
+                    # The snapshot alone would lose the logged turns
+                    self.board(game)
+                if game.board is not None:
+                    self.park(game)
+                self.directory.mkdir(parents=True, exist_ok=True)
+                temporary = self.path(game).with_suffix(".tmp")
+                temporary.write_bytes(game.state)
+                os.replace(str(temporary), str(self.path(game)))
+                game.state = None
+                game.on_disk = True
+            evicted += 1
+        return evicted
+
+    def drop(self, game: HostedGame):
+        """Forget a game and its sessions."""
+        self.games.pop(game.id, None)
+        self.live.pop(game.id, None)
+        for token in game.seats.values():
+            self.sessions.pop(token, None)
+        for watcher in game.watchers:
+            watcher.close()
+        game.watchers.clear()
+        if game.on_disk:
+            self.path(game).unlink()
+        if self.pool is not None:
+            self.pool.cancel(game.id)
+        if self.store is not None:
+            self.store.drop(game.id)
+
+    def recover(self):
+        """Load the games of the store, e.g. after a restart.
+
+        Their players can resume their sessions. The turns logged since the
+        last snapshot of a game are replayed when it is first used. Return
+        the number of games recovered.
+        """
+        recovered = 0
+        for game_id, info, snapshot, rng, records in self.store.load():
+            game = HostedGame(game_id)
+            game.state = snapshot
+            game.log = rng, records
+            game.tournament = info["tournament"]
+            game.finished = info["finished"]
+            for player, token in info["seats"].items():
+                game.seats[int(player)] = token
+                self.sessions[token] = Session(token, game_id, int(player))
+            self.games[game_id] = game
+            self.next_id = max(self.next_id, game_id + 1)
+            recovered += 1
+        return recovered
+
+    def join(self, game_id, player):
+        """Take the seat of a human player and return the new Session."""
+        game = self.games.get(game_id)
+        if game is None:
+            raise HostError("no game {}".format(game_id))
+        board = self.board(game)
+        found = board.get_player_by_side(player)
+        if found is None or found.ai_controller is not None:
+            raise HostError("no human player {}".format(player))
+        if player in game.seats:
+            raise HostError("player {} has already joined".format(player))
+        session = Session(secrets.token_hex(16), game.id, player)
+        self.sessions[session.token] = session
+        game.seats[player] = session.token
+        if self.store is not None:
+            self.store.save_info(game)
+        return session
+
+    def resume(self, token):
+        """Return the Session of a token, e.g. after reconnecting."""
+        session = self.sessions.get(token)
+        if session is None:
+            raise HostError("no such session")
+        return session
+
+    def game(self, session: Session):
+        game = self.games.get(session.game)
+        if game is None:
+            raise HostError("the game is over")
+        return game
+
+    def state(self, session: Session):
+        """Return a snapshot of a session's game."""
+        game = self.game(session)
+        game.last_active = time.monotonic()
+        if game.board is not None or game.log is not None:
+            return self.board(game).snapshot()
+        if game.on_disk:
+            return self.path(game).read_bytes()
+        return game.state
+
+    def cut(self, game: HostedGame):
+        """Record a sync message with the changes made to a live game."""
+        if game.encoder is None or game.encoder.board is not game.board:
+            game.encoder = SyncEncoder(game.board, sequence=game.sequence)
+            message = game.encoder.keyframe()
+        else:
+            message = game.encoder.delta()
+            if message is None:
+                return
+        if game.encoder.since_keyframe == 0:
+            game.messages = []
+        game.sequence = game.encoder.sequence
+        # Encoded once and shared by every spectator
+        frame = encode_frames(UPDATES, [message])
+        game.messages.append((game.sequence, message, frame))
+        self.broadcast(game, frame)
+
+    def broadcast(self, game: HostedGame, frame):
+        for watcher in game.watchers:
+            watcher.push(frame)
+
+    def sync(self, session: Session, since):
+        """Return the sync messages a copy needs after message since.
+
+        A copy that is too far behind, new (since is 0) or from another
+        run of the host gets everything from the last keyframe on.
+        """
+        game = self.game(session)
+        self.board(game)
+        self.cut(game)
+        if not game.messages[0][0] <= since <= game.sequence:
+            return [message for _, message, _ in game.messages]
+        return [message for sequence, message, _ in game.messages
+                if sequence > since]
+
+    def watch(self, game_id, watcher):
+        """Send the sync frames of a game to a spectator from now on.
+
+        The watcher gets every new UPDATES frame through watcher.push(frame)
+        and watcher.close() when the game is dropped; catch_up gives the
+        frames it needs first. Return the game.
+        """
+        game = self.games.get(game_id)
+        if game is None:
+            raise HostError("no game {}".format(game_id))
+        if not game.messages:
+            self.board(game)
+            self.cut(game)
+        game.watchers.add(watcher)
+        return game
+
+    def unwatch(self, game: HostedGame, watcher):
+        game.watchers.discard(watcher)
+
+    def catch_up(self, game: HostedGame):
+        """Return the frames that bring a new copy to the latest message."""
+        return [frame for _, _, frame in game.messages]
+
+    def playing_board(self, session: Session):
+        """Return the board of a session's game if it is the player's turn."""
+        board = self.board(self.game(session))
+        if board.turn != session.player:
+            raise HostError("it is not your turn")
+        return board
+
+    def check_move(self, board, player, x1, y1, x2, y2):
+        """Return the player's soldier at (x1, y1) if it may try to move."""
+        actor = board.actor_at(x1, y1)
+        if actor is None or actor.dump or actor.side != player:
+            raise HostError("no soldier of yours at ({}, {})".format(x1, y1))
+        if not board.isvalid(x2, y2):
+            raise HostError("({}, {}) is off the map".format(x2, y2))
+        return actor
+
+    def check_draft(self, board, player, x, y):
+        """Return whether the player may draft at (x, y)."""
+        if not board.isvalid(x, y) or board.data[x, y] != player:
+            raise HostError("({}, {}) is not your land".format(x, y))
+        dumps, _ = board.rek.count_dumps_on_island(x, y)
+        return len(dumps) == 1
+
+    def move(self, session: Session, x1, y1, x2, y2):
+        """Move a soldier of the player; return a dictionary of the result."""
+        board = self.playing_board(session)
+        actor = self.check_move(board, session.player, x1, y1, x2, y2)
+        result = board.attempt_move(actor, x2, y2, False)
+        if result is None:
+            return {"moved": False, "reason": "alreadymoved"}
+        if isinstance(result, BlockedResponse):
+            return {"moved": False, "reason": result.reason}
+        won = board.settle()
+        if won:
+            self.game(session).finished = True
+        return {"moved": True, "success": result.success, "won": won}
+
+    def draft(self, session: Session, x, y):
+        """Draft or upgrade a soldier at (x, y)."""
+        board = self.playing_board(session)
+        if not self.check_draft(board, session.player, x, y):
+            return {"drafted": False}
+        soldier = board.draft_soldier(x, y, sound=False)
+        if soldier is None:
+            return {"drafted": False}
+        return {"drafted": True, "level": soldier.level}
+
+    def apply_actions(self, board, player, actions):
+        """Apply the moves and drafts a computer player made in a worker.
+
+        They are checked like players' moves and drafts, and combat has the
+        outcome it had in the worker, so that the actions after it still
+        hold. The first action refused ends the turn. Return the number of
+        actions applied.
+        """
+        ruleset = board.ruleset
+        board.ruleset = ScriptedRuleset(ruleset)
+        try:
+            for applied, action in enumerate(actions):
+                if action[0] == OP_MOVE:
+                    _, x1, y1, x2, y2, success = action
+                    actor = self.check_move(board, player, x1, y1, x2, y2)
+                    board.ruleset.outcome = success
+                    result = board.attempt_move(actor, x2, y2, False)
+                    if result is None or isinstance(result, BlockedResponse):
+                        raise HostError("blocked move")
+                else:
+                    _, x, y = action
+                    if not self.check_draft(board, player, x, y) \
+                            or board.draft_soldier(x, y, sound=False) is None:
+                        raise HostError("refused draft")
+        except HostError:
+            self.refused_actions += len(actions) - applied
+            return applied
+        finally:
+            board.ruleset = ruleset
+        return len(actions)
+
+    async def end_turn(self, session: Session):
+        """End the player's turn and let the computer players move."""
+        game = self.game(session)
+        board = self.playing_board(session)
+        board.end_turn()
+        self.turns += 1
+        if game.messages:
+            self.cut(game)
+        played = 1 + await self.play_computers(game)
+        if self.games.get(game.id) is game:
+            board = self.board(game)
+        result = {"turn": board.turn, "turns": played}
+        for player in board.playerlist:
+            if player.won:
+                result["winner"] = player.id
+                game.finished = True
+        return result
+
+    async def advance(self, game: HostedGame):
+        """Play the next turn of a tournament; return whether one was."""
+        if not game.tournament:
+            raise HostError("game {} has human players".format(game.id))
+        if game.finished:
+            return False
+        return await self.play_computer(game)
+
+    def computers_play(self, game: HostedGame):
+        """Return whether the host plays the current turn of a game.
+
+        That is the turn of a computer or of a player who has lost, as long
+        as a human player is still in the game.
+        """
+        board = game.board
+        if not board.turn or not any(
+                player.ai_controller is None and not player.lost
+                for player in board.playerlist):
+            return False
+        player = board.get_player_by_side(board.turn)
+        return player is None or player.lost \
+            or player.ai_controller is not None
+
+    async def play_computers(self, game: HostedGame):
+        """Play the turns of computer players until a human's turn.
+
+        Return the number of turns played. Nothing is played once every
+        human player has lost.
+        """
+        played = 0
+        while self.games.get(game.id) is game:
+            self.board(game)
+            if not self.computers_play(game) \
+                    or not await self.play_computer(game):
+                break
+            played += 1
+        return played
+
+    async def play_computer(self, game: HostedGame):
+        """Play the current turn of a game with the AI, and end it.
+
+        The AI runs in the pool if there is one; meanwhile other games can
+        be played. Return False if the game was dropped in the meantime.
+        """
+        board = thinking = self.board(game)
+        player = board.get_player_by_side(board.turn)
+        if player is not None and not player.lost:
+            if self.pool is None:
+                player.ai_controller.act()
+            else:
+                rng_state = board.rng.getstate()
+                actions = await self.pool.think(game.id, board.snapshot(),
+                                                rng_state)
+                if actions is None or self.games.get(game.id) is not game:
+                    return False
+                # The board may have been parked and restored meanwhile
+                board = self.board(game)
+                board.rng.setstate(rng_state)
+                self.apply_actions(board, player.id, actions)
+        board.end_turn()
+        self.turns += 1
+        if board is not thinking and self.store is not None:
+            # The turn started from a random state the store did not log
+            self.store.save(game, board)
+        if any(player.won for player in board.playerlist):
+            game.finished = True
+        if game.messages:
+            self.cut(game)
+        return True
@@ -0,0 +1,449 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Load generator: many bot clients playing on a game server at once.
+
+Run ``python -m territory.server.loadgen`` to start a game server on this
+machine and load it for a while with bot clients (see remote.play_turn),
+all in one process, or give --port to load a server already running here.
+The clients start over with a new game when theirs ends, and spectators
+can watch their games. Turn and request latencies, throughput, errors and
+the server's statistics over time are written to a JSON report.
+"""
+
+import argparse
+import asyncio
+import bisect
+import collections
+import ipaddress
+import json
+import random
+import re
+import signal
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from territory.server import Server
+from territory.server.protocol import (
+    NEW_GAME, JOIN, SYNC, MOVE, DRAFT, END_TURN, WATCH, FRAME, ProtocolError)
+from territory.server.remote import RemoteError, RemoteGame, play_turn
+from territory.server.serverboard import ServerBoard
+from territory.sync import SyncError
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000,
+           20000, 50000, 100000)
+
+# Names of the requests in the report
+REQUESTS = {NEW_GAME: "new_game", JOIN: "join", SYNC: "sync", MOVE: "move",
+            DRAFT: "draft", END_TURN: "end_turn", WATCH: "watch"}
+
+# What a client may run into; it then counts an error and starts over
+CLIENT_ERRORS = (OSError, asyncio.IncompleteReadError, RemoteError,
+                 ProtocolError, SyncError)
+
+
+class Histogram:
+    """Latencies counted in logarithmic buckets (see BUCKETS)."""
+
+    def __init__(self):
+        # The last bucket is for anything slower than BUCKETS[-1]
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        milliseconds = 1000 * seconds
+        self.counts[bisect.bisect_left(BUCKETS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction):
+        """Return the upper bound of the bucket of a percentile, in ms."""
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= fraction * self.count:
+                return min(bound, self.max)
+        return self.max
+
+    def report(self):
+        return {"count": self.count,
+                "mean_ms": self.total / self.count if self.count else 0.0,
+                "p50_ms": self.percentile(0.5),
+                "p90_ms": self.percentile(0.9),
+                "p99_ms": self.percentile(0.99),
+                "max_ms": self.max,
+                "bucket_bounds_ms": list(BUCKETS),
+                "bucket_counts": self.counts}
+
+
+class Load:
+    """What the clients measured."""
+
+    def __init__(self):
+        # Request name -> Histogram of its round trips
+        self.requests = collections.defaultdict(Histogram)
+        # Bot turns, from the first sync to the reply to ending the turn
+        # (which includes the computer players' turns)
+        self.turns = Histogram()
+        self.errors = collections.Counter()
+        self.games = 0
+        # Sync messages received by spectators
+        self.frames = 0
+        self.connections = 0
+        # Ids of the games being played, for spectators to pick from
+        self.playing = set()
+
+    def error(self, e):
+        # Messages differing only in coordinates or ids are counted as one
+        self.errors["{}: {}".format(type(e).__name__,
+                                    re.sub(r"\d+", "N", str(e)))] += 1
+
+    def progress(self):
+        return {"connections": self.connections, "games": self.games,
+                "turns": self.turns.count,
+                "requests": sum(histogram.count
+                                for histogram in self.requests.values()),
+                "errors": sum(self.errors.values()),
+                "spectator_frames": self.frames}
+
+
+class LoadClient(RemoteGame):
+    """A RemoteGame timing its requests."""
+
+    load = None
+
+    async def request(self, frame):
+        start = time.perf_counter()
+        try:
+            return await super().request(frame)
+        finally:
+            self.load.requests[REQUESTS.get(frame[FRAME.size], "other")].add(
+                time.perf_counter() - start)
+
+
+async def connect(load, args):
+    game = await LoadClient.connect(args.address, args.port)
+    game.load = load
+    load.connections += 1
+    return game
+
+
+async def disconnect(load, game):
+    load.connections -= 1
+    try:
+        await game.close()
+    except OSError:
+        pass
+
+
+async def play(load, args, server, index, deadline):
+    """Play games with the bot until the deadline, one after the other."""
+    rng = random.Random(args.seed + index)
+    board = ServerBoard(server, server.ruleset)
+    await asyncio.sleep(args.ramp * index / args.clients)
+    while time.monotonic() < deadline:
+        try:
+            game = await connect(load, args)
+        except OSError as e:
+            load.error(e)
+            await asyncio.sleep(1.0)
+            continue
+        try:
+            created = await game.new_game(
+                humans=1, cpus=args.cpus, width=args.width,
+                height=args.height, seed=rng.getrandbits(32))
+            await game.join(created["game"], 1)
+            load.games += 1
+            load.playing.add(game.game)
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                result = await play_turn(game, board, rng)
+                load.turns.add(time.perf_counter() - start)
+                # The computer players stop when the bot has lost
+                if "winner" in result or result["turn"] != game.player:
+                    break
+        except CLIENT_ERRORS as e:
+            load.error(e)
+        finally:
+            load.playing.discard(game.game)
+            await disconnect(load, game)
+
+
+async def watch(load, game, game_id, board):
+    async for _ in game.watch(game_id, board):
+        load.frames += 1
+
+
+async def spectate(load, args, server, index, deadline):
+    """Watch the bots' games until the deadline, watch_time seconds each."""
+    rng = random.Random(args.seed - 1 - index)
+    board = ServerBoard(server, server.ruleset)
+    await asyncio.sleep(args.ramp * index / args.spectators)
+    while time.monotonic() < deadline:
+        if not load.playing:
+            await asyncio.sleep(0.1)
+            continue
+        game_id = rng.choice(tuple(load.playing))
+        try:
+            game = await connect(load, args)
+        except OSError as e:
+            load.error(e)
+            await asyncio.sleep(1.0)
+            continue
+        try:
+            await asyncio.wait_for(
+                watch(load, game, game_id, board),
+                min(args.watch_time, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+        except CLIENT_ERRORS as e:
+            load.error(e)
+        finally:
+            await disconnect(load, game)
+
+
+class Sampler:
+    """Takes the progress of the clients and the server's statistics."""
+
+    def __init__(self, load, args, start):
+        self.load = load
+        self.args = args
+        self.start = start
+        # Connection asking for the statistics; not counted as load
+        self.game = None
+        self.timeline = []
+
+    async def sample(self):
+        entry = {"time_s": time.monotonic() - self.start}
+        entry.update(self.load.progress())
+        try:
+            if self.game is None:
+                self.game = await RemoteGame.connect(self.args.address,
+                                                     self.args.port)
+            entry["server"] = await self.game.stats()
+        except CLIENT_ERRORS as e:
+            self.load.error(e)
+            self.game = None
+        self.timeline.append(entry)
+
+    async def run(self):
+        while True:
+            await self.sample()
+            await asyncio.sleep(self.args.interval)
+
+    async def close(self):
+        if self.game is not None:
+            await self.game.close()
+
+
+async def generate(args, server):
+    """Run the clients and return the report."""
+    load = Load()
+    start = time.monotonic()
+    cpu = time.process_time()
+    deadline = start + args.duration
+    sampler = Sampler(load, args, start)
+    sampling = asyncio.ensure_future(sampler.run())
+    await asyncio.gather(
+        *(play(load, args, server, index, deadline)
+          for index in range(args.clients)),
+        *(spectate(load, args, server, index, deadline)
+          for index in range(args.spectators)))
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - cpu
+    sampling.cancel()
+    await sampler.sample()
+    await sampler.close()
+
+    requests = sum(histogram.count for histogram in load.requests.values())
+    errors = sum(load.errors.values())
+    return {
+        "options": {key: str(value) if isinstance(value, Path) else value
+                    for key, value in vars(args).items()},
+        "duration_s": elapsed,
+        # Close to duration_s if the clients, not the server, were the limit
+        "client_cpu_s": cpu,
+        "games": load.games,
+        "turns": load.turns.count,
+        "turns_per_s": load.turns.count / elapsed,
+        "requests": requests,
+        "requests_per_s": requests / elapsed,
+        "turn_latency": load.turns.report(),
+        "request_latency": {name: histogram.report() for name, histogram
+                            in sorted(load.requests.items())},
+        "errors": {"count": errors,
+                   "per_request": errors / requests if requests else 0.0,
+                   "kinds": dict(load.errors.most_common())},
+        "spectator_frames": load.frames,
+        "timeline": sampler.timeline,
+    }
+
+
+async def start_server(args, directory: Path):
+    """Start a game server on this machine; return it and its port."""
+    command = [sys.executable, "-u", "-m", "territory.server.network",
+               "--address", args.address, "--port", "0",
+               "--games", str(directory),
+               "--ai-workers", str(args.ai_workers)]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, cwd=sys.path[0] or ".")
+    while True:
+        line = await process.stdout.readline()
+        if not line:
+            await process.wait()
+            raise OSError("the game server did not start")
+        found = re.match(rb"Serving games on .*:(\d+)", line)
+        if found:
+            return process, int(found.group(1))
+
+
+async def stop_server(process):
+    # Interrupted, the server closes its AI pool
+    process.send_signal(signal.SIGINT)
+    try:
+        await asyncio.wait_for(process.wait(), 10.0)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def run(args):
+    server = Server(Path(sys.path[0] or "."))
+    with tempfile.TemporaryDirectory() as directory:
+        process = None
+        if args.port is None:
+            process, args.port = await start_server(args, Path(directory))
+        try:
+            return await generate(args, server)
+        finally:
+            if process is not None:
+                await stop_server(process)
+
+
+def is_local(address):
+    """Return whether address only names this machine."""
+    try:
+        found = socket.getaddrinfo(address, None)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback
+               for info in found)
+
+
+def raise_file_limit(files):
+    """Allow this process and its children to open that many files."""
+    try:
+        import resource
+    except ImportError:
+        # Not on Unix
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY or soft >= files:
+        return
+    if hard != resource.RLIM_INFINITY:
+        files = min(files, hard)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (files, hard))
+
+
+def print_summary(report):
+    turns = report["turn_latency"]
+    print("{} games, {} turns in {:.1f} s ({:.1f} s client CPU)".format(
+        report["games"], report["turns"], report["duration_s"],
+        report["client_cpu_s"]))
+    print("turns/s: {:.1f}, requests/s: {:.1f}".format(
+        report["turns_per_s"], report["requests_per_s"]))
+    print("turn latency: median {:.0f} ms, 99th percentile {:.0f} ms, "
+          "max {:.0f} ms".format(turns["p50_ms"], turns["p99_ms"],
+                                 turns["max_ms"]))
+    print("errors: {} ({:.2%} of requests)".format(
+        report["errors"]["count"], report["errors"]["per_request"]))
+    for kind, count in report["errors"]["kinds"].items():
+        print("  {}: {}".format(kind, count))
+    memory = [entry["server"].get("memory") for entry in report["timeline"]
+              if "server" in entry]
+    if memory and None not in memory:
+        print("server memory: {:.0f} MiB at start, {:.0f} MiB peak, "
+              "{:.0f} MiB at the end".format(
+                  memory[0] / 2 ** 20, max(memory) / 2 ** 20,
+                  memory[-1] / 2 ** 20))
+
+
+def main(argv=None):
+    """Load a game server on this machine with bot clients."""
+    parser = argparse.ArgumentParser(
+        prog="python -m territory.server.loadgen",
+        description="Load a Territory game server with many bot clients.")
+    parser.add_argument("--address", default="127.0.0.1",
+                        help="loopback address of the server")
+    parser.add_argument("--port", type=int,
+                        help="port of a running server (default: start one)")
+    parser.add_argument("--clients", type=int, default=1000,
+                        help="bots playing at once")
+    parser.add_argument("--spectators", type=int, default=0,
+                        help="clients watching the bots' games")
+    parser.add_argument("--duration", type=float, default=60.0,
+                        help="seconds to play for")
+    parser.add_argument("--ramp", type=float, default=10.0,
+                        help="seconds over which the clients connect")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="seconds between samples of the server's "
+                        "statistics")
+    parser.add_argument("--watch-time", type=float, default=10.0,
+                        help="seconds a spectator watches a game")
+    parser.add_argument("--cpus", type=int, default=1,
+                        help="computer players in every game")
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--height", type=int, default=14)
+    parser.add_argument("--ai-workers", type=int, default=0,
+                        help="AI processes of the server started")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", type=Path,
+                        default=Path("loadgen-report.json"))
+    args = parser.parse_args(argv)
+    if not is_local(args.address):
+        parser.error("only servers on this machine can be loaded")
+    if args.clients < 1:
+        parser.error("at least one client is needed")
+
+    # Every client has a connection, and so has the server for it
+    raise_file_limit(2 * (args.clients + args.spectators) + 256)
+    try:
+        report = asyncio.run(run(args))
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return 1
+    args.report.write_text(json.dumps(report, indent=1))
+    print_summary(report)
+    print("Report written to {}".format(args.report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Asyncio TCP server for the games of a GameHost.
+
+See territory.server.protocol for the messages. A connection starts
+without a session; NEW_GAME creates a game, and JOIN or RESUME attach the
+connection to a player's seat, after which the game can be played. WATCH
+turns the connection into a spectator's: from then on the server only
+sends the game's sync messages.
+"""
+
+import argparse
+import asyncio
+import collections
+import os
+import sys
+import traceback
+import warnings
+from pathlib import Path
+
+from territory.server import Server
+from territory.server.aipool import AIPool
+from territory.server.host import GameHost, HostError
+from territory.server.store import GameStore
+from territory.server.protocol import (
+    NEW_GAME, JOIN, RESUME, STATE, MOVE, DRAFT, END_TURN, SYNC, WATCH, STATS,
+    OK, SNAPSHOT, UPDATES, ERROR, MOVE_STRUCT, DRAFT_STRUCT, SYNC_STRUCT,
+    ProtocolError, encode, encode_frames, encode_json, decode_json, unpack,
+    read_message)
+
+# Options of NEW_GAME and their types
+GAME_OPTIONS = {"humans": int, "cpus": int, "width": int, "height": int,
+                "seed": int, "style": str, "scenario": str}
+
+
+def resident_memory():
+    """Return the memory this process uses in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        # Only Linux has /proc
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def check_options(options, types):
+    """Raise ProtocolError unless options are known and of the right type."""
+    for key, value in options.items():
+        expected = types.get(key)
+        if expected is None:
+            raise ProtocolError("unknown option {}".format(key))
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise ProtocolError("option {} must be {}".format(
+                key, expected.__name__))
+
+
+class Spectator:
+    """A connection watching a game: a bounded queue of shared frames.
+
+    Frames go straight to the socket while it keeps up, and are queued
+    while it drains. When the queue overflows it is dropped, and the
+    spectator catches up from the last keyframe once its connection is
+    ready for more.
+    """
+
+    def __init__(self, writer, limit=64):
+        self.writer = writer
+        self.limit = limit
+        self.frames = collections.deque()
+        # Waiting for a catch-up rather than single frames; a new spectator
+        # starts with one
+        self.behind = True
+        # The connection is draining; frames must be queued
+        self.busy = False
+        self.closed = False
+        self.ready = asyncio.Event()
+        self.ready.set()
+        # Number of times the queue overflowed
+        self.drops = 0
+
+    def push(self, frame):
+        if self.behind:
+            return
+        if not self.frames and not self.busy:
+            # Saves waking the spectator's task up while the socket keeps up
+            self.writer.write(frame)
+            if self.writer.transport.get_write_buffer_size():
+                self.busy = True
+                self.ready.set()
+            return
+        if len(self.frames) >= self.limit:
+            self.frames.clear()
+            self.behind = True
+            self.drops += 1
+        else:
+            self.frames.append(frame)
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+
+class GameServer:
+    """Serves the games of a GameHost over TCP."""
+
+    def __init__(self, host: GameHost, eviction_interval=30.0,
+                 spectator_queue=64, turn_interval=1.0):
+        """
+        :param spectator_queue: frames queued for a spectator before it is
+            dropped back to a keyframe.
+        :param turn_interval: seconds between the turns of tournaments.
+        """
+        self.host = host
+        self.eviction_interval = eviction_interval
+        self.spectator_queue = spectator_queue
+        self.turn_interval = turn_interval
+        self.server = None
+        self.evictor = None
+        self.referee = None
+        # Turns of tournaments being played, by game id
+        self.advancing = {}
+        # Handler task of every open connection, by its writer
+        self.connections = {}
+
+    async def start(self, address="127.0.0.1", port=0):
+        """Start listening; port 0 picks a free port (see self.port)."""
+        self.server = await asyncio.start_server(self.handle, address, port)
+        self.evictor = asyncio.ensure_future(self.evict_periodically())
+        self.referee = asyncio.ensure_future(self.play_tournaments())
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop listening and close every connection."""
+        self.evictor.cancel()
+        self.referee.cancel()
+        for task in self.advancing.values():
+            task.cancel()
+        self.server.close()
+        handlers = list(self.connections.values())
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def evict_periodically(self):
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            self.host.evict_idle()
+
+    async def play_tournaments(self):
+        """Advance every watched tournament each turn_interval seconds."""
+        while True:
+            await asyncio.sleep(self.turn_interval)
+            for game in list(self.host.games.values()):
+                if game.tournament and game.watchers \
+                        and game.id not in self.advancing:
+                    task = asyncio.ensure_future(self.host.advance(game))
+                    self.advancing[game.id] = task
+                    task.add_done_callback(
+                        lambda _, game_id=game.id:
+                        self.advancing.pop(game_id, None))
+
+    async def handle(self, reader, writer):
+        """Serve one connection until the client disconnects."""
+        self.connections[writer] = asyncio.current_task()
+        session = None
+        try:
+            while True:
+                try:
+                    message = await read_message(reader)
+                except ProtocolError as e:
+                    # The stream cannot be trusted any more
+                    writer.write(encode_json(ERROR, {"error": str(e)}))
+                    break
+                if message is None:
+                    break
+                kind, payload = message
+                if kind == WATCH:
+                    try:
+                        request = decode_json(payload)
+                        check_options(request, {"game": int})
+                        game_id = request.get("game")
+                        spectator = Spectator(writer, self.spectator_queue)
+                        game = self.host.watch(game_id, spectator)
+                    except (HostError, ProtocolError) as e:
+                        writer.write(encode_json(ERROR, {"error": str(e)}))
+                        continue
+                    writer.write(encode_json(OK, {"game": game_id}))
+                    await self.spectate(reader, writer, game, spectator)
+                    break
+                try:
+                    reply, session = await self.dispatch(session, kind,
+                                                         payload)
+                except (HostError, ProtocolError) as e:
+                    reply = encode_json(ERROR, {"error": str(e)})
+                except Exception:
+                    # A bug rather than a bad request; the connection and
+                    # the other games carry on
+                    warnings.warn("Request {} failed:\n{}".format(
+                        kind, traceback.format_exc()))
+                    reply = encode_json(ERROR, {"error": "internal error"})
+                writer.write(reply)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+
+    async def spectate(self, reader, writer, game, spectator):
+        """Send the sync frames of a game until either side closes."""
+        # Spectators send nothing more; anything, or EOF, ends watching
+        listener = asyncio.ensure_future(reader.read(1))
+        listener.add_done_callback(lambda _: spectator.close())
+        try:
+            while True:
+                await spectator.ready.wait()
+                if spectator.closed:
+                    break
+                spectator.ready.clear()
+                spectator.busy = True
+                if spectator.behind:
+                    spectator.behind = False
+                    frames = self.host.catch_up(game)
+                else:
+                    frames = list(spectator.frames)
+                    spectator.frames.clear()
+                writer.writelines(frames)
+                await writer.drain()
+                spectator.busy = False
+        finally:
+            listener.cancel()
+            self.host.unwatch(game, spectator)
+
+    async def dispatch(self, session, kind, payload):
+        """Carry out a request; return the reply frame and the session."""
+        host = self.host
+        if kind == NEW_GAME:
+            options = decode_json(payload)
+            check_options(options, GAME_OPTIONS)
+            game = await host.new_game(**options)
+            players = [{"id": player.id, "name": player.name,
+                        "human": player.ai_controller is None}
+                       for player in host.board(game).playerlist]
+            return encode_json(OK, {"game": game.id,
+                                    "players": players}), session
+        if kind in (JOIN, RESUME):
+            request = decode_json(payload)
+            if kind == JOIN:
+                check_options(request, {"game": int, "player": int})
+                session = host.join(request.get("game"),
+                                    request.get("player"))
+            else:
+                check_options(request, {"session": str})
+                session = host.resume(request.get("session"))
+            return encode_json(OK, {"session": session.token,
+                                    "game": session.game,
+                                    "player": session.player}), session
+
+        if kind == STATS:
+            stats = host.stats()
+            stats["connections"] = len(self.connections)
+            stats["memory"] = resident_memory()
+            return encode_json(OK, stats), session
+
+        if session is None:
+            raise HostError("join a game first")
+        if kind == STATE:
+            return encode(SNAPSHOT, host.state(session)), session
+        if kind == SYNC:
+            since, = unpack(SYNC_STRUCT, payload)
+            return encode_frames(UPDATES, host.sync(session, since)), session
+        if kind == MOVE:
+            result = host.move(session, *unpack(MOVE_STRUCT, payload))
+        elif kind == DRAFT:
+            result = host.draft(session, *unpack(DRAFT_STRUCT, payload))
+        elif kind == END_TURN:
+            result = await host.end_turn(session)
+        else:
+            raise ProtocolError("unknown message {}".format(kind))
+        return encode_json(OK, result), session
+
+
+async def serve(host: GameHost, address, port, turn_interval):
+    server = GameServer(host, turn_interval=turn_interval)
+    await server.start(address, port)
+    print("Serving games on {}:{}".format(address, server.port))
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    """Run a game server."""
+    parser = argparse.ArgumentParser(
+        prog="python -m territory.server.network",
+        description="Host Territory games for remote players.")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7531)
+    parser.add_argument("--games", type=Path, default=Path("cache/games"),
+                        help="directory for games evicted from memory")
+    parser.add_argument("--live-boards", type=int, default=256,
+                        help="games kept as boards rather than snapshots")
+    parser.add_argument("--idle-timeout", type=float, default=300.0,
+                        help="seconds before an idle game is written to disk")
+    parser.add_argument("--turn-interval", type=float, default=1.0,
+                        help="seconds between turns of watched tournaments")
+    parser.add_argument("--ai-workers", type=int, default=0,
+                        help="processes for computer players (default: none, "
+                        "they play in the server's thread)")
+    parser.add_argument("--ai-budget", type=float, default=1.0,
+                        help="seconds a computer player may think per turn")
+    parser.add_argument("--store", type=Path,
+                        help="SQLite database keeping the games across "
+                        "restarts")
+    args = parser.parse_args(argv)
+
+    game_path = Path(sys.path[0] or ".")
+    server = Server(game_path)
+    pool = None
+    if args.ai_workers > 0:
+        pool = AIPool(game_path, args.ai_workers, args.ai_budget)
+    store = None
+    if args.store is not None:
+        store = GameStore(args.store)
+    host = GameHost(server, args.games, live_boards=args.live_boards,
+                    idle_timeout=args.idle_timeout, pool=pool, store=store)
+    if store is not None:
+        print("Recovered {} games".format(host.recover()))
+    try:
+        asyncio.run(serve(host, args.address, args.port,
+                          args.turn_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pool is not None:
+            pool.close()
+        if store is not None:
+            store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Length-prefixed binary protocol of the game server.
+
+Every message is a frame: a 4 byte little-endian length followed by that
+many bytes, of which the first says what kind of message it is and the
+rest is its payload. Options and results are JSON objects, game states are
+snapshots (see territory.snapshot) or sync messages (see territory.sync)
+and moves and drafts are packed structs.
+"""
+
+import asyncio
+import json
+import struct
+
+FRAME = struct.Struct("<I")
+
+# Frames longer than this are refused rather than read into memory
+MAX_FRAME = 64 * 1024 * 1024
+
+# Requests
+NEW_GAME = ord("N")   # JSON options of GameHost.new_game; replies OK
+JOIN = ord("J")       # JSON {"game": id, "player": id}; replies OK
+RESUME = ord("R")     # JSON {"session": token}; replies OK
+STATE = ord("S")      # no payload; replies SNAPSHOT
+MOVE = ord("M")       # MOVE struct; replies OK
+DRAFT = ord("D")      # DRAFT struct; replies OK
+END_TURN = ord("E")   # no payload; replies OK
+SYNC = ord("Y")       # SYNC_STRUCT; replies UPDATES
+WATCH = ord("W")      # JSON {"game": id}; replies OK, then UPDATES frames
+STATS = ord("I")      # no payload; replies OK with statistics of the server
+
+# Replies
+OK = ord("K")         # JSON result
+SNAPSHOT = ord("T")   # snapshot of the game
+UPDATES = ord("U")    # sync messages, each prefixed by its FRAME length
+ERROR = ord("X")      # JSON {"error": message}
+
+# x1, y1, x2, y2
+MOVE_STRUCT = struct.Struct("<IIII")
+# x, y
+DRAFT_STRUCT = struct.Struct("<II")
+# number of the last sync message the client applied, 0 for none
+SYNC_STRUCT = struct.Struct("<I")
+
+
+class ProtocolError(ValueError):
+    """The peer sent something that is not a valid message."""
+
+
+def encode(kind, payload=b""):
+    """Return the frame of a message."""
+    return FRAME.pack(len(payload) + 1) + bytes((kind,)) + payload
+
+
+def encode_frames(kind, messages):
+    """Return the frame of a message made of length-prefixed messages."""
+    return encode(kind, b"".join(FRAME.pack(len(message)) + message
+                                 for message in messages))
+
+
+def decode_frames(payload):
+    """Return the messages of a payload made by encode_frames."""
+    messages = []
+    offset = 0
+    while offset < len(payload):
+        if offset + FRAME.size > len(payload):
+            raise ProtocolError("truncated frame")
+        length, = FRAME.unpack_from(payload, offset)
+        offset += FRAME.size
+        if offset + length > len(payload):
+            raise ProtocolError("truncated frame")
+        messages.append(payload[offset:offset + length])
+        offset += length
+    return messages
+
+
+def encode_json(kind, obj):
+    return encode(kind, json.dumps(obj, separators=(",", ":")).encode())
+
+
+def decode_json(payload):
+    try:
+        obj = json.loads(bytes(payload).decode("utf-8")) if payload else {}
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ProtocolError("invalid JSON payload") from e
+    if not isinstance(obj, dict):
+        raise ProtocolError("expected a JSON object")
+    return obj
+
+
+def unpack(record, payload):
+    """Unpack a struct payload, raising ProtocolError on a bad size."""
+    try:
+        return record.unpack(payload)
+    except struct.error as e:
+        raise ProtocolError("malformed payload") from e
+
+
+async def read_message(reader):
+    """Read a message from an asyncio stream.
+
+    Return (kind, payload), or None if the stream ended between messages.
+    Raise ProtocolError if it ended inside one.
+    """
+    try:
+        header = await reader.readexactly(FRAME.size)
+    except EOFError:
+        return None
+    length, = FRAME.unpack(header)
+    if not 1 <= length <= MAX_FRAME:
+        raise ProtocolError("bad frame length {}".format(length))
+    try:
+        body = await reader.readexactly(length)
+    except asyncio.IncompleteReadError as e:
+        raise ProtocolError("truncated message") from e
+    return body[0], body[1:]
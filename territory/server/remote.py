@@ -0,0 +1,262 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Client of the game server, and a simple bot to drive it.
+
+Run ``python -m territory.server.remote`` against a running server to play
+a game with the bot.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+from pathlib import Path
+
+from territory.server.protocol import (
+    NEW_GAME, JOIN, RESUME, STATE, MOVE, DRAFT, END_TURN, SYNC, WATCH, STATS,
+    OK, SNAPSHOT, UPDATES, ERROR, MOVE_STRUCT, DRAFT_STRUCT, SYNC_STRUCT, ProtocolError,
+    encode, encode_json, decode_frames, decode_json, read_message)
+from territory.sync import SyncMirror, SyncError
+
+
+class RemoteError(Exception):
+    """The server refused a request."""
+
+
+class RemoteGame:
+    """A connection to a game server."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.session = None
+        self.game = None
+        self.player = None
+        # Keeps the board given to sync in step with the game
+        self.mirror = None
+
+    @classmethod
+    async def connect(cls, address="127.0.0.1", port=7531):
+        reader, writer = await asyncio.open_connection(address, port)
+        return cls(reader, writer)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    async def request(self, frame):
+        """Send a frame and return the reply as (kind, payload)."""
+        self.writer.write(frame)
+        await self.writer.drain()
+        reply = await read_message(self.reader)
+        if reply is None:
+            raise ConnectionError("the server closed the connection")
+        kind, payload = reply
+        if kind == ERROR:
+            raise RemoteError(decode_json(payload).get("error"))
+        return kind, payload
+
+    async def request_json(self, frame):
+        kind, payload = await self.request(frame)
+        if kind != OK:
+            raise ProtocolError("unexpected reply {}".format(kind))
+        return decode_json(payload)
+
+    async def new_game(self, **options):
+        """Create a game; return its id and players."""
+        return await self.request_json(encode_json(NEW_GAME, options))
+
+    async def join(self, game, player):
+        """Take a human player's seat in a game."""
+        reply = await self.request_json(
+            encode_json(JOIN, {"game": game, "player": player}))
+        self.session, self.game, self.player = \
+            reply["session"], reply["game"], reply["player"]
+        return reply
+
+    async def resume(self, session):
+        """Take the seat of an earlier connection back."""
+        reply = await self.request_json(
+            encode_json(RESUME, {"session": session}))
+        self.session, self.game, self.player = \
+            reply["session"], reply["game"], reply["player"]
+        return reply
+
+    async def state(self):
+        """Return a snapshot of the game."""
+        kind, payload = await self.request(encode(STATE))
+        if kind != SNAPSHOT:
+            raise ProtocolError("unexpected reply {}".format(kind))
+        return payload
+
+    async def sync(self, board):
+        """Bring board up to date with the game using sync messages.
+
+        Only the changes since the last call are sent, unless the board is
+        new or out of step, in which case it gets a keyframe.
+        """
+        if self.mirror is None or self.mirror.board is not board:
+            self.mirror = SyncMirror(board)
+        for attempt in range(2):
+            since = self.mirror.sequence if attempt == 0 else None
+            kind, payload = await self.request(
+                encode(SYNC, SYNC_STRUCT.pack(since or 0)))
+            if kind != UPDATES:
+                raise ProtocolError("unexpected reply {}".format(kind))
+            try:
+                for message in decode_frames(payload):
+                    self.mirror.apply(message)
+                return
+            except SyncError:
+                if attempt:
+                    raise
+
+    async def watch(self, game, board):
+        """Watch a game as a spectator, keeping board in step with it.
+
+        This is an asynchronous iterator yielding the number of every sync
+        message applied. The connection can only be closed afterwards.
+        """
+        await self.request_json(encode_json(WATCH, {"game": game}))
+        self.mirror = SyncMirror(board)
+        while True:
+            reply = await read_message(self.reader)
+            if reply is None:
+                return
+            kind, payload = reply
+            if kind != UPDATES:
+                raise ProtocolError("unexpected message {}".format(kind))
+            for message in decode_frames(payload):
+                self.mirror.apply(message)
+                yield self.mirror.sequence
+
+    async def move(self, x1, y1, x2, y2):
+        return await self.request_json(
+            encode(MOVE, MOVE_STRUCT.pack(x1, y1, x2, y2)))
+
+    async def draft(self, x, y):
+        return await self.request_json(encode(DRAFT, DRAFT_STRUCT.pack(x, y)))
+
+    async def end_turn(self):
+        return await self.request_json(encode(END_TURN))
+
+    async def stats(self):
+        """Return statistics of the server."""
+        return await self.request_json(encode(STATS))
+
+
+def choose_move(board, soldier, rng):
+    """Return a land the soldier may conquer, or None."""
+    targets = list(board.rek.get_island_border_lands(soldier.x, soldier.y))
+    rng.shuffle(targets)
+    for x, y in targets:
+        if not board.is_blocked(soldier, x, y)[0]:
+            return x, y
+    return None
+
+
+async def play_turn(game: RemoteGame, board, rng=random):
+    """Play a turn with a simple bot and end it.
+
+    The bot drafts a soldier on every island that can afford one and moves
+    each soldier to a random land it may conquer. The local board is
+    synced with the game before every decision.
+
+    :param board: local board without user interface, e.g. a ServerBoard.
+    :return: the reply to ending the turn.
+    """
+    await game.sync(board)
+    for dump in list(board.cities([game.player])):
+        if dump.supplies >= 2 * board.ruleset.draft_cost:
+            free = [xy for xy in board.rek.island(dump.x, dump.y)
+                    if board.actor_at(xy) is None]
+            if free:
+                await game.draft(*rng.choice(free))
+    await game.sync(board)
+
+    soldiers = [(actor.x, actor.y) for actor in board.actors
+                if actor.side == game.player and not actor.dump]
+    for x, y in soldiers:
+        soldier = board.actor_at(x, y)
+        if soldier is None or soldier.moved or soldier.side != game.player:
+            continue
+        target = choose_move(board, soldier, rng)
+        if target is not None:
+            result = await game.move(x, y, *target)
+            if result.get("won"):
+                break
+            if result.get("moved"):
+                await game.sync(board)
+    return await game.end_turn()
+
+
+async def run_bot(address, port, cpus, turns, seed):
+    # Imported here: only the bot needs a local board.
+    from territory.server import Server
+    from territory.server.serverboard import ServerBoard
+
+    server = Server(Path(sys.path[0] or "."))
+    board = ServerBoard(server, server.ruleset)
+    rng = random.Random(seed)
+
+    game = await RemoteGame.connect(address, port)
+    try:
+        created = await game.new_game(humans=1, cpus=cpus, seed=seed)
+        await game.join(created["game"], 1)
+        print("Playing game {} as player 1 against {} CPU players".format(
+            game.game, cpus))
+        for turn in range(1, turns + 1):
+            result = await play_turn(game, board, rng)
+            land = board.whole_map_situation_score(game.player)
+            print("Turn {}: {} hexes, {}".format(turn, land, json.dumps(
+                result)))
+            if "winner" in result:
+                break
+    finally:
+        await game.close()
+
+
+def main(argv=None):
+    """Play a game on a game server with the bot."""
+    parser = argparse.ArgumentParser(
+        prog="python -m territory.server.remote",
+        description="Play a Territory game on a server with a simple bot.")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7531)
+    parser.add_argument("--cpus", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(run_bot(args.address, args.port, args.cpus, args.turns,
+                            args.seed))
+    except (OSError, RemoteError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,4 +25,4 @@ from territory.gameboard import GameBoard
 
 class ServerBoard(GameBoard):
     """Server-side game board."""
-    pass
+    play_sounds = False
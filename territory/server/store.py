@@ -0,0 +1,308 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Durable storage of hosted games in SQLite.
+
+Every game has a snapshot and a log of the actions made since, as replay
+records (see territory.replay), one row per turn. A new snapshot is taken
+every snapshot_interval turns, together with the state of the board's
+random generator, and the log before it is deleted.
+
+Turns do not wait for the disk: rows are handed to a background thread
+that writes whatever has piled up in one transaction, every batch_interval
+seconds at most. A crash loses the turns of that last batch, and the moves
+of turns that had not ended. A game is recovered by restoring its
+snapshot and replaying its log (see replay_log), checking the state after
+every turn.
+"""
+
+import json
+import queue
+import sqlite3
+import struct
+import threading
+import time
+import warnings
+from pathlib import Path
+
+from territory.replay import (
+    OP_MOVE, OP_DRAFT, OP_SETTLE, OP_END_TURN, MOVE, DRAFT, SETTLE, END_TURN,
+    Replay, ReplayError, ReplayPlayer, decode_records, state_digest)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    info TEXT NOT NULL,
+    snapshot BLOB NOT NULL,
+    rng BLOB NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS log (
+    game INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    records BLOB NOT NULL,
+    PRIMARY KEY (game, position)
+);
+"""
+
+# Turns between snapshots; at most as many are replayed on recovery
+SNAPSHOT_INTERVAL = 10
+
+# State of a random.Random: its Mersenne Twister words and position, and
+# the spare value of gauss() if there is one
+RNG_STATE = struct.Struct("<625I?d")
+
+
+class StoreError(Exception):
+    """Operations handed to the store could not be written."""
+
+
+def pack_rng(rng):
+    version, internal, gauss = rng.getstate()
+    return RNG_STATE.pack(*internal, gauss is not None, gauss or 0.0)
+
+
+def unpack_rng(rng, packed):
+    fields = RNG_STATE.unpack(packed)
+    rng.setstate((3, fields[:625], fields[626] if fields[625] else None))
+
+
+def game_info(game):
+    """What the store keeps of a HostedGame besides its board."""
+    return json.dumps({"tournament": game.tournament,
+                       "finished": game.finished,
+                       "seats": game.seats})
+
+
+class StoreRecorder:
+    """Recorder (see GameBoard.recorder) logging a game's turns."""
+
+    def __init__(self, store, game, position):
+        self.store = store
+        self.game = game
+        # Position of the next log row, and turns since the snapshot
+        self.position = position
+        self.turns = 0
+        # Records of the current turn
+        self.buffer = bytearray()
+
+    def record_move(self, x1, y1, x2, y2, success):
+        self.buffer += MOVE.pack(OP_MOVE, x1, y1, x2, y2, success)
+
+    def record_draft(self, x, y):
+        self.buffer += DRAFT.pack(OP_DRAFT, x, y)
+
+    def record_settle(self):
+        self.buffer += SETTLE.pack(OP_SETTLE)
+
+    def record_end_turn(self, board):
+        self.buffer += END_TURN.pack(OP_END_TURN, board.turn,
+                                     state_digest(board))
+        self.store.write(("log", self.game.id, self.position,
+                          bytes(self.buffer)))
+        self.position += 1
+        self.turns += 1
+        self.buffer.clear()
+        if self.turns >= self.store.snapshot_interval:
+            self.store.save(self.game, board)
+
+    def close(self):
+        pass
+
+
+class GameStore:
+    """Keeps hosted games in an SQLite database."""
+
+    def __init__(self, path: Path, snapshot_interval=SNAPSHOT_INTERVAL,
+                 batch_interval=0.1):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.batch_interval = batch_interval
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(str(path)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+        # Game id -> StoreRecorder
+        self.recorders = {}
+        # Game id -> next log position of the games loaded
+        self.positions = {}
+
+        # Statistics of the writer
+        self.batches = 0
+        self.rows = 0
+        self.lost_rows = 0
+        # The last sqlite3.Error of the writer, until flush or close
+        # raises it
+        self.error = None
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write_behind,
+                                       name="game store", daemon=True)
+        self.writer.start()
+
+    def recorder(self, game):
+        """Return the recorder to give the board of a game."""
+        recorder = self.recorders.get(game.id)
+        if recorder is None:
+            recorder = StoreRecorder(self, game,
+                                     self.positions.pop(game.id, 0))
+            self.recorders[game.id] = recorder
+        return recorder
+
+    def save(self, game, board):
+        """Take a snapshot of a game, which covers everything logged."""
+        recorder = self.recorder(game)
+        recorder.buffer.clear()
+        recorder.turns = 0
+        self.write(("snapshot", game.id, game_info(game), board.snapshot(),
+                    pack_rng(board.rng), recorder.position))
+
+    def save_info(self, game):
+        self.write(("info", game.id, game_info(game)))
+
+    def drop(self, game_id):
+        self.recorders.pop(game_id, None)
+        self.positions.pop(game_id, None)
+        self.write(("drop", game_id))
+
+    def write(self, operation):
+        self.queue.put(operation)
+
+    def write_behind(self):
+        """Write the operations queued, in batches; runs in a thread."""
+        connection = sqlite3.connect(str(self.path))
+        # The log can afford losing the last transactions in a power cut
+        connection.execute("PRAGMA synchronous=NORMAL")
+        running = True
+        while running:
+            operations = [self.queue.get()]
+            time.sleep(self.batch_interval)
+            while True:
+                try:
+                    operations.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            running = None not in operations
+            try:
+                with connection:
+                    for operation in operations:
+                        if operation is not None:
+                            self.execute(connection, operation)
+            except sqlite3.Error as e:
+                # The whole batch is rolled back; the next one may still
+                # get through (a lock or a full disk can go away)
+                warnings.warn("Cannot write {} operations to the game "
+                              "store: {}".format(len(operations), e))
+                self.error = e
+                self.lost_rows += len(operations)
+            else:
+                self.rows += len(operations)
+            finally:
+                self.batches += 1
+                for _ in operations:
+                    self.queue.task_done()
+        connection.close()
+
+    @staticmethod
+    def execute(connection, operation):
+        kind, game_id = operation[:2]
+        if kind == "log":
+            connection.execute("INSERT INTO log VALUES (?, ?, ?)",
+                               (game_id, operation[2], operation[3]))
+        elif kind == "snapshot":
+            _, _, info, snapshot, rng, position = operation
+            connection.execute(
+                "INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?)",
+                (game_id, info, snapshot, rng, position))
+            connection.execute(
+                "DELETE FROM log WHERE game = ? AND position < ?",
+                (game_id, position))
+        elif kind == "info":
+            connection.execute("UPDATE games SET info = ? WHERE id = ?",
+                               (operation[2], game_id))
+        elif kind == "drop":
+            connection.execute("DELETE FROM games WHERE id = ?", (game_id,))
+            connection.execute("DELETE FROM log WHERE game = ?", (game_id,))
+
+    def flush(self):
+        """Wait until everything handed over so far is written.
+
+        Raise StoreError if some of it could not be, since the last flush.
+        """
+        self.queue.join()
+        self.check()
+
+    def close(self):
+        """Write what is left and stop; raise StoreError like flush."""
+        self.write(None)
+        self.writer.join()
+        self.check()
+
+    def check(self):
+        error, self.error = self.error, None
+        if error is not None:
+            raise StoreError("some games could not be stored: {}".format(
+                error)) from error
+
+    def load(self):
+        """Read the stored games.
+
+        Yield (game id, info, snapshot, rng, records) for every game; see
+        replay_log for the rest.
+        """
+        connection = sqlite3.connect(str(self.path))
+        try:
+            logs = connection.execute(
+                "SELECT game, position, records FROM log "
+                "ORDER BY game, position")
+            log = next(logs, None)
+            for game_id, info, snapshot, rng, position in connection.execute(
+                    "SELECT id, info, snapshot, rng, position FROM games "
+                    "ORDER BY id"):
+                records = []
+                while log is not None and log[0] <= game_id:
+                    if log[0] == game_id and log[1] >= position:
+                        records.extend(decode_records(log[2]))
+                        position = log[1] + 1
+                    log = next(logs, None)
+                self.positions[game_id] = position
+                yield game_id, json.loads(info), snapshot, rng, records
+        finally:
+            connection.close()
+
+
+def replay_log(board, snapshot, rng, records):
+    """Bring board to the end of the last logged turn of a stored game."""
+    ruleset = board.ruleset
+    player = ReplayPlayer(
+        Replay(0, type(ruleset).__name__, "", "", snapshot, records), board)
+    unpack_rng(board.rng, rng)
+    try:
+        player.play()
+    except ReplayError as e:
+        # Keep the game as the engine plays it
+        warnings.warn("Replay of a stored game failed: {}".format(e))
+        player.verify = False
+        player.play()
+    board.ruleset = ruleset
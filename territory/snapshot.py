@@ -0,0 +1,183 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Compact binary encoding of the complete game state.
+
+A snapshot holds everything needed to resume a game: map size, turn, the
+player list, the ownership of every hex and a packed table of actors.
+Snapshots are plain ``bytes`` so they can be pickled, written to disk or
+copied into shared memory as-is.
+"""
+
+import struct
+from multiprocessing import shared_memory
+
+from territory.actor import Actor
+from territory.ai import AI
+from territory.hexmap import HexMap
+from territory.player import Player
+
+MAGIC = b"TSNP"
+VERSION = 1
+
+# magic, version, width, height, turn, player count, actor count
+HEADER = struct.Struct("<4sBIIIHI")
+
+# id, flags, length of the UTF-8 encoded name (which follows)
+PLAYER = struct.Struct("<HBH")
+PLAYER_LOST = 1
+PLAYER_WON = 2
+PLAYER_AI = 4
+
+# x, y, side, level, flags, supplies, revenue, expenses
+ACTOR = struct.Struct("<IIHBBiii")
+ACTOR_DUMP = 1
+ACTOR_MOVED = 2
+ACTOR_DEAD = 4
+
+
+class SnapshotError(ValueError):
+    """The buffer does not hold a snapshot this version can read."""
+
+
+def pack_ownership(board):
+    """Return the ownership of every hex as bytes, column by column."""
+    return board.data.tobytes()
+
+
+def player_flags(player):
+    return ((PLAYER_LOST if player.lost else 0) |
+            (PLAYER_WON if player.won else 0) |
+            (PLAYER_AI if player.ai_controller else 0))
+
+
+def actor_flags(actor):
+    return ((ACTOR_DUMP if actor.dump else 0) |
+            (ACTOR_MOVED if actor.moved else 0) |
+            (ACTOR_DEAD if actor.dead else 0))
+
+
+def pack_actor(actor):
+    return ACTOR.pack(actor.x, actor.y, actor.side, actor.level,
+                      actor_flags(actor), actor.supplies, actor.revenue,
+                      actor.expenses)
+
+
+def unpack_actor(x, y, side, level, flags, supplies, revenue, expenses):
+    """Create an actor from the fields of its ACTOR record."""
+    actor = Actor(x, y, side, level=level, dump=bool(flags & ACTOR_DUMP))
+    actor.moved = bool(flags & ACTOR_MOVED)
+    actor.dead = bool(flags & ACTOR_DEAD)
+    actor.supplies = supplies
+    actor.revenue = revenue
+    actor.expenses = expenses
+    return actor
+
+
+def encode(board):
+    """Encode the state of the board into a snapshot."""
+    players = []
+    for player in board.playerlist:
+        name = player.name.encode("utf-8")
+        players.append(PLAYER.pack(player.id, player_flags(player),
+                                   len(name)))
+        players.append(name)
+
+    # Actors are sorted so that equal states always give equal snapshots.
+    actors = sorted(pack_actor(actor) for actor in board.actors)
+
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, board.width, board.height, board.turn,
+                    len(board.playerlist), len(actors)),
+        *players,
+        pack_ownership(board),
+        *actors
+    ])
+
+
+def decode(board, snapshot):
+    """Replace the state of the board with the one stored in snapshot.
+
+    :param snapshot: bytes or any other buffer, such as the ``buf`` of a
+        shared memory block. Trailing bytes are ignored.
+    """
+    buf = memoryview(snapshot)
+    try:
+        magic, version, width, height, turn, player_count, actor_count = \
+            HEADER.unpack_from(buf)
+    except struct.error as e:
+        raise SnapshotError("truncated snapshot") from e
+    if magic != MAGIC:
+        raise SnapshotError("not a snapshot")
+    if version != VERSION:
+        raise SnapshotError("unsupported snapshot version {}".format(version))
+    offset = HEADER.size
+
+    def check(length):
+        # Raise unless length more bytes follow offset
+        if offset + length > len(buf):
+            raise SnapshotError("truncated snapshot")
+
+    playerlist = []
+    for _ in range(player_count):
+        check(PLAYER.size)
+        id_, flags, name_length = PLAYER.unpack_from(buf, offset)
+        offset += PLAYER.size
+        check(name_length)
+        try:
+            name = bytes(buf[offset:offset + name_length]).decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise SnapshotError("corrupt player name") from e
+        offset += name_length
+        player = Player(name, id_, AI(board) if flags & PLAYER_AI else None)
+        player.lost = bool(flags & PLAYER_LOST)
+        player.won = bool(flags & PLAYER_WON)
+        playerlist.append(player)
+
+    size = width * height
+    check(size)
+    data = HexMap(width, height, bytearray(buf[offset:offset + size]))
+    offset += size
+
+    check(actor_count * ACTOR.size)
+    actors = [unpack_actor(*fields) for fields in ACTOR.iter_unpack(
+        buf[offset:offset + actor_count * ACTOR.size])]
+
+    board.width = width
+    board.height = height
+    board.turn = turn
+    board.playerlist = playerlist
+    board.data = data
+    board.actors.clear()
+    board.actors.update(actors)
+
+
+def share(snapshot):
+    """Copy a snapshot into a new shared memory block and return the block.
+
+    Worker processes attach with ``SharedMemory(name)`` and pass its ``buf``
+    to ``GameBoard.restore``. The caller owns the block and must unlink it.
+    """
+    block = shared_memory.SharedMemory(create=True, size=len(snapshot))
+    block.buf[:len(snapshot)] = snapshot
+    return block
@@ -21,39 +21,53 @@
 #
 # ------------------------------------------------------------------------
 
-from sys import path
-from pathlib import Path
+"""Music and sound effects.
 
-import pygame.mixer
+Nothing is initialized or decoded on import, and pygame is only imported
+by init, so the game logic can use play_sfx without a mixer or SDL: sounds
+play only once init has been called.
+Soundtracks are streamed by pygame.mixer.music; sound effects are short,
+and decoded once.
+"""
 
-pygame.mixer.init()
+import threading
+import warnings
+from sys import path
+from pathlib import Path
 
-# Initialize our channels
+# Milliseconds a soundtrack takes to fade out when another is played, and
+# to fade in when there was none
+FADE_OUT = 1000
+FADE_IN = 500
 
-soundtrack = pygame.mixer.Channel(0)
-sfx = pygame.mixer.Channel(1)
+# Our channel for sound effects, once init has initialized the mixer
+sfx = None
 
 # Directories
 # TODO: Allow sound skins
 sound_dir = Path(path[0]) / "music"
 
-# Get our sounds
+# Files of our sounds by name, and the sound effects decoded from them
 # TODO: Allow sound skins
 
 soundtracks = {}
 sfxs = {}
+decoded = {}
+
+# Name of the soundtrack playing, or to be played after a fade out
+playing = None
 
 
 def register_sfx(name, loc=None):
     if not loc:
         loc = name + ".ogg"
-    sfxs[name] = pygame.mixer.Sound(str(sound_dir / loc))
+    sfxs[name] = sound_dir / loc
 
 
 def register_soundtrack(name, loc=None):
     if not loc:
         loc = name + ".ogg"
-    soundtracks[name] = pygame.mixer.Sound(str(sound_dir / loc))
+    soundtracks[name] = sound_dir / loc
 
 # TODO: move elsewhere
 register_sfx("destroy")
@@ -66,18 +80,64 @@ register_soundtrack("march")
 
 
 def play_sfx(name):
-    if name in sfxs:
+    # Effects not decoded yet are skipped rather than waited for
+    if sfx is None or name not in sfxs:
+        return
+    effect = decoded.get(name)
+    if effect is not None:
         if sfx.get_busy():
             sfx.stop()
-        sfx.play(sfxs[name])
+        sfx.play(effect)
 
 
 def init():
-    soundtrack.play(soundtracks["soundtrack"], loops=-1)
+    """Initialize the mixer and start the soundtrack.
+
+    Sound effects are decoded in the background, see preload.
+    """
+    global sfx
+    import pygame.mixer
+    try:
+        pygame.mixer.init()
+    except pygame.error as e:
+        warnings.warn("No sound: {}".format(e))
+        return
+    sfx = pygame.mixer.Channel(0)
+    threading.Thread(target=preload, daemon=True).start()
+    play_soundtrack("soundtrack")
+
+
+def preload():
+    """Decode the sound effects."""
+    import pygame.mixer
+    for name, file in sfxs.items():
+        try:
+            decoded[name] = pygame.mixer.Sound(str(file))
+        except (pygame.error, OSError) as e:
+            warnings.warn("Cannot load sound {}: {}".format(file, e))
 
 
 def play_soundtrack(name):
-    if name in soundtracks:
-        # TODO: fade out music
-        soundtrack.stop()
-        soundtrack.play(soundtracks[name], loops=-1)
+    """Stream the soundtrack name in a loop.
+
+    The music has one stream, so the soundtrack playing fades out before
+    this one starts.
+    """
+    global playing
+    if sfx is None or name not in soundtracks or name == playing:
+        return
+    file = str(soundtracks[name])
+    import pygame.mixer
+    try:
+        if pygame.mixer.music.get_busy():
+            # pygame plays the queued file when the fade out ends
+            pygame.mixer.music.fadeout(FADE_OUT)
+            pygame.mixer.music.queue(file, loops=-1)
+        else:
+            pygame.mixer.music.load(file)
+            pygame.mixer.music.play(loops=-1, fade_ms=FADE_IN)
+    except pygame.error as e:
+        warnings.warn("Cannot play soundtrack {}: {}".format(file, e))
+        playing = None
+        return
+    playing = name
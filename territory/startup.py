@@ -0,0 +1,49 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Timing of the start of the game, shown by game.py --startup-report."""
+
+import sys
+import time
+
+# When this module was first imported, which game.py does first
+STARTED = time.perf_counter()
+
+# (name, perf_counter) of the steps done so far
+steps = []
+
+
+def step(name):
+    """Record that the step name of the start is done."""
+    steps.append((name, time.perf_counter()))
+
+
+def report(file=sys.stderr):
+    """Print how long every step took, and the time since the start."""
+    previous = STARTED
+    for name, done in steps:
+        print("{:<20} {:7.1f} ms {:7.1f} ms".format(
+            name, 1000 * (done - previous), 1000 * (done - STARTED)),
+            file=file)
+        previous = done
+    file.flush()
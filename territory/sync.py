@@ -0,0 +1,364 @@
+# ------------------------------------------------------------------------
+#
+#    This file is part of Territory.
+#
+#    Territory is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Territory is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Territory.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright Territory Development Team
+#     <https://github.com/TotalVerb/territory>
+#    Copyright Conquer Development Team (http://code.google.com/p/pyconquer/)
+#
+# ------------------------------------------------------------------------
+
+"""Keeping remote copies of a game in step with deltas.
+
+A copy starts from a keyframe: a snapshot (see territory.snapshot) followed
+by the network ids of its actors. Every later message is a delta holding
+only what changed since the message before it: the turn, the players'
+flags, the hexes that changed owner and the actors that appeared, moved,
+changed (level, supplies...) or disappeared. Hexes come from the map's
+journal and actors are compared by identity, so a delta costs time and
+bytes in proportion to the changes, not to the map.
+
+Messages are numbered, and every delta carries checksums of the state it
+leads to: the Adler-32 of the map, kept up to date from the changed hexes
+alone, and a sum of the CRCs of the actors. A copy that misses a message
+or ends up in another state raises SyncError and should ask for a
+keyframe. The encoder sends a keyframe every KEYFRAME_INTERVAL messages
+anyway. The body of a delta is compressed with zlib when that makes it
+smaller.
+"""
+
+import struct
+import zlib
+
+from territory.hexmap import JOURNAL_ALL
+from territory.snapshot import (
+    ACTOR, ACTOR_MOVED, ACTOR_DEAD, PLAYER_LOST, PLAYER_WON, actor_flags,
+    pack_actor, player_flags, unpack_actor)
+
+KEYFRAME_MAGIC = b"TKEY"
+DELTA_MAGIC = b"TDLT"
+VERSION = 2
+
+# magic, version, sequence, snapshot length, actor id count
+KEYFRAME = struct.Struct("<4sBIII")
+ACTOR_ID = struct.Struct("<I")
+# magic, version, sequence, turn, checksums of the map and the actors,
+# player count, hex count, actor record count, length of the compressed
+# body (0 if it is not compressed)
+DELTA = struct.Struct("<4sBIIIIHIII")
+# buffer index after the previous hex, owner
+HEX = struct.Struct("<IB")
+
+OP_SPAWN = ord("A")
+OP_MOVE = ord("M")
+OP_UPDATE = ord("U")
+OP_REMOVE = ord("D")
+
+# op, id, and the fields of an ACTOR record
+SPAWN = struct.Struct("<BI" + ACTOR.format.lstrip("<"))
+# op, id, x, y
+MOVE = struct.Struct("<BIII")
+# op, id, level, flags, supplies, revenue, expenses
+UPDATE = struct.Struct("<BIBBiii")
+# op, id
+REMOVE = struct.Struct("<BI")
+
+RECORDS = {OP_SPAWN: SPAWN, OP_MOVE: MOVE, OP_UPDATE: UPDATE,
+           OP_REMOVE: REMOVE}
+
+# Messages between keyframes
+KEYFRAME_INTERVAL = 50
+
+# Smaller delta bodies are sent as they are
+COMPRESS_SIZE = 64
+
+# Modulus of Adler-32
+ADLER_BASE = 65521
+
+
+class SyncError(ValueError):
+    """The copy is out of step with the game; it needs a keyframe."""
+
+
+def adler_update(checksum, size, index, before, after):
+    """Return the Adler-32 of a buffer after the byte at index changed.
+
+    :param checksum: Adler-32 of the buffer of size bytes before.
+    """
+    change = after - before
+    low = ((checksum & 0xFFFF) + change) % ADLER_BASE
+    high = ((checksum >> 16) + (size - index) * change) % ADLER_BASE
+    return high << 16 | low
+
+
+def actors_checksum(actors):
+    """Return a checksum of a set of actors, whatever their order."""
+    return sum(zlib.crc32(pack_actor(actor)) for actor in actors) \
+        & 0xFFFFFFFF
+
+
+def actor_state(actor):
+    """The fields of an actor that an UPDATE record carries."""
+    return (actor.level, actor_flags(actor), actor.supplies, actor.revenue,
+            actor.expenses)
+
+
+class SyncEncoder:
+    """Produces the messages that keep remote copies of a board in step."""
+
+    def __init__(self, board, keyframe_interval=KEYFRAME_INTERVAL,
+                 sequence=0):
+        """
+        :param sequence: number of the last message sent for this game, so
+            that numbering goes on when a game gets a new encoder.
+        """
+        self.board = board
+        self.keyframe_interval = keyframe_interval
+        self.sequence = sequence
+        self.since_keyframe = 0
+
+        # The map whose journal the deltas are made from, and its checksum
+        # as last sent
+        self.data = None
+        self.map_checksum = None
+        # Length of the last keyframe, which deltas must stay below
+        self.keyframe_size = 0
+        # Actor -> (network id, x, y, actor_state) as last sent
+        self.actors = {}
+        self.next_id = 1
+        # Turn and players' flags as last sent
+        self.turn = None
+        self.flags = None
+
+    def keyframe(self):
+        """Return a keyframe of the current state."""
+        board = self.board
+        self.sequence += 1
+        self.since_keyframe = 0
+        self.data = board.data
+        self.data.start_journal()
+        self.map_checksum = zlib.adler32(self.data.cells)
+        self.turn = board.turn
+        self.flags = bytes(player_flags(player)
+                           for player in board.playerlist)
+
+        snapshot = board.snapshot()
+        # Copies find the actors in the same order (see SyncMirror)
+        self.actors = {}
+        ids = []
+        for actor in sorted(board.actors, key=pack_actor):
+            self.actors[actor] = (self.next_id, actor.x, actor.y,
+                                  actor_state(actor))
+            ids.append(ACTOR_ID.pack(self.next_id))
+            self.next_id += 1
+        message = b"".join([
+            KEYFRAME.pack(KEYFRAME_MAGIC, VERSION, self.sequence,
+                          len(snapshot), len(ids)),
+            snapshot,
+            *ids
+        ])
+        self.keyframe_size = len(message)
+        return message
+
+    def delta(self):
+        """Return the message bringing copies to the current state.
+
+        That is a delta, or a keyframe if one is due, the map was replaced
+        or a keyframe is smaller. Return None if nothing has changed.
+        """
+        board = self.board
+        if self.data is not board.data \
+                or self.since_keyframe + 1 >= self.keyframe_interval:
+            return self.keyframe()
+        journal = self.data.take_journal()
+        if JOURNAL_ALL in journal \
+                or len(journal) * HEX.size >= len(self.data.cells):
+            return self.keyframe()
+
+        cells = self.data.cells
+        size = len(cells)
+        map_checksum = self.map_checksum
+        hexes = []
+        previous = 0
+        for index, before in sorted(journal.items()):
+            owner = cells[index]
+            if owner != before:
+                # Gaps between indices compress better than indices
+                hexes.append(HEX.pack(index - previous, owner))
+                previous = index
+                map_checksum = adler_update(map_checksum, size, index,
+                                            before, owner)
+        self.map_checksum = map_checksum
+
+        removed = []
+        records = []
+        actors = {}
+        for actor in board.actors:
+            state = actor_state(actor)
+            sent = self.actors.get(actor)
+            if sent is None:
+                net_id = self.next_id
+                self.next_id += 1
+                records.append(SPAWN.pack(OP_SPAWN, net_id, actor.x, actor.y,
+                                          actor.side, *state))
+            else:
+                net_id, x, y, sent_state = sent
+                if x != actor.x or y != actor.y:
+                    records.append(MOVE.pack(OP_MOVE, net_id, actor.x,
+                                             actor.y))
+                if sent_state != state:
+                    records.append(UPDATE.pack(OP_UPDATE, net_id, *state))
+            actors[actor] = (net_id, actor.x, actor.y, state)
+        for actor, sent in self.actors.items():
+            if actor not in actors:
+                removed.append(REMOVE.pack(OP_REMOVE, sent[0]))
+        self.actors = actors
+
+        flags = bytes(player_flags(player) for player in board.playerlist)
+        if not hexes and not records and not removed \
+                and board.turn == self.turn and flags == self.flags:
+            return None
+        self.turn = board.turn
+        self.flags = flags
+
+        body = b"".join([
+            flags,
+            *hexes,
+            # Removals first, so no two actors share a hex on the copy
+            *removed,
+            *records
+        ])
+        compressed = b""
+        if len(body) >= COMPRESS_SIZE:
+            compressed = zlib.compress(body)
+            if len(compressed) >= len(body):
+                compressed = b""
+        if DELTA.size + len(compressed or body) >= self.keyframe_size:
+            return self.keyframe()
+
+        self.sequence += 1
+        self.since_keyframe += 1
+        return b"".join([
+            DELTA.pack(DELTA_MAGIC, VERSION, self.sequence, board.turn,
+                       map_checksum, actors_checksum(board.actors),
+                       len(flags), len(hexes), len(removed) + len(records),
+                       len(compressed)),
+            compressed or body
+        ])
+
+
+class SyncMirror:
+    """Keeps a board in step with the messages of a SyncEncoder."""
+
+    def __init__(self, board):
+        self.board = board
+        # Number of the last message applied; None until a keyframe
+        self.sequence = None
+        # Network id -> actor
+        self.actors = {}
+
+    def apply(self, message):
+        """Apply a keyframe or delta; raise SyncError if it does not fit."""
+        magic = bytes(message[:4])
+        try:
+            if magic == KEYFRAME_MAGIC:
+                self.apply_keyframe(message)
+            elif magic == DELTA_MAGIC:
+                self.apply_delta(message)
+            else:
+                raise SyncError("not a sync message")
+        except (struct.error, KeyError, IndexError) as e:
+            self.sequence = None
+            raise SyncError("corrupt sync message") from e
+
+    def apply_keyframe(self, message):
+        _, version, sequence, length, count = KEYFRAME.unpack_from(message)
+        if version != VERSION:
+            raise SyncError("unsupported sync version {}".format(version))
+        offset = KEYFRAME.size
+        board = self.board
+        board.restore(message[offset:offset + length])
+        offset += length
+        ids = [net_id for net_id, in ACTOR_ID.iter_unpack(
+            message[offset:offset + count * ACTOR_ID.size])]
+        self.actors = dict(zip(ids, sorted(board.actors, key=pack_actor)))
+        self.sequence = sequence
+
+    def apply_delta(self, message):
+        _, version, sequence, turn, map_checksum, actor_checksum, \
+            player_count, hex_count, record_count, compressed = \
+            DELTA.unpack_from(message)
+        if version != VERSION:
+            raise SyncError("unsupported sync version {}".format(version))
+        if self.sequence is None or sequence != self.sequence + 1:
+            raise SyncError("expected message {}, got {}".format(
+                None if self.sequence is None else self.sequence + 1,
+                sequence))
+        body = message[DELTA.size:]
+        if compressed:
+            try:
+                body = zlib.decompress(body[:compressed])
+            except zlib.error as e:
+                raise SyncError("corrupt sync message") from e
+        board = self.board
+        offset = 0
+
+        board.turn = turn
+        for player, flags in zip(board.playerlist,
+                                 body[offset:offset + player_count]):
+            player.lost = bool(flags & PLAYER_LOST)
+            player.won = bool(flags & PLAYER_WON)
+        offset += player_count
+
+        data = board.data
+        cells = data.cells
+        index = 0
+        for gap, owner in HEX.iter_unpack(
+                body[offset:offset + hex_count * HEX.size]):
+            index += gap
+            cells[index] = owner
+        data.version += 1
+        offset += hex_count * HEX.size
+
+        actors = self.actors
+        for _ in range(record_count):
+            record = RECORDS[body[offset]]
+            fields = record.unpack_from(body, offset)
+            offset += record.size
+            op, net_id = fields[:2]
+            if op == OP_SPAWN:
+                actor = unpack_actor(*fields[2:])
+                actors[net_id] = actor
+                board.actors.add(actor)
+            elif op == OP_MOVE:
+                board.actors.move(actors[net_id], *fields[2:])
+            elif op == OP_UPDATE:
+                actor = actors[net_id]
+                level, flags, actor.supplies, actor.revenue, \
+                    actor.expenses = fields[2:]
+                actor.level = level
+                actor.moved = bool(flags & ACTOR_MOVED)
+                actor.dead = bool(flags & ACTOR_DEAD)
+            else:
+                board.actors.discard(actors.pop(net_id))
+
+        self.sequence = sequence
+        # The whole map is checked, which zlib does at memory speed
+        if zlib.adler32(cells) != map_checksum \
+                or actors_checksum(board.actors) != actor_checksum:
+            self.sequence = None
+            raise SyncError("state differs after message {}".format(
+                sequence))